@@ -0,0 +1,12 @@
+#!/bin/bash
+#SBATCH --cpus-per-task=60
+#SBATCH --array=0-7
+#SBATCH --nodes=1
+# one worker per node pulling replicate batches from a shared work queue (see run_workqueue.py)
+# add tasks before submitting, e.g. ROOT_SEED=1234 python run_workqueue.py $QUEUE -a pd_params9/p0 -m cip_pd -n 10000 -b 100
+# more nodes can be added (or jobs resubmitted) at any time; tasks of lost workers are reclaimed after 10 minutes
+QUEUE=queue_pd9
+
+source /clusternfs/jrenton/anaconda2/my_anaconda.sh
+
+python run_workqueue.py $QUEUE -p $(($SLURM_CPUS_PER_TASK-1)) -s 600 -H 60
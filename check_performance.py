@@ -0,0 +1,47 @@
+import sys
+from optparse import OptionParser
+import libs.benchmark as benchmark
+
+"""record throughput (steps/s, events/s) and peak memory of canonical simulation configurations, or check the current
+code against a recorded baseline, exiting with status 1 if there is a significant slowdown or memory increase.
+e.g. python check_performance.py -r baseline.json    (on the reference version)
+     python check_performance.py baseline.json       (after changes)"""
+
+parser = OptionParser(usage="usage: %prog [options] BASELINE")
+parser.set_defaults(record=False,repeat=5,seed=0,timend=benchmark.CANONICAL_TIMEND,names=None,alpha=0.01,
+                    min_slowdown=0.05,max_rss_increase=0.1,outfile=None)
+parser.add_option("-r","--record",action="store_true",dest="record",
+                    help="record baseline to BASELINE instead of checking against it")
+parser.add_option("-n","--repeat",type="int",dest="repeat",metavar="REPEAT",
+                    help="number of runs of each configuration")
+parser.add_option("-s","--seed",type="int",dest="seed",metavar="SEED",
+                    help="seed for random state (recording only, checks use the baseline seed)")
+parser.add_option("-T","--timend",type="float",dest="timend",metavar="HOURS",
+                    help="simulated time per run (recording only)")
+parser.add_option("-c","--configs",type="str",dest="names",metavar="NAME1,NAME2,...",
+                    help="canonical configurations to record (default all: %s)"%','.join(sorted(benchmark.CANONICAL)))
+parser.add_option("-a","--alpha",type="float",dest="alpha",metavar="ALPHA",
+                    help="significance level for slowdowns")
+parser.add_option("-m","--min-slowdown",type="float",dest="min_slowdown",metavar="FRACTION",
+                    help="ignore slowdowns smaller than this fraction")
+parser.add_option("-M","--max-rss-increase",type="float",dest="max_rss_increase",metavar="FRACTION",
+                    help="largest allowed fractional increase in peak memory")
+parser.add_option("-o","--output",type="str",dest="outfile",metavar="FILE",
+                    help="save current measurements to FILE when checking")
+(options,args) = parser.parse_args()
+if len(args) != 1:
+    parser.error("baseline file required")
+
+if options.record:
+    names = options.names.split(',') if options.names is not None else None
+    benchmark.save(args[0],benchmark.record_baseline(names,options.repeat,options.seed,options.timend))
+else:
+    try:
+        regressions,current = benchmark.check(benchmark.load(args[0]),options.repeat,options.alpha,options.min_slowdown,options.max_rss_increase)
+    except ValueError as e:
+        parser.error(str(e))
+    if options.outfile is not None:
+        benchmark.save(options.outfile,current)
+    for name,measure,change,p in regressions:
+        sys.stdout.write('REGRESSION %s: %s changed by %+.1f %%%s\n'%(name,measure,100*change,'' if p is None else ' (p=%.3g)'%p))
+    sys.exit(1 if regressions else 0)
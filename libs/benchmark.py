@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import itertools
+import warnings
+import numpy as np
+from timeit import default_timer as clock
+import structure.initialisation as init
+from structure.cell import BasicSpringForceNoGrowth
+import structure.kernels as kernels
+from structure.global_constants import *
+import libs.contact_inhibition_lib as cip_lib
+import libs.pd_lib_neutral as neutral_lib
+import libs.public_goods_lib as pgg_lib
+
+#benchmarks of the core kernels (retriangulation, force, fitness, local density, division/removal) and of full simulation
+#loops across tissue sizes. each benchmark is a function bench(L,rand) returning a callable that performs one call of the
+#kernel (or one timestep of a simulation) on an LxL tissue. results are stored as json for comparison between versions.
+
+SIZES = (10,20,50,100,200,300)
+DELTA = 0.025
+GAME_CONSTANTS = (2.,1.)
+
+def timer(func,repeat=5,min_time=0.2,max_number=10000):
+    """time func() returning dict with per-call times (seconds) for each of repeat runs.
+    the number of calls per run is chosen so each run takes at least min_time"""
+    func()
+    number,elapsed = 1,0.
+    while number < max_number:
+        start = clock()
+        for _ in xrange(number): func()
+        elapsed = clock()-start
+        if elapsed >= min_time: break
+        number = min(max_number,max(2*number,int(number*1.2*min_time/elapsed) if elapsed else 10*number))
+    times = []
+    for _ in xrange(repeat):
+        start = clock()
+        for _ in xrange(number): func()
+        times.append((clock()-start)/number)
+    return {'times':times,'number':number,'best':min(times),'mean':np.mean(times),'std':np.std(times)}
+
+def make_tissue(L,rand,save_areas=True,types=True):
+    """LxL tissue on a noisy hexagonal lattice with random cell types"""
+    tissue = init.init_tissue_torus(L,L,0.01,BasicSpringForceNoGrowth(),rand,save_areas=save_areas)
+    if types: tissue.properties['type'] = rand.randint(2,size=len(tissue))
+    tissue.properties['ancestor'] = np.arange(len(tissue))
+    return tissue
+
+#------------------------------------------------------------------------------------------------------------------------
+#kernels
+
+def bench_torus_retriangulate(L,rand):
+    mesh = make_tissue(L,rand,save_areas=True).mesh
+    return lambda: mesh.geometry.retriangulate(mesh.centres,mesh.N_mesh)
+
+def bench_torus_no_area_retriangulate(L,rand):
+    mesh = make_tissue(L,rand,save_areas=False).mesh
+    return lambda: mesh.geometry.retriangulate(mesh.centres,mesh.N_mesh)
+
+def bench_force(L,rand):
+    tissue = make_tissue(L,rand)
+    return lambda: tissue.Force.force(tissue)
+
+def bench_recalculate_fitnesses(L,rand):
+    tissue = make_tissue(L,rand)
+    neighbours,types = tissue.mesh.neighbours,tissue.properties['type']
+    return lambda: cip_lib.recalculate_fitnesses(neighbours,types,DELTA,cip_lib.prisoners_dilemma_averaged,GAME_CONSTANTS)
+
+def bench_local_density(L,rand):
+    mesh = make_tissue(L,rand).mesh
+    return mesh.local_density
+
+def bench_divide_and_remove(L,rand):
+    """division of a random cell followed by removal of the mother and a random cell (population size is unchanged)"""
+    tissue = make_tissue(L,rand)
+    N = len(tissue)
+    def step():
+        mother = rand.randint(N)
+        tissue.add_daughter_cells(mother,rand)
+        tissue.remove((mother,rand.randint(N)),(True,False))
+    return step
+
+KERNELS = [('Torus.retriangulate',bench_torus_retriangulate),
+           ('TorusNoArea.retriangulate',bench_torus_no_area_retriangulate),
+           ('Force.force',bench_force),
+           ('recalculate_fitnesses',bench_recalculate_fitnesses),
+           ('Mesh.local_density',bench_local_density),
+           ('Tissue.add_daughter_cells+remove',bench_divide_and_remove)]
+
+#------------------------------------------------------------------------------------------------------------------------
+#simulation loops (time per timestep). death/division rates give a population of roughly constant size
+
+def _stepper(simulation):
+    return lambda: next(simulation)
+
+def bench_cip_area_dependent(L,rand):
+    tissue = make_tissue(L,rand)
+    return _stepper(cip_lib.simulation_contact_inhibition_area_dependent(tissue,dt,np.inf,1,rand,(0.25/24.,0.25/24./0.9),
+                        threshold_area_fraction=1.,game='simple',DELTA=DELTA))
+
+def bench_cip_decoupled(L,rand):
+    tissue = make_tissue(L,rand)
+    return _stepper(cip_lib.simulation_decoupled_update(tissue,dt,np.inf,1,rand,(0.25/24.,),DELTA=DELTA,
+                        game=cip_lib.prisoners_dilemma_averaged,game_constants=GAME_CONSTANTS))
+
+def bench_cip_death_birth(L,rand):
+    tissue = make_tissue(L,rand)
+    return _stepper(cip_lib.simulation_death_birth(tissue,dt,np.inf,1,rand,(0.25/24.,),DELTA=DELTA,
+                        game=cip_lib.prisoners_dilemma_averaged,game_constants=GAME_CONSTANTS))
+
+def bench_neutral(L,rand):
+    tissue = make_tissue(L,rand,save_areas=False,types=False)
+    return _stepper(neutral_lib.simulation(tissue,dt,np.inf,1,rand))
+
+def bench_pgg_decoupled(L,rand):
+    tissue = make_tissue(L,rand,save_areas=False)
+    return _stepper(pgg_lib.simulation_decoupled_update(tissue,dt,np.inf,1,rand,DELTA,pgg_lib.N_person_prisoners_dilemma,GAME_CONSTANTS))
+
+def bench_pgg_death_birth(L,rand):
+    tissue = make_tissue(L,rand,save_areas=False)
+    return _stepper(pgg_lib.simulation_death_birth(tissue,dt,np.inf,1,rand,DELTA,pgg_lib.N_person_prisoners_dilemma,GAME_CONSTANTS))
+
+LOOPS = [('contact_inhibition_lib.simulation_contact_inhibition_area_dependent',bench_cip_area_dependent),
+         ('contact_inhibition_lib.simulation_decoupled_update',bench_cip_decoupled),
+         ('contact_inhibition_lib.simulation_death_birth',bench_cip_death_birth),
+         ('pd_lib_neutral.simulation',bench_neutral),
+         ('public_goods_lib.simulation_decoupled_update',bench_pgg_decoupled),
+         ('public_goods_lib.simulation_death_birth',bench_pgg_death_birth)]
+
+BENCHMARKS = KERNELS+LOOPS
+
+#------------------------------------------------------------------------------------------------------------------------
+
+def environment():
+    """details of the machine and code version the benchmarks were run with"""
+    try:
+        commit = subprocess.check_output(['git','rev-parse','HEAD'],stderr=subprocess.STDOUT,
+                    cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError,subprocess.CalledProcessError):
+        commit = None
+    import scipy
+    return {'date':time.strftime('%Y-%m-%d %H:%M:%S'),'commit':commit,'python':platform.python_version(),
+            'numpy':np.__version__,'scipy':scipy.__version__,'machine':platform.machine(),'node':platform.node(),
+            'processor':platform.processor(),'platform':platform.platform(),'kernels':kernels.backend()}
+
+def run(sizes=SIZES,benchmarks=BENCHMARKS,names=None,seed=0,repeat=5,min_time=0.2,verbose=True):
+    """run benchmarks (optionally only those whose name contains one of names) for each tissue size LxL.
+    returns dict with environment and list of results"""
+    results = []
+    for (name,bench),L in itertools.product(benchmarks,sizes):
+        if names is not None and not any(n in name for n in names): continue
+        rand = np.random.RandomState(seed)
+        timing = timer(bench(L,rand),repeat,min_time)
+        result = dict(name=name,L=L,N=L*L,**timing)
+        results.append(result)
+        if verbose:
+            sys.stdout.write('%-70s L=%-4d %12.3f ms +/- %.3f\n'%(name,L,1e3*timing['mean'],1e3*timing['std']))
+            sys.stdout.flush()
+    return {'environment':environment(),'results':results}
+
+def save(filename,report):
+    with open(filename,'w') as f:
+        json.dump(report,f,indent=1)
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def compare(old,new):
+    """returns list of (name,L,old mean,new mean,ratio new/old) for benchmarks present in both reports.
+    warns if the reports were run with different kernel backends"""
+    old_kernels,new_kernels = old['environment'].get('kernels'),new['environment'].get('kernels')
+    if old_kernels != new_kernels:
+        warnings.warn('comparing %s kernels with %s kernels'%(old_kernels,new_kernels))
+    old_results = {(r['name'],r['L']):r for r in old['results']}
+    return [(r['name'],r['L'],old_results[(r['name'],r['L'])]['mean'],r['mean'],r['mean']/old_results[(r['name'],r['L'])]['mean'])
+                for r in new['results'] if (r['name'],r['L']) in old_results]
+
+def print_comparison(comparison,stream=sys.stdout):
+    for name,L,old,new,ratio in comparison:
+        stream.write('%-70s L=%-4d %12.3f ms -> %12.3f ms  x%.2f\n'%(name,L,1e3*old,1e3*new,ratio))
+
+#------------------------------------------------------------------------------------------------------------------------
+#performance regression checks. canonical configurations mirror production drivers (run_CIP_parallel_simple.py and
+#run_files/pgg/run_sigmoid_pgg_parallel.py) with fixed seeds, so the workload is identical between runs and only the
+#timing varies. each measurement runs in a fresh python process so peak memory (RSS) is that of a single run.
+#throughput is measured for the main simulation loop only (initialisation is excluded) using telemetry.PhaseTimer.
+
+def canonical_cip_simple(rand,timend,profiler):
+    death_rate = 0.25/24.
+    return cip_lib.run_simulation(cip_lib.simulation_contact_inhibition_area_dependent,10,96.,timend,rand,init_time=96.,
+                til_fix=False,save_areas=True,N_limit=1000,DELTA=DELTA,game='simple',mutant_num=1,domain_size_multiplier=0.840203,
+                rates=(death_rate,death_rate/0.01),threshold_area_fraction=0.8,profiler=profiler)
+
+def canonical_pgg_sigmoid(rand,timend,profiler):
+    return pgg_lib.run_simulation(pgg_lib.simulation_decoupled_update,10,12.,timend,rand,DELTA,pgg_lib.sigmoid_game,(3.,1.,10.,0.5),
+                mutant_num=1,init_time=12.,til_fix=False,save_areas=False,profiler=profiler)
+
+CANONICAL = {'cip_simple':canonical_cip_simple,'pgg_sigmoid':canonical_pgg_sigmoid}
+CANONICAL_TIMEND = 200.
+
+def _measure(name,seed,timend):
+    """run canonical configuration in this process and write measurement as json to stdout"""
+    import resource
+    import libs.telemetry as telemetry
+    profiler = telemetry.PhaseTimer()
+    CANONICAL[name](np.random.RandomState(seed),timend,profiler)
+    report = profiler.report()
+    counts = report['counts']
+    events = counts.get('divisions',0)+counts.get('deaths',0)
+    sys.stdout.write(json.dumps({'steps':counts['steps'],'events':events,'time':report['total'],
+                        'steps_per_sec':counts['steps']/report['total'],'events_per_sec':events/report['total'],
+                        'peak_rss_kb':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+
+def measure(name,seed=0,timend=CANONICAL_TIMEND):
+    """run canonical configuration in a subprocess returning dict with steps/s, events/s and peak RSS (kB)"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ,VT_KERNELS=kernels.backend()) #measure with the backend of this process (as in environment())
+    out = subprocess.check_output([sys.executable,'-c','import libs.benchmark as b; b._measure(%r,%d,%r)'%(name,seed,timend)],cwd=root,env=env)
+    return json.loads(out.strip().splitlines()[-1])
+
+def record_baseline(names=None,repeat=5,seed=0,timend=CANONICAL_TIMEND,warmup=1,verbose=True):
+    """measure canonical configurations repeat times (after warmup runs that are discarded) returning baseline dict"""
+    names = sorted(CANONICAL) if names is None else names
+    baseline = {'environment':environment(),'seed':seed,'timend':timend,'configs':{}}
+    for name in names:
+        for _ in range(warmup):
+            measure(name,seed,timend)
+        samples = []
+        for _ in range(repeat):
+            samples.append(measure(name,seed,timend))
+            if verbose:
+                sys.stdout.write('%-12s %8.1f steps/s %8.2f events/s %8d kB\n'%(name,samples[-1]['steps_per_sec'],
+                                    samples[-1]['events_per_sec'],samples[-1]['peak_rss_kb']))
+                sys.stdout.flush()
+        baseline['configs'][name] = samples
+    return baseline
+
+def welch_slowdown(old,new):
+    """one-sided Welch t-test that mean of new is less than mean of old. returns (t,p)"""
+    from scipy import stats
+    old,new = np.asarray(old,dtype=float),np.asarray(new,dtype=float)
+    var_old,var_new = old.var(ddof=1)/len(old),new.var(ddof=1)/len(new)
+    se = np.sqrt(var_old+var_new)
+    if se == 0:
+        return (np.inf if new.mean() < old.mean() else -np.inf),float(new.mean() >= old.mean())
+    t = (old.mean()-new.mean())/se
+    df = (var_old+var_new)**2/(var_old**2/(len(old)-1)+var_new**2/(len(new)-1))
+    return t,stats.t.sf(t,df)
+
+def check(baseline,repeat=5,alpha=0.01,min_slowdown=0.05,max_rss_increase=0.1,warmup=1,verbose=True):
+    """rerun canonical configurations of baseline and compare. a configuration regresses if throughput (steps/s) is
+    significantly lower (one-sided Welch t-test at level alpha) by more than min_slowdown (fraction), or if mean peak RSS
+    increases by more than max_rss_increase (fraction). returns (list of regressions, current measurements).
+    raises ValueError if the baseline was recorded with a different kernel backend, as different code would be timed"""
+    recorded = baseline['environment'].get('kernels')
+    if recorded != kernels.backend():
+        raise ValueError('baseline was recorded with %s kernels but the current backend is %s (set VT_KERNELS=%s to compare)'%(
+                            recorded,kernels.backend(),recorded))
+    current = record_baseline(sorted(baseline['configs']),repeat,baseline['seed'],baseline['timend'],warmup,verbose=False)
+    regressions = []
+    for name,old in sorted(baseline['configs'].iteritems()):
+        new = current['configs'][name]
+        old_rate,new_rate = [s['steps_per_sec'] for s in old],[s['steps_per_sec'] for s in new]
+        t,p = welch_slowdown(old_rate,new_rate)
+        change = np.mean(new_rate)/np.mean(old_rate)-1
+        rss_change = np.mean([s['peak_rss_kb'] for s in new])/float(np.mean([s['peak_rss_kb'] for s in old]))-1
+        if verbose:
+            sys.stdout.write('%-12s steps/s %8.1f -> %8.1f (%+.1f %%, p=%.3g)  peak RSS %+.1f %%\n'%(name,np.mean(old_rate),
+                                np.mean(new_rate),100*change,p,100*rss_change))
+        if p < alpha and -change > min_slowdown:
+            regressions.append((name,'steps_per_sec',change,p))
+        if rss_change > max_rss_increase:
+            regressions.append((name,'peak_rss_kb',rss_change,None))
+        if old[0]['steps'] != new[0]['steps'] or old[0]['events'] != new[0]['events']:
+            sys.stdout.write('warning: %s workload differs from baseline (steps %d -> %d, events %d -> %d), simulation results have changed\n'%(
+                                name,old[0]['steps'],new[0]['steps'],old[0]['events'],new[0]['events']))
+    return regressions,current
@@ -0,0 +1,85 @@
+import os
+import time
+import errno
+import tempfile
+import itertools
+import cPickle as pickle
+
+#checkpointing of running simulations so that long runs can be resumed (e.g. after a job is preempted).
+#the simulation loops keep no state beyond the tissue and rng (other local variables are set from the tissue or
+#arguments when the generator starts), so a checkpoint stores the tissue, rng state, number of iterations of the
+#simulation generator consumed and the history saved so far. a restarted run continues bit-identically.
+
+def makedirs(dirname):
+    """create dirname if it does not exist (safe if another process creates it at the same time)"""
+    try:
+        os.makedirs(dirname)
+    except OSError as e:
+        if e.errno != errno.EEXIST: raise
+
+def save(filename,state):
+    """pickle state to filename. writes to a temporary file first so an interrupted save never corrupts a checkpoint.
+    the temporary file is unique to the call, so processes saving the same file at once (e.g. workers of a TissueCache
+    equilibrating the same tissue) each rename a complete file into place"""
+    write(filename,lambda f: pickle.dump(state,f,pickle.HIGHEST_PROTOCOL))
+
+def write(filename,dump):
+    """call dump(f) on a unique temporary file in the directory of filename and rename it to filename"""
+    dirname = os.path.dirname(filename)
+    if dirname: makedirs(dirname)
+    fd,tmp = tempfile.mkstemp(dir=dirname or '.',prefix=os.path.basename(filename)+'.',suffix='.tmp')
+    try:
+        with os.fdopen(fd,'wb') as f:
+            dump(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp,filename)
+    except:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+def load(filename):
+    """returns checkpointed state or None if filename does not exist"""
+    if not os.path.exists(filename):
+        return None
+    with open(filename,'rb') as f:
+        return pickle.load(f)
+
+def exists(filename):
+    return filename is not None and os.path.exists(filename)
+
+def run(make_simulation,tissue,rand,N_step,skip,filename,interval=3600.,til_fix=False,fixed=None,include_fixed=True,keep=False):
+    """run simulation saving a checkpoint to filename every interval seconds (wall-clock).
+    if filename exists the simulation is resumed from the checkpoint (tissue is ignored and rand is set to the saved state)
+        make_simulation: function taking a tissue and returning a simulation generator
+        N_step,skip: number of iterations of the generator and interval between saved tissues (as for run/run_til_fix)
+        til_fix: stop when fixed(tissue) is True, checking saved tissues only (as for run_til_fix)
+        keep: if False the checkpoint is deleted once the simulation is complete
+    returns history: list of tissues every skip steps"""
+    N_step,skip = int(round(N_step)),int(round(skip))
+    state = load(filename)
+    if state is None:
+        k,history = 0,[]
+        simulation = make_simulation(tissue)
+    else:
+        tissue,k,history = state['tissue'],state['k'],state['history']
+        rand.set_state(state['rand_state'])
+        simulation = make_simulation(tissue)
+        saved_time = tissue.time
+        first = next(simulation)
+        if first.time != saved_time: #loops which do not begin by yielding the initial tissue
+            simulation = itertools.chain([first],simulation)
+    last_save = time.time()
+    for tissue in itertools.islice(simulation,N_step-k):
+        if k%skip == 0:
+            if til_fix and fixed(tissue):
+                if include_fixed: history.append(tissue.copy())
+                break
+            history.append(tissue.copy())
+        k += 1
+        if time.time()-last_save > interval:
+            save(filename,{'tissue':tissue,'rand_state':rand.get_state(),'k':k,'history':history})
+            last_save = time.time()
+    if not keep and os.path.exists(filename):
+        os.remove(filename)
+    return history
@@ -0,0 +1,74 @@
+import numpy as np
+
+#library of functions for measuring spatial clustering of cell types in a tissue (or history of tissues)
+
+def join_counts(adjacency,types):
+    """calculate join count statistics from a sparse adjacency matrix (see Mesh.adjacency_matrix) and binary types.
+    types can be an (N,) array or a (P,N) array of P alternative type assignments (e.g. permutations)
+    returns MM,WW,MW: number of mutant-mutant, wildtype-wildtype and mutant-wildtype joins
+        (floats, or (P,) arrays if types is 2d)"""
+    T = np.asarray(types,dtype=float).T
+    degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+    MM = 0.5*(T*adjacency.dot(T)).sum(axis=0)
+    MW = degrees.dot(T) - 2*MM
+    WW = 0.5*degrees.sum() - MM - MW
+    return MM,WW,MW
+
+def random_permutations(types,n_perm,rand):
+    """returns (n_perm,N) array of random permutations of types"""
+    types = np.asarray(types)
+    return types[np.argsort(rand.rand(n_perm,len(types)),axis=1)]
+
+def permutation_join_counts(adjacency,types,n_perm,rand):
+    """calculate join count statistics for n_perm random permutations of types (null model with no clustering)
+    returns MM,WW,MW: (n_perm,) arrays"""
+    return join_counts(adjacency,random_permutations(types,n_perm,rand))
+
+def join_counts_history(history,n_perm=0,rand=None,key='type'):
+    """calculate join count statistics for each tissue in history using the cell property given by key as type.
+    returns (len(history),3) array of MM,WW,MW.
+    if n_perm>0 also returns (len(history),3) array giving the mean MM,WW,MW over n_perm random permutations of types"""
+    stats = np.array([join_counts(tissue.mesh.adjacency_matrix(),tissue.properties[key]) for tissue in history])
+    if not n_perm:
+        return stats
+    null_stats = np.array([np.mean(permutation_join_counts(tissue.mesh.adjacency_matrix(),tissue.properties[key],n_perm,rand),axis=1)
+                    for tissue in history])
+    return stats,null_stats
+
+def clone_interactions(tissue,n_min=1,key='ancestor'):
+    """calculate interaction statistics for every clone (cells sharing the same value of the property key) at once.
+    for each clone, cells in the clone are treated as cooperators and all other cells as defectors
+    returns (n_clones,6) array with a row [n,N,I_CC,I_CD,W_CC,W_CD] for each clone of size n>=n_min (ordered by clone id) where
+        n (int): size of clone
+        N (int): size of population
+        I_CC/I_CD (ints): number of cooperator-cooperator/defector interactions in population
+        W_CC/W_CD (floats): number of cooperator-cooperator/defector interactions in pop. weighted by neighbour number"""
+    clones = tissue.properties[key]
+    A = tissue.mesh.adjacency_matrix()
+    degrees = np.diff(A.indptr)
+    rows = np.repeat(np.arange(len(clones)),degrees)
+    same_clone = rows[clones[rows]==clones[A.indices]] #start cell of each edge joining two cells in the same clone
+    n = np.bincount(clones)
+    I_CC = np.bincount(clones[same_clone],minlength=len(n))
+    I_CD = np.bincount(clones,weights=degrees,minlength=len(n)) - I_CC
+    W_CC = np.bincount(clones[same_clone],weights=1./degrees[same_clone],minlength=len(n))
+    W_CD = n - W_CC
+    present = n>=n_min
+    return np.column_stack((n,np.full(len(n),len(clones)),I_CC,I_CD,W_CC,W_CD))[present]
+
+def patch_data(tissue,key='type'):
+    """find connected patches of cells with the same value of the property given by key (see Mesh.patches)
+    returns (n_patches,4) array with a row [time,label,size,perimeter] for each patch, 
+        where perimeter is the number of edges between the patch and cells with a different label"""
+    patch_ids,sizes,perimeters,patch_labels = tissue.patches(key)
+    return np.column_stack((np.full(len(sizes),tissue.time),patch_labels,sizes,perimeters))
+
+def patch_counts(tissue,key='type',minlength=2):
+    """returns array giving number of patches with each label"""
+    return np.bincount(tissue.patches(key)[3],minlength=minlength)
+
+def generate_patch_data(history,key='type'):
+    """generator giving patch_data for each tissue in history. history can be a generator 
+    (e.g. from run_simulation with generator=True) so that patches are analysed as the simulation runs"""
+    for tissue in history:
+        yield patch_data(tissue,key)
@@ -39,11 +39,9 @@ def save_areas(history,outdir,index=0):
     if not os.path.exists(outdir): # if the folder doesn"t exist create it
          os.makedirs(outdir)
     filename = "%s/areas_%03d"%(outdir,index)
-    wfile = open(filename,"w")
-    for tissue in history:
-        for area in tissue.mesh.areas:        
-            wfile.write("%.3e    "%area)
-        wfile.write("\n")
+    with open(filename,"w") as wfile:
+        for tissue in history:
+            wfile.write("%.3e    "*len(tissue)%tuple(tissue.mesh.areas)+"\n")
     
 def mean_force(history,outdir,index=0):
     """saves mean magnitude of force on cells in each tissue"""
@@ -121,6 +119,57 @@ def population_size(history):
 def neighbour_distribution(history):
     return [np.bincount([len(tissue.mesh.neighbours[i]) for i in range(len(tissue))],minlength=18) for tissue in history]
 
+def neighbour_records(history,tissueid=0,types=None,aggregate=False):
+    """generates neighbour data for each cell in each tissue in history as columns (dict of arrays) with keys: 
+    tissueid, time, n, k, j, type
+        n = # type 1 cells
+        k = # neighbours
+        j = # type 1 neighbours
+    types is a function returning the (N,) array of cell types for a tissue (defaults to tissue.properties['type'])
+    if aggregate is True counts are accumulated as the history is read and the function returns counts of cells 
+    with each (n,k,type) as columns with keys: n, k, type, count"""
+    records = []
+    for tissue in history:
+        cell_types = np.asarray(tissue.properties['type'] if types is None else types(tissue),dtype=int)
+        A = tissue.mesh.adjacency_matrix()
+        N = len(cell_types)
+        frame_records = {'tissueid':np.full(N,tissueid,dtype=int),'time':np.full(N,int(tissue.time),dtype=int),
+                            'n':np.full(N,sum(cell_types),dtype=int),'k':np.diff(A.indptr),'j':A.dot(cell_types),'type':cell_types}
+        if aggregate: 
+            records = [aggregate_neighbour_records(records+[frame_records])]
+        else: 
+            records.append(frame_records)
+    if aggregate: 
+        return records[0] if records else aggregate_neighbour_records([])
+    return concatenate_records(records)
+
+def aggregate_neighbour_records(records_list):
+    """combines a list of neighbour records (from neighbour_records, aggregated or not, e.g. for multiple simulations) 
+    into counts of cells with each (n,k,type). returns columns with keys: n, k, type, count"""
+    if not records_list:
+        return {'n':np.array([],dtype=int),'k':np.array([],dtype=int),'type':np.array([],dtype=int),'count':np.array([],dtype=int)}
+    nkt = np.vstack([np.column_stack((records['n'],records['k'],records['type'])) for records in records_list])
+    counts = np.concatenate([records['count'] if 'count' in records else np.ones(len(records['n']),dtype=int) 
+                                for records in records_list])
+    keys,inverse = np.unique(nkt,axis=0,return_inverse=True)
+    return {'n':keys[:,0],'k':keys[:,1],'type':keys[:,2],'count':np.bincount(inverse,weights=counts).astype(int)}
+
+def concatenate_records(records_list):
+    """combines a list of columnar records (e.g. from neighbour_records for multiple simulations)"""
+    if not records_list:
+        return {}
+    return {key:np.concatenate([records[key] for records in records_list]) for key in records_list[0]}
+
+def summary_array(**columns):
+    """returns numpy structured array with a record per row from equal length arrays of summary observables, e.g.
+    summary_array(time=..,n=..). compact to return from worker processes in place of histories (see pd.DataFrame(array))"""
+    names = sorted(columns)
+    values = [np.asarray(columns[name]) for name in names]
+    summary = np.empty(len(values[0]),dtype=[(name,val.dtype) for name,val in zip(names,values)])
+    for name,val in zip(names,values):
+        summary[name] = val
+    return summary
+
 def cell_cycle_lengths(history,start_time=0.0,ids=None):
     cell_histories_ = cell_histories(history,start_time)
     return [age for age,divided in zip(cell_histories_['age'],cell_histories_['divided']) if divided]
@@ -152,14 +201,15 @@ def forces(history):
     return [np.sqrt((tissue.Force(tissue)**2).sum(axis=1)).tolist() for tissue in history]
 
 def cell_histories(history,start_time=0.0):
-    cell_histories_ = history[-1].cell_histories
+    cell_histories_ = history[-1].cell_histories.as_arrays()
     if start_time>0.:
-        time = np.array(cell_histories_['time'])
-        start = np.where(time>start_time)[0][0]
-        cell_histories_ = {key:valist[start:] for key,valist in cell_histories.iteritems()}
+        start = np.where(cell_histories_['time']>start_time)[0][0]
+        cell_histories_ = {key:valist[start:] for key,valist in cell_histories_.iteritems()}
     for key,value in cell_histories_.iteritems():
         if isinstance(value,np.ndarray):
             cell_histories_[key] = value.tolist()
+        else:
+            cell_histories_[key] = [val.tolist() for val in value]
     return cell_histories_
 
 def mean_tension_area_product(history,std=True):
@@ -173,6 +223,10 @@ def mean_cell_seperation(history,std=True):
     if std: return [(np.mean(d),np.std(d)) for d in cs]
     else: return [np.mean(d) for d in cs]
 
+def mean_cell_distance(history):
+    """mean distance between all pairs of cells for each tissue in history"""
+    return [tissue.mesh.mean_cell_distance() for tissue in history]
+
 def mean_area(history,std=True):
     if std: 
         return [(np.mean(tissue.mesh.areas),np.std(tissue.mesh.areas)) for tissue in history]
@@ -204,11 +258,9 @@ def save_ages(history,outdir,index=0):
     if not os.path.exists(outdir): # if the folder doesn't exist create it
          os.makedirs(outdir)
     filename = "%s/ages_%03d"%(outdir,index)
-    wfile = open(filename,"w")
-    for tissue in history:
-        for age in tissue.age:        
-            wfile.write("%.3e    "%age)
-        wfile.write("\n")    
+    with open(filename,"w") as wfile:
+        for tissue in history:
+            wfile.write("%.3e    "*len(tissue)%tuple(tissue.age)+"\n")
     
 def save_mean_age(history,outdir,index=0):
     """save mean age of cells for each tissue in history"""
@@ -272,9 +324,31 @@ def save_as_json(history,outfile,fields,parameters=None,index=0):
     with open(outfile+'_%03d.json'%index,"w") as f:        
         json.dump(data,f,indent=4)
     
+
+def save_to_store(history,store,run,fields,params=None):
+    """saves given fields (see FIELDS_DICT) for a history to a ResultStore (libs/store.py) under run index and parameters.
+    fields with a value for every cell in each tissue (RAGGED_FIELDS) are stored as ragged data. cell_histories is stored
+    as one observable per column, named cell_histories.<column> (columns such as neighbour ids are ragged)"""
+    for field in fields:
+        if field == 'cell_histories':
+            for key,values in history[-1].cell_histories.as_arrays().iteritems():
+                if isinstance(values,np.ndarray):
+                    store.append('cell_histories.'+key,values,run,params)
+                else:
+                    store.append_ragged('cell_histories.'+key,values,run,params)
+            continue
+        values = FIELDS_DICT[field](history)
+        if field in RAGGED_FIELDS:
+            store.append_ragged(field,[np.asarray(val) for val in values],run,params)
+        elif isinstance(values,dict):
+            raise TypeError('field %s is a dict and cannot be stored as an array'%field)
+        else:
+            store.append(field,values,run,params)
     
 FIELDS_DICT = {"pop_size":population_size,"mutants":number_mutants,"neighbours":neighbour_distribution,
                 "cycle_lengths":cell_cycle_lengths,"extrusion_ages":extrusion_ages,"cycle_phases":cycle_phases,
-                "density":cell_density,"energy":mean_tension_area_product,"cell_seperation":mean_cell_seperation,
+                "density":cell_density,"energy":mean_tension_area_product,"cell_seperation":mean_cell_seperation,"cell_distance":mean_cell_distance,
                 "cell_histories":cell_histories,"transition_ages":transition_ages,"mean_area":mean_area,"areas":areas,
                 "mean_force":mean_force,"forces":forces,"ages":ages} 
+
+RAGGED_FIELDS = ("areas","forces","ages","neighbours")
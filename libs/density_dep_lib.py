@@ -5,6 +5,7 @@ import structure
 from structure.global_constants import T_D,dt
 from structure.cell import Tissue, BasicSpringForceNoGrowth
 import structure.initialisation as init
+import libs.engine as engine
 
 def print_progress(step,N_steps):
     sys.stdout.write("\r %.2f %%"%(step*100/N_steps))
@@ -19,7 +20,7 @@ def simulation_no_division(tissue,dt,N_steps,rand):
         step += 1
         mesh.move_all(tissue.dr(dt))
         tissue.update(dt)
-        update_progress(step/N_steps)  
+        print_progress(step,N_steps)  
         yield tissue
         
 def run(tissue_original,simulation,N_step,skip):
@@ -59,35 +60,13 @@ def no_density_dep(densities,A):
     return A*np.ones(len(densities))
 
 def simulation_local_density_dep(tissue,dt,N_steps,stepsize,rand,til_fix=False,progress_on=False,store_dead=False,save_events=False,**kwargs):
-    step = 0.
-    complete = False
-    properties = tissue.properties
-    mesh = tissue.mesh
-    DELTA = kwargs['DELTA']
-    game = kwargs['game']
-    game_params = kwargs['game_params']
-    birth_dd_func,death_dd_func = kwargs['birth_dd_func'],kwargs['death_dd_func']
-    birth_dd_params,death_dd_params = kwargs['birth_dd_params'],kwargs['death_dd_params']
     death_rate = (1./T_D)
     try: birth_rate = kwargs['birth_to_death_rate_ratio']*death_rate
     except: birth_rate = death_rate
-    while not til_fix or not complete:
-        if progress_on: 
-            print_progress(step,N_steps)
-            step += 1
-        N= len(tissue)
-        mesh.move_all(tissue.dr(dt))
-        if game == 'simple': fitnesses = simple_fitness(properties['type'],DELTA,game_params)
-        else: fitnesses = recalculate_fitnesses(mesh.neighbours,properties['type'],DELTA,game,game_params)
-        densities = mesh.local_density()
-        births = np.where(rand.rand(N) < fitnesses*birth_rate*birth_dd_func(densities,*birth_dd_params)*dt)[0]
-        deaths = np.where(rand.rand(N) < death_rate*death_dd_func(densities,*death_dd_params)*dt)[0]
-        if len(births)!=0 or len(deaths)!=0:
-            births_and_deaths(tissue,births,deaths,rand,store_dead)      
-        tissue.update(dt)
-        if til_fix: complete = (1 not in tissue.properties['type'] or 0 not in tissue.properties['type']) and step%stepsize==0 
-        if not save_events or (len(births)!=0 or len(deaths)!=0): yield tissue 
-        else: yield None       
+    rule = engine.DensityDependent(birth_rate,death_rate,kwargs['DELTA'],kwargs['game'],kwargs['game_params'],
+                kwargs['birth_dd_func'],kwargs['birth_dd_params'],kwargs['death_dd_func'],kwargs['death_dd_params'],
+                store_dead=store_dead,recalculate_fitnesses=recalculate_fitnesses)
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,progress_on=progress_on,return_events=save_events,til_fix=til_fix,initial=False)
 
 def births_and_deaths(tissue,births,deaths,rand,store_dead=False):
     if len(births)>0: tissue.add_many_daughter_cells(births,rand)
@@ -131,11 +110,11 @@ def births_and_deaths(tissue,births,deaths,rand,store_dead=False):
 def run_simulation(simulation,N,timestep,timend,rand,init_time=10.,til_fix=False,mutant_num=1,save_areas=False,store_dead=False,tissue=None,force=None,save_events=False,**kwargs):
     if tissue is None:
         if force is None: force = BasicSpringForceNoGrowth()
-        tissue = init.init_tissue_torus(N,N,0.01,force,rand,save_areas=save_areas,store_dead=store_dead)
+        tissue = init.init_tissue_torus(N,N,0.01,force,rand,save_areas=save_areas,save_cell_histories=store_dead)
         tissue.properties['type'] = np.zeros(N*N,dtype=int)
         tissue.age = np.zeros(N*N,dtype=float)
         if init_time is not None: 
-            tissue = run_save_final(tissue, simulation(tissue,dt,init_time/dt,timestep/dt,rand,til_fix=False,store_dead=store_dead,**kwargs),init_time/dt)
+            tissue = run_save_final(simulation(tissue,dt,init_time/dt,timestep/dt,rand,til_fix=False,store_dead=store_dead,**kwargs),init_time/dt)
             tissue.reset()
         tissue.properties['type'][rand.choice(N*N,size=mutant_num,replace=False)]=1
     if save_events: history = run_save_events(tissue, simulation(tissue,dt,timend/dt,timestep/dt,rand,til_fix=til_fix,store_dead=store_dead,save_events=save_events,**kwargs),timend/dt)
@@ -0,0 +1,326 @@
+import numpy as np
+from structure.global_constants import A0,ETA
+import libs.rng as rng
+import libs.telemetry as telemetry
+
+#simulation loop shared by all models. each timestep cells move according to the force law, an update rule carries out
+#cell divisions and deaths, and the tissue is retriangulated. update rules are objects with methods
+#   events(tissue,dt,rand,profiler): carry out divisions/deaths for one timestep, returns True if any occurred
+#   stop(tissue): returns True if the simulation should end before the next timestep (e.g. population size limits)
+#the rules below reproduce the update rules of contact_inhibition_lib, pd_lib, pd_lib_neutral, public_goods_lib,
+#density_dep_lib and stress_dep_lib, making the same random number calls in the same order as the original loops.
+#the decoupled, death-birth and area threshold rules (and deaths in EnergyCheckpoint) draw each kind of random event
+#from rng.stream(rand,kind), so passing an rng.Streams object gives common random numbers for paired runs.
+
+def fixed(tissue):
+    """returns True if tissue has reached fixation (of cell type, or of ancestor if cells have no type)"""
+    try:
+        return (1 not in tissue.properties['type'] or 0 not in tissue.properties['type'])
+    except KeyError:
+        return np.all(tissue.properties['ancestor']==tissue.properties['ancestor'][0])
+
+def simulation(tissue,dt,N_steps,stepsize,rand,rule,eta=ETA,progress_on=False,return_events=False,til_fix=False,
+                initial=True,profiler=telemetry.NULL):
+    """generator running simulation of tissue with given update rule, yielding the tissue after each timestep
+    (or None for timesteps without events if return_events=True). yields initial tissue first if initial=True.
+    stops when rule.stop(tissue) is True, or if til_fix=True after fixation at a timestep that is a multiple of stepsize"""
+    if initial: yield tissue
+    progress = telemetry.progress(progress_on,N_steps,dt)
+    mesh = tissue.mesh
+    step = 0
+    profiler.tic()
+    while True:
+        if progress is not None: progress.update(tissue)
+        if rule.stop(tissue):
+            break
+        profiler.count('steps')
+        profiler.count('cells',len(tissue))
+        dr = tissue.dr(dt,eta)
+        profiler.toc('force')
+        mesh.move_all(dr)
+        profiler.toc('move_all')
+        event_occurred = rule.events(tissue,dt,rand,profiler)
+        profiler.toc('selection')
+        tissue.update(dt)
+        profiler.toc('retriangulate')
+        profiler.count('retriangulations')
+        step += 1
+        complete = til_fix and step%stepsize==0 and fixed(tissue)
+        if not return_events or event_occurred:
+            yield tissue
+        else: yield
+        profiler.toc('recording')
+        if complete:
+            break
+
+#------------------------------------------------------------------------------------------------------------------------
+#fitness
+
+def get_fitness(cell_type,neighbour_types,DELTA,game,game_constants):
+    """calculate fitness of single cell"""
+    return 1+DELTA*game(cell_type,neighbour_types,*game_constants)
+
+def recalculate_fitnesses(neighbours_by_cell,types,DELTA,game,game_constants):
+    """calculate fitnesses of all cells"""
+    return np.array([get_fitness(types[cell],types[neighbours],DELTA,game,game_constants)
+                        for cell,neighbours in enumerate(neighbours_by_cell)])
+
+#------------------------------------------------------------------------------------------------------------------------
+#update rules
+
+class UpdateRule(object):
+    """abstract update rule"""
+
+    def stop(self,tissue):
+        return False
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        raise NotImplementedError()
+
+class PopulationLimits(UpdateRule):
+    """update rule that stops the simulation if population size is at most N_min or at least N_limit"""
+    N_min = 16
+    N_limit = np.inf
+
+    def stop(self,tissue):
+        N = len(tissue)
+        return N <= self.N_min or N >= self.N_limit
+
+class Decoupled(UpdateRule):
+    """decoupled update: at total rate rate*N a cell divides (chosen at random, or with probability proportional to
+    fitness if game is given) and a random cell dies.
+    death_offset: the dead cell is chosen at random from cells 0,...,N+death_offset-1 (N is the number of cells at the start of
+    the timestep, the tissue is resized on update)
+    divided: flags passed to tissue.remove for the mother and dead cell (recorded in cell histories)
+    recalculate_fitnesses: function giving fitnesses of all cells (called as in engine.recalculate_fitnesses)"""
+
+    def __init__(self,rate,DELTA=None,game=None,game_constants=None,death_offset=-2,divided=(True,False),
+                    recalculate_fitnesses=recalculate_fitnesses):
+        self.rate = rate
+        self.DELTA,self.game,self.game_constants = DELTA,game,game_constants
+        self.death_offset = death_offset
+        self.divided = divided
+        self.recalculate_fitnesses = recalculate_fitnesses
+
+    def choose_mother(self,tissue,rand,profiler):
+        N = len(tissue)
+        if self.game is None:
+            return rng.stream(rand,'parent').randint(N)
+        fitnesses = self.recalculate_fitnesses(tissue.mesh.neighbours,tissue.properties['type'],self.DELTA,self.game,self.game_constants)
+        profiler.toc('fitness')
+        return rng.weighted_choice(rng.stream(rand,'parent'),N,fitnesses)
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        N = len(tissue)
+        if rng.stream(rand,'timing').rand() < self.rate*N*dt:
+            mother = self.choose_mother(tissue,rand,profiler)
+            profiler.toc('selection')
+            tissue.add_daughter_cells(mother,rng.stream(rand,'angle'))
+            tissue.remove(mother,self.divided[0])
+            tissue.remove(rng.stream(rand,'death').randint(N+self.death_offset),self.divided[1]) #kill random cell
+            profiler.toc('add_remove')
+            profiler.count('divisions')
+            profiler.count('deaths')
+            return True
+        return False
+
+class DeathBirth(UpdateRule):
+    """death-birth update: at total rate rate*N a random cell dies and is replaced by the division of one of its neighbours
+    (chosen at random, or with probability proportional to fitness if game is given).
+    remove_together: remove mother and dead cell in a single call (otherwise mother is removed first and the dead cell
+    then removed by its original index, as in pd_lib and public_goods_lib)
+    divided: flags passed to tissue.remove for the mother and dead cell (recorded in cell histories)"""
+
+    def __init__(self,rate,DELTA=None,game=None,game_constants=None,remove_together=True,divided=(True,False),
+                    get_fitness=get_fitness):
+        self.rate = rate
+        self.DELTA,self.game,self.game_constants = DELTA,game,game_constants
+        self.remove_together = remove_together
+        self.divided = divided
+        self.get_fitness = get_fitness
+
+    def choose_mother(self,tissue,rand,dead_cell,profiler):
+        dead_cell_neighbours = tissue.mesh.neighbours[dead_cell]
+        if self.game is None:
+            return rng.stream(rand,'parent').choice(dead_cell_neighbours)
+        types = tissue.properties['type']
+        fitnesses = np.array([self.get_fitness(types[cell],types[tissue.mesh.neighbours[cell]],self.DELTA,self.game,self.game_constants)
+                                for cell in dead_cell_neighbours])
+        profiler.toc('fitness')
+        return rng.weighted_choice(rng.stream(rand,'parent'),dead_cell_neighbours,fitnesses)
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        N = len(tissue)
+        if rng.stream(rand,'timing').rand() < self.rate*N*dt:
+            dead_cell = rng.stream(rand,'death').randint(N)
+            mother = self.choose_mother(tissue,rand,dead_cell,profiler)
+            profiler.toc('selection')
+            tissue.add_daughter_cells(mother,rng.stream(rand,'angle'))
+            if self.remove_together:
+                tissue.remove((mother,dead_cell),self.divided)
+            else:
+                tissue.remove(mother,self.divided[0])
+                tissue.remove(dead_cell,self.divided[1])
+            profiler.toc('add_remove')
+            profiler.count('divisions')
+            profiler.count('deaths')
+            return True
+        return False
+
+def _death(tissue,death_rate,dt,rand,profiler):
+    """random cell death at total rate death_rate*N"""
+    if death_rate is None:
+        return False
+    N = len(tissue)
+    if rng.stream(rand,'timing').rand() < N*death_rate*dt:
+        tissue.remove(rng.stream(rand,'death').randint(N),False)
+        profiler.toc('add_remove')
+        profiler.count('deaths')
+        return True
+    return False
+
+class AreaThreshold(PopulationLimits):
+    """contact inhibition: cells with area above threshold_area_fraction*A0 divide at total rate division_rate per cell
+    (mother chosen at random or with probability proportional to fitness; game='simple' gives fitness 1+DELTA*type).
+    independently cells die at random at rate death_rate"""
+
+    def __init__(self,rates,threshold_area_fraction=0.,DELTA=None,game=None,game_constants=None,N_limit=np.inf,get_fitness=get_fitness):
+        self.death_rate,self.division_rate = rates
+        self.threshold_area_fraction = threshold_area_fraction
+        self.DELTA,self.game,self.game_constants = DELTA,game,game_constants
+        self.N_limit = N_limit
+        self.get_fitness = get_fitness
+
+    def choose_mother(self,tissue,rand,division_ready,profiler):
+        properties,mesh = tissue.properties,tissue.mesh
+        if self.game is None:
+            return rng.stream(rand,'parent').choice(division_ready)
+        elif self.game == "simple":
+            fitnesses = properties["type"][division_ready] * self.DELTA + 1
+        else:
+            fitnesses = np.array([self.get_fitness(properties['type'][cell],properties['type'][mesh.neighbours[cell]],self.DELTA,self.game,self.game_constants)
+                            for cell in division_ready])
+        profiler.toc('fitness')
+        return rng.weighted_choice(rng.stream(rand,'parent'),division_ready,fitnesses)
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        event_occurred = False
+        division_ready = np.where(tissue.mesh.areas > self.threshold_area_fraction*A0)[0]
+        if rng.stream(rand,'timing').rand() < len(division_ready)*self.division_rate*dt:
+            mother = self.choose_mother(tissue,rand,division_ready,profiler)
+            profiler.toc('selection')
+            tissue.add_daughter_cells(mother,rng.stream(rand,'angle'))
+            tissue.remove(mother,True)
+            profiler.toc('add_remove')
+            profiler.count('divisions')
+            event_occurred = True
+        return _death(tissue,self.death_rate,dt,rand,profiler) or event_occurred
+
+def step_function(val,threshold):
+    return np.heaviside(val-threshold,1)
+
+def G_to_S_transition(properties,age,tension_area_product,G_to_S_rate,dt,CIP_function,CIP_parameters,rand):
+    """cells in G1 (cycle_phase 0) enter S phase (cycle_phase 1) at rate G_to_S_rate*CIP_function(energy).
+    returns True if any transitions occurred"""
+    cycle_phases = properties['cycle_phase']
+    energies = np.array([tension_area_product(i) if phase==0 else np.inf
+                            for i,phase in enumerate(cycle_phases)])
+    transitions = rand.rand(len(energies))<G_to_S_rate*dt*CIP_function(energies,**CIP_parameters)
+    if not np.any(transitions):
+        return False
+    else:
+        cycle_phases[transitions]=1
+        properties['transition_age'][transitions]=age[transitions]
+        return True
+
+class EnergyCheckpoint(PopulationLimits):
+    """contact inhibition with two stage cell cycle: G1 cells pass an energy checkpoint to enter S phase
+    (see G_to_S_transition), S phase cells divide at rate S_to_div_rate and cells die at random at rate death_rate"""
+
+    def __init__(self,rates,CIP_parameters=None,CIP_function=None,N_limit=np.inf):
+        self.death_rate,self.G_to_S_rate,self.S_to_div_rate = rates
+        self.CIP_parameters = CIP_parameters
+        self.CIP_function = step_function if CIP_function is None else CIP_function
+        self.N_limit = N_limit
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        properties = tissue.properties
+        event_occurred = G_to_S_transition(properties,tissue.age,tissue.tension_area_product,self.G_to_S_rate,dt,
+                                            self.CIP_function,self.CIP_parameters,rand)
+        profiler.toc('fitness')
+        num_S_cells = sum(properties['cycle_phase'])
+        if rand.rand() < num_S_cells*self.S_to_div_rate*dt:
+            mother = rng.weighted_choice(rand,len(tissue),properties['cycle_phase'])
+            profiler.toc('selection')
+            tissue.add_daughter_cells(mother,rand,{'cycle_phase':(0,0),'transition_age':(-1,-1)})
+            tissue.remove(mother,True)
+            profiler.toc('add_remove')
+            profiler.count('divisions')
+            event_occurred = True
+        return _death(tissue,self.death_rate,dt,rand,profiler) or event_occurred
+
+class DensityDependent(UpdateRule):
+    """each cell divides with probability fitness*birth_rate*birth_dd_func(local density)*dt and dies with probability
+    death_rate*death_dd_func(local density)*dt per timestep (game='simple' gives fitness 1+DELTA*game_params*type)"""
+
+    def __init__(self,birth_rate,death_rate,DELTA,game,game_params,birth_dd_func,birth_dd_params,death_dd_func,death_dd_params,
+                    store_dead=False,recalculate_fitnesses=recalculate_fitnesses):
+        self.birth_rate,self.death_rate = birth_rate,death_rate
+        self.DELTA,self.game,self.game_params = DELTA,game,game_params
+        self.birth_dd_func,self.birth_dd_params = birth_dd_func,birth_dd_params
+        self.death_dd_func,self.death_dd_params = death_dd_func,death_dd_params
+        self.store_dead = store_dead
+        self.recalculate_fitnesses = recalculate_fitnesses
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        N,properties,mesh = len(tissue),tissue.properties,tissue.mesh
+        if self.game == 'simple': fitnesses = 1+self.DELTA*self.game_params*properties['type']
+        else: fitnesses = self.recalculate_fitnesses(mesh.neighbours,properties['type'],self.DELTA,self.game,self.game_params)
+        densities = mesh.local_density()
+        profiler.toc('fitness')
+        births = np.where(rand.rand(N) < fitnesses*self.birth_rate*self.birth_dd_func(densities,*self.birth_dd_params)*dt)[0]
+        deaths = np.where(rand.rand(N) < self.death_rate*self.death_dd_func(densities,*self.death_dd_params)*dt)[0]
+        profiler.toc('selection')
+        if len(births)==0 and len(deaths)==0:
+            return False
+        if len(births)>0: tissue.add_many_daughter_cells(births,rand)
+        if self.store_dead: divided = np.array([True]*len(births)+[False]*len(deaths))
+        else: divided = None
+        tissue.remove(np.append(births,deaths),divided)
+        profiler.toc('add_remove')
+        profiler.count('divisions',len(births))
+        profiler.count('deaths',len(deaths))
+        return True
+
+class StressDependent(PopulationLimits):
+    """cells divide on reaching the end of their cell cycle (properties['cycle_length']) if their stress is below
+    stress_threshold, and die on reaching properties['age_of_death'] (no death if T_D is None).
+    cycle_function(n,rand) and death_function(n,rand,T_D=T_D) give cycle lengths and ages of death of daughter cells"""
+
+    def __init__(self,cycle_function,death_function=None,T_D=None,stress_threshold=np.inf,N_limit=np.inf):
+        self.cycle_function,self.death_function = cycle_function,death_function
+        self.T_D = T_D
+        self.stress_threshold = stress_threshold
+        self.N_limit = N_limit
+
+    def events(self,tissue,dt,rand,profiler=telemetry.NULL):
+        properties = tissue.properties
+        births = np.where(properties['cycle_length']<=tissue.age)[0]
+        births = [mother for mother in births if tissue.cell_stress(mother) < self.stress_threshold]
+        profiler.toc('fitness')
+        if len(births)>0:
+            for mother in births:
+                daughter_properties = {'cycle_length':self.cycle_function(2,rand)}
+                if self.T_D is not None: daughter_properties['age_of_death'] = self.death_function(2,rand,T_D=self.T_D)
+                tissue.add_daughter_cells(mother,rand,daughter_properties)
+            tissue.remove(births,True)
+            profiler.toc('add_remove')
+            profiler.count('divisions',len(births))
+        deaths = []
+        if self.T_D is not None:
+            deaths = np.where(tissue.properties['age_of_death']<=tissue.age)[0]
+            if len(deaths)>0:
+                tissue.remove(deaths,False)
+                profiler.toc('add_remove')
+                profiler.count('deaths',len(deaths))
+        return len(births)!=0 or len(deaths)!=0
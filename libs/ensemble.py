@@ -0,0 +1,104 @@
+import numpy as np
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from structure.global_constants import ETA
+import libs.engine as engine
+import libs.telemetry as telemetry
+
+#many independent tissues stepped in lockstep within one process. the force calculation and retriangulation (qhull and
+#numpy release the GIL for most of their work) are run for all tissues in a thread pool, while divisions and deaths (pure
+#python) are carried out serially. each tissue has its own update rule and RandomState, so every tissue follows exactly the
+#trajectory it would have in engine.simulation with the same rule and RandomState, regardless of the number of threads.
+#useful on memory constrained nodes where a process pool would need a copy of the interpreter and data for every worker.
+
+class Ensemble(object):
+    """lockstep simulation of independent tissues.
+    rules: update rule for all tissues (rules in engine are stateless so can be shared) or list with one rule per tissue
+    rands: list with one RandomState per tissue (e.g. [rng.replicate_rand(root,i) for i in ...])
+    til_fix: stop each tissue after fixation at a timestep that is a multiple of stepsize (see engine.simulation)
+    record_sizes: record population size of each tissue every stepsize timesteps (including initial tissue) in pop_sizes"""
+
+    def __init__(self,tissues,rules,rands,dt,stepsize=1,eta=ETA,threads=None,til_fix=False,record_sizes=False,profiler=telemetry.NULL):
+        self.tissues = list(tissues)
+        n = len(self.tissues)
+        self.rules = list(rules) if isinstance(rules,(list,tuple)) else [rules]*n
+        self.rands = list(rands)
+        if len(self.rules) != n or len(self.rands) != n:
+            raise ValueError('need one rule and one RandomState per tissue')
+        self.dt,self.stepsize,self.eta = dt,stepsize,eta
+        self.til_fix = til_fix
+        self.profiler = profiler
+        self.steps = np.zeros(n,dtype=int)
+        self.done = np.zeros(n,dtype=bool)
+        self.events = np.zeros(n,dtype=bool)
+        self.pop_sizes = [[len(tissue)] for tissue in self.tissues] if record_sizes else None
+        self.threads = cpu_count() if threads is None else threads
+        self._pool = ThreadPool(min(self.threads,n)) if self.threads > 1 and n > 1 else None
+
+    def __len__(self):
+        return len(self.tissues)
+
+    def _map(self,func,idx):
+        if self._pool is None:
+            return map(func,idx)
+        return self._pool.map(func,idx)
+
+    def _move(self,i):
+        tissue = self.tissues[i]
+        tissue.mesh.move_all(tissue.dr(self.dt,self.eta))
+
+    def _update(self,i):
+        self.tissues[i].update(self.dt)
+
+    def active(self):
+        """indices of tissues that have not stopped"""
+        return np.where(~self.done)[0]
+
+    def step(self,N_steps=np.inf):
+        """advance all active tissues that have run fewer than N_steps timesteps by one timestep.
+        returns indices of tissues that were advanced"""
+        profiler = self.profiler
+        for i in self.active():
+            if self.rules[i].stop(self.tissues[i]):
+                self.done[i] = True
+        active = self.active()
+        active = active[self.steps[active] < N_steps]
+        if len(active) == 0:
+            return active
+        profiler.tic()
+        profiler.count('steps',len(active))
+        profiler.count('cells',sum(len(self.tissues[i]) for i in active))
+        self._map(self._move,active)
+        profiler.toc('force')
+        for i in active:
+            self.events[i] = self.rules[i].events(self.tissues[i],self.dt,self.rands[i])
+        profiler.toc('selection')
+        self._map(self._update,active)
+        profiler.toc('retriangulate')
+        profiler.count('retriangulations',len(active))
+        self.steps[active] += 1
+        for i in active:
+            if self.steps[i]%self.stepsize == 0:
+                if self.pop_sizes is not None: self.pop_sizes[i].append(len(self.tissues[i]))
+                if self.til_fix and engine.fixed(self.tissues[i]):
+                    self.done[i] = True
+        profiler.toc('recording')
+        return active
+
+    def run(self,N_steps):
+        """step until all tissues have stopped or have run N_steps timesteps. returns list of tissues"""
+        while len(self.step(N_steps)):
+            pass
+        return self.tissues
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
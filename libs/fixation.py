@@ -0,0 +1,115 @@
+import numpy as np
+from scipy import stats,optimize
+
+#confidence intervals for fixation probabilities and sequential stopping rules for sweeps that run replicates in batches
+#until the fixation probability at a parameter point is known to a given precision, or is significantly different from a
+#reference value (e.g. the neutral fixation probability 1/N). runs that are incomplete (neither fixed nor lost) are
+#excluded, as in the fixed/lost/incomplete counts written by the drivers.
+#the interval is checked after every batch, so to keep the overall error rate below alpha the critical value at each
+#check follows an o'brien-fleming boundary: z = c*sqrt(max_sims/n) after n replicates, with c chosen so that the
+#probability of crossing at any of max_looks equally spaced looks is alpha under p0. this spends little alpha at early
+#looks and leaves a final critical value close to the fixed sample one (c = 2.04 for 5 looks, 2.16 for 50 at alpha=0.05),
+#whereas a bonferroni correction (alpha/max_looks at every look, boundary='bonferroni') gives z = 3.29 for 50 looks and
+#so much wider intervals. intervals at each look are the corresponding repeated confidence intervals, so the precision
+#criterion uses the same critical values.
+
+def wilson_interval(k,n,alpha=0.05):
+    """wilson score interval for binomial proportion given k successes in n trials"""
+    if n == 0: return (0.,1.)
+    z = stats.norm.isf(alpha/2.)
+    p = float(k)/n
+    denominator = 1+z**2/n
+    centre = (p+z**2/(2*n))/denominator
+    half_width = z*np.sqrt(p*(1-p)/n+z**2/(4.*n**2))/denominator
+    return (max(0.,centre-half_width),min(1.,centre+half_width))
+
+def clopper_pearson_interval(k,n,alpha=0.05):
+    """exact (clopper-pearson) interval for binomial proportion given k successes in n trials"""
+    if n == 0: return (0.,1.)
+    lower = stats.beta.ppf(alpha/2.,k,n-k+1) if k > 0 else 0.
+    upper = 1-stats.beta.ppf(alpha/2.,n-k,k+1) if k < n else 1.
+    return (lower,upper)
+
+INTERVALS = {'wilson':wilson_interval,'clopper_pearson':clopper_pearson_interval}
+
+def counts(fixation):
+    """(fixed,lost,incomplete) given array of fixation results (1 fixed, 0 lost, -1 incomplete)"""
+    fixation = np.asarray(fixation)
+    return (int(np.sum(fixation==1)),int(np.sum(fixation==0)),int(np.sum(fixation==-1)))
+
+def interval(fixation,alpha=0.05,method='wilson'):
+    """estimate and confidence interval for fixation probability given array of fixation results"""
+    fixed,lost,incomplete = counts(fixation)
+    n = fixed+lost
+    return (float(fixed)/n if n else np.nan,)+INTERVALS[method](fixed,n,alpha)
+
+def _crossing_probability(c,max_looks,grid=801):
+    """probability that a standard brownian motion observed at times 1/max_looks,...,1 leaves (-c,c)"""
+    x = np.linspace(-c,c,grid)
+    h = x[1]-x[0]
+    sd = np.sqrt(1./max_looks)
+    f = stats.norm.pdf(x,scale=sd) #density of the path at the first look, within the continuation region
+    kernel = stats.norm.pdf(x[:,None]-x[None,:],scale=sd)*h
+    kernel[:,0] *= 0.5 #trapezoid rule
+    kernel[:,-1] *= 0.5
+    for look in range(max_looks-1):
+        f = kernel.dot(f)
+    return 1.-h*(np.sum(f)-0.5*(f[0]+f[-1]))
+
+def obrien_fleming_constant(max_looks,alpha=0.05):
+    """constant c of the two sided o'brien-fleming boundary z_k = c*sqrt(max_looks/k) with overall error alpha"""
+    if max_looks <= 1: return stats.norm.ppf(1-alpha/2.)
+    return optimize.brentq(lambda c: _crossing_probability(c,max_looks)-alpha,stats.norm.ppf(1-alpha/2.),stats.norm.ppf(1-alpha/(2.*max_looks))+0.5)
+
+BOUNDARIES = ('obrien_fleming','bonferroni')
+
+class StoppingRule(object):
+    """sequential stopping rule for fixation probability estimates. stop when
+        precision is not None and half width of the confidence interval <= precision (or <= precision*estimate if relative)
+        p0 is not None and the confidence interval excludes p0 (fixation probability significantly different from p0)
+        max_sims replicates have been run
+    but not before min_sims replicates. max_looks is the maximum number of times the rule is checked (e.g. max_sims/batch_size).
+    boundary: 'obrien_fleming' or 'bonferroni', how alpha is spread over the looks (see above)"""
+
+    def __init__(self,precision=None,p0=None,alpha=0.05,method='wilson',min_sims=100,max_sims=10000,max_looks=1,relative=False,
+                    boundary='obrien_fleming'):
+        if boundary not in BOUNDARIES: raise ValueError('boundary must be one of %s'%', '.join(BOUNDARIES))
+        self.precision,self.p0,self.relative = precision,p0,relative
+        self.alpha,self.method = alpha,method
+        self.min_sims,self.max_sims = min_sims,max_sims
+        self.max_looks = max(max_looks,1)
+        self.boundary = boundary
+        if boundary == 'obrien_fleming': self.c = obrien_fleming_constant(self.max_looks,alpha)
+
+    def look_alpha(self,n):
+        """nominal (two sided) level of the interval after n replicates"""
+        if self.boundary == 'bonferroni': return self.alpha/self.max_looks
+        z = self.c*np.sqrt(self.max_sims/float(min(max(n,1),self.max_sims)))
+        return 2*stats.norm.sf(z)
+
+    def check(self,fixation):
+        """returns (stop,reason,(estimate,lower,upper))"""
+        estimate,lower,upper = interval(fixation,self.look_alpha(len(fixation)),self.method)
+        ci = (estimate,lower,upper)
+        if len(fixation) >= self.max_sims:
+            return True,'max_sims',ci
+        if len(fixation) < self.min_sims:
+            return False,None,ci
+        if self.p0 is not None and (upper < self.p0 or lower > self.p0):
+            return True,'p0',ci
+        if self.precision is not None:
+            target = self.precision*estimate if self.relative else self.precision
+            if (upper-lower)/2. <= target:
+                return True,'precision',ci
+        return False,None,ci
+
+def run_adaptive(run_batch,batch_size,rule):
+    """run replicates in batches with run_batch(start,stop) (returning fixation results of replicates start,...,stop-1)
+    until rule (StoppingRule) is satisfied. returns (fixation results,reason,(estimate,lower,upper))"""
+    fixation = []
+    while True:
+        start = len(fixation)
+        fixation.extend(run_batch(start,min(start+batch_size,rule.max_sims)))
+        stop,reason,ci = rule.check(fixation)
+        if stop:
+            return np.array(fixation),reason,ci
@@ -5,6 +5,9 @@ import structure
 from structure.global_constants import T_D,dt
 from structure.cell import Tissue, BasicSpringForceNoGrowth
 import structure.initialisation as init
+import structure.kernels as kernels
+import libs.rng as rng
+import libs.engine as engine
 
 def print_progress(step,N_steps):
     sys.stdout.write("\r %.2f %%"%(step*100/N_steps))
@@ -147,71 +150,19 @@ def recalculate_fitnesses(neighbours_by_cell,types,DELTA,game,game_constants,fit
 
 def simulation_decoupled_update_exp_fitness(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,progress_on=False):
     """simulation loop for decoupled update rule"""
-    step = 0.
-    yield tissue
-    while True:
-        if progress_on: print_progress(step,N_steps)
-        N= len(tissue)
-        properties = tissue.properties
-        mesh = tissue.mesh
-        step += 1
-        mesh.move_all(tissue.dr(dt))
-        if rand.rand() < (1./T_D)*N*dt:
-            fitnesses = recalculate_fitnesses(tissue.mesh.neighbours,
-                properties['type'],DELTA,game,game_constants,
-                fitness_map = 'exp')
-            mother = np.where(rand.multinomial(1,
-                            fitnesses/sum(fitnesses))==1)[0][0]   
-            tissue.add_daughter_cells(mother,rand)
-            tissue.remove(mother)
-            tissue.remove(rand.randint(N)) #kill random cell
-        tissue.update(dt)
-        
-        yield tissue
+    exp_fitnesses = lambda neighbours_by_cell,types,DELTA,game,game_constants: recalculate_fitnesses(neighbours_by_cell,types,DELTA,game,game_constants,fitness_map='exp')
+    rule = engine.Decoupled(1./T_D,DELTA,game,game_constants,death_offset=0,divided=(None,None),recalculate_fitnesses=exp_fitnesses)
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,progress_on=progress_on)
 
 def simulation_decoupled_update(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,progress_on=False):
     """simulation loop for decoupled update rule"""
-    step = 0.
-    yield tissue
-    while True:
-        if progress_on: print_progress(step,N_steps)
-        N= len(tissue)
-        properties = tissue.properties
-        mesh = tissue.mesh
-        step += 1
-        mesh.move_all(tissue.dr(dt))
-        if rand.rand() < (1./T_D)*N*dt:
-            fitnesses = recalculate_fitnesses(tissue.mesh.neighbours,properties['type'],DELTA,game,game_constants)
-            mother = np.where(rand.multinomial(1,fitnesses/sum(fitnesses))==1)[0][0]   
-            tissue.add_daughter_cells(mother,rand)
-            tissue.remove(mother)
-            tissue.remove(rand.randint(N)) #kill random cell
-        tissue.update(dt)
-        
-        yield tissue
+    rule = engine.Decoupled(1./T_D,DELTA,game,game_constants,death_offset=0,divided=(None,None),recalculate_fitnesses=recalculate_fitnesses)
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,progress_on=progress_on)
 
 def simulation_death_birth(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,progress_on=False):
     """simulation loop for death-birth update rule"""
-    step = 0.
-    yield tissue
-    while True:
-        if progress_on: print_progress(step,N_steps)
-        N= len(tissue)
-        properties = tissue.properties
-        mesh = tissue.mesh
-        step += 1
-        mesh.move_all(tissue.dr(dt))
-        if rand.rand() < (1./T_D)*N*dt:
-            dead_cell = rand.randint(N)
-            dead_cell_neighbours = tissue.mesh.neighbours[dead_cell]
-            neighbours_by_cell = [tissue.mesh.neighbours[dcn] for dcn in dead_cell_neighbours]
-            fitnesses = np.array([get_fitness(tissue.properties['type'][cell],tissue.properties['type'][neighbours],DELTA,game,game_constants) for cell,neighbours in zip(dead_cell_neighbours,neighbours_by_cell)])
-            mother = rand.choice(dead_cell_neighbours,p=fitnesses/sum(fitnesses))
-            tissue.add_daughter_cells(mother,rand)
-            tissue.remove(mother)
-            tissue.remove(dead_cell) #kill random cell
-        tissue.update(dt)
-        yield tissue
+    rule = engine.DeathBirth(1./T_D,DELTA,game,game_constants,remove_together=False,divided=(None,None),get_fitness=get_fitness_linear)
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,progress_on=progress_on)
 
 def simulation_no_division(tissue,dt,N_steps,rand):
     """run tissue simulation with no death or division"""
@@ -251,12 +202,14 @@ def simulation_no_division(tissue,dt,N_steps,rand):
 #         yield tissue
 
     
+@kernels.run_with_backend
 def run_simulation(simulation,N,timestep,timend,rand,DELTA,game,constants,init_time=None,til_fix=True,save_areas=False,
-                    tissue=None,mutant_num=1,save_cell_histories=False,progress_on=False):
+                    tissue=None,mutant_num=1,save_cell_histories=False,progress_on=False,backend=None):
     """initialise tissue with NxN cells and run given simulation with given game and constants.
             starts with single cooperator
             ends at time=timend OR if til_fix=True when population all cooperators (type=1) or defectors (2)
         returns history: list of tissue objects at time intervals given by timestep
+        backend: kernel backend for this run only (see structure/kernels.run_with_backend), default is the current backend
             """
     if tissue is None:
         tissue = init.init_tissue_torus(N,N,0.01,BasicSpringForceNoGrowth(),
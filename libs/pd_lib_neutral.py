@@ -6,6 +6,10 @@ import structure
 from structure.global_constants import T_D,dt,ETA,MU
 from structure.cell import Tissue, BasicSpringForceNoGrowth
 import structure.initialisation as init
+import structure.kernels as kernels
+from libs.replay import run_til_fix_recorded
+import libs.telemetry as telemetry
+import libs.engine as engine
 
 def print_progress(step,N_steps):
     sys.stdout.write("\r %.2f %%"%(step*100./N_steps))
@@ -61,35 +65,22 @@ def simulation_no_division(tissue,dt,N_steps,rand):
         tissue.update(dt)
         yield tissue
 
-def simulation(tissue,dt,N_steps,stepsize,rand,eta=ETA,progress_on=False):
-    yield tissue
-    step = 1.
-    while True:
-        N= len(tissue)
-        properties = tissue.properties
-        mesh = tissue.mesh
-        mesh.move_all(tissue.dr(dt,eta))
-        if rand.rand() < (1./T_D)*N*dt:
-            mother = rand.randint(N)
-            tissue.add_daughter_cells(mother,rand)
-            tissue.remove(mother,True)
-            tissue.remove(rand.randint(N)) #kill random cell
-        tissue.update(dt)
-        if progress_on: print_progress(step,N_steps)
-        step += 1 
-        yield tissue
+def simulation(tissue,dt,N_steps,stepsize,rand,eta=ETA,progress_on=False,profiler=telemetry.NULL):
+    """simulation loop for neutral process with decoupled update rule"""
+    rule = engine.Decoupled(1./T_D,death_offset=0,divided=(True,None))
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,eta,progress_on,profiler=profiler)
         
-def simulation_ancestor_tracking(tissue,dt,N_steps,stepsize,rand,eta=ETA,progress_on=False):
+def simulation_ancestor_tracking(tissue,dt,N_steps,stepsize,rand,eta=ETA,progress_on=False,profiler=telemetry.NULL):
     """simulation loop for neutral process tracking ancestor ids"""
     tissue.properties['ancestor']=np.arange(len(tissue))
-    return simulation(tissue,dt,N_steps,stepsize,rand,eta=eta,progress_on=progress_on)
+    return simulation(tissue,dt,N_steps,stepsize,rand,eta=eta,progress_on=progress_on,profiler=profiler)
     
 
-def simulation_mutant_tracking(tissue,dt,N_steps,stepsize,rand,eta=ETA,progress_on=False,mutant_number=1,mutant_type=1):
+def simulation_mutant_tracking(tissue,dt,N_steps,stepsize,rand,eta=ETA,progress_on=False,mutant_number=1,mutant_type=1,profiler=telemetry.NULL):
     """simulation loop for neutral process tracking mutant ids"""
     tissue.properties['type'] = np.full(len(tissue),1-mutant_type,dtype=int)
     tissue.properties['type'][rand.choice(len(tissue),size=mutant_number,replace=False)]=mutant_type
-    return simulation(tissue,dt,N_steps,stepsize,rand,eta=eta,progress_on=progress_on)
+    return simulation(tissue,dt,N_steps,stepsize,rand,eta=eta,progress_on=progress_on,profiler=profiler)
 
 def initialise_tissue(N,dt,timend,timestep,rand,mu=MU,save_areas=False,save_cell_histories=False):  
     """initialise tissue and run simulation until timend returning final state"""              
@@ -99,18 +90,25 @@ def initialise_tissue(N,dt,timend,timestep,rand,mu=MU,save_areas=False,save_cell
         tissue.reset(reset_age=True)
     return tissue
 
+@kernels.run_with_backend
 def run_simulation(simulation,N,timestep,timend,rand,init_time=None,mu=MU,eta=ETA,dt=dt,til_fix=True,generator=False,save_areas=False,
-                tissue=None,save_cell_histories=False,progress_on=False,**kwargs):
+                tissue=None,save_cell_histories=False,progress_on=False,record=False,keyframe_interval=1000,tissue_cache=None,replicate=None,backend=None,**kwargs):
     """initialise tissue with NxN cells and run given simulation with given game and constants.
             starts with single cooperator
             ends at time=timend OR if til_fix=True when population all cooperators (type=1) or defectors (2)
         returns history: list of tissue objects at time intervals given by timestep
+            (or if record=True a replay.Trajectory of the simulation until fixation)
+        backend: kernel backend for this run only (see structure/kernels.run_with_backend), default is the current backend
             """
-    if tissue is None:
+    if tissue is None and tissue_cache is None:
         tissue = initialise_tissue(N,dt,init_time,timestep,rand,mu=mu,save_areas=save_areas,save_cell_histories=save_cell_histories)
+    elif tissue is None:
+        tissue = tissue_cache.sample(initialise_tissue,rand,index=replicate,N=N,dt=dt,timend=init_time,timestep=timestep,mu=mu,save_areas=save_areas,save_cell_histories=save_cell_histories)
     if til_fix:
         include_fix = not (til_fix=='exclude_final')
-        if generator:
+        if record:
+            history = run_til_fix_recorded(simulation(tissue,dt,timend/dt,timestep/dt,rand,eta=eta,progress_on=progress_on,**kwargs),tissue,timend/dt,dt,fixed,rand,eta,keyframe_interval)
+        elif generator:
             history = generate_til_fix(simulation(tissue,dt,timend/dt,timestep/dt,rand,eta=eta,progress_on=progress_on,**kwargs),timend/dt,timestep/dt,include_fix)
         else:
             history = run_til_fix(simulation(tissue,dt,timend/dt,timestep/dt,rand,eta=eta,progress_on=progress_on,**kwargs),timend/dt,timestep/dt)
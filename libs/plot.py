@@ -133,7 +133,7 @@ def multi_torus_plot(tissue_list,nrows,ncols,param_name=None,param_vals=None,fmt
     plt.subplots_adjust(left=0.0,right=1.0,bottom=0.0,top=0.94,wspace=0.0,hspace=0.15)
 
 def plot_neighbours_of_most_recent_deaths(tissue,n,ax,palette=None):
-    if tissue.cell_histories != {}:
+    if len(tissue.cell_histories):
         if palette is None:
             palette = sns.cubehelix_palette(n, start=0.4,dark=0,rot=0,light=0.5,reverse=True)
         centres=tissue.mesh.centres
@@ -147,10 +147,10 @@ def plot_neighbours_of_most_recent_deaths(tissue,n,ax,palette=None):
             plt.plot(centres_to_plot[:,0], centres_to_plot[:,1], 'o',color=color)  
 
 def plot_recent_divisions(tissue,n,ax,palette=None):
-    if tissue.cell_histories != {}:
+    if len(tissue.cell_histories):
         if palette is None:
             palette = sns.cubehelix_palette(n, start=0.4,dark=0,rot=0,light=0.5,reverse=True)
-        if tissue.time < (np.array(tissue.cell_histories['time'])[np.array(tissue.cell_histories['divided'])])[0]:
+        if tissue.time < tissue.cell_histories['time'][tissue.cell_histories['divided']][0]:
             return
         centres=np.flip(tissue.mesh.centres,axis=0)
         ages = np.flip(tissue.age)
@@ -5,6 +5,10 @@ import structure
 from structure.global_constants import T_D,dt,ETA,MU
 from structure.cell import Tissue, BasicSpringForceNoGrowth
 import structure.initialisation as init
+import structure.kernels as kernels
+import libs.rng as rng
+import libs.telemetry as telemetry
+import libs.engine as engine
 
 def print_progress(step,N_steps):
     sys.stdout.write("\r %.2f %%"%(step*100./N_steps))
@@ -88,6 +92,18 @@ def logistic_benefit(j,N,s,h):
 def logistic_function(j,N,s,h):
     return 1./(1.+np.exp(s*(h-float(j)/N)))
 
+#payoffs of all cells given arrays of cell types, sums of neighbour types and numbers of neighbours (used by kernels)
+def _sigmoid_game_vectorised(types,neighbour_sums,neighbour_numbers,b,c,s,h):
+    j,N = (neighbour_sums+types).astype(float),neighbour_numbers+1
+    logistic = lambda j: 1./(1.+np.exp(s*(h-j/N)))
+    return -c*types + b*(logistic(j)-logistic(0.))/(logistic(N.astype(float))-logistic(0.))
+
+VECTORISED_GAMES = {prisoners_dilemma_averaged: lambda types,neighbour_sums,neighbour_numbers,b,c: -c*types+b*neighbour_sums/neighbour_numbers,
+                    prisoners_dilemma_accumulated: lambda types,neighbour_sums,neighbour_numbers,b,c: -c*types*neighbour_numbers+b*neighbour_sums,
+                    N_person_prisoners_dilemma: lambda types,neighbour_sums,neighbour_numbers,b,c: -c*types + b*(neighbour_sums+types)/(neighbour_numbers+1),
+                    volunteers_dilemma: lambda types,neighbour_sums,neighbour_numbers,b,c,M: -c*types +b*((neighbour_sums+types)>=M),
+                    sigmoid_game: _sigmoid_game_vectorised}
+
 # ----------------------------------------------------------------------------------------------------------------
 
 def get_fitness(cell_type,neighbour_types,DELTA,game,game_constants):
@@ -96,26 +112,30 @@ def get_fitness(cell_type,neighbour_types,DELTA,game,game_constants):
 
 def recalculate_fitnesses(neighbours_by_cell,types,DELTA,game,game_constants):
     """calculate fitnesses of all cells"""
+    if kernels.accelerated() and game in VECTORISED_GAMES:
+        return kernels.fitnesses(neighbours_by_cell,types,DELTA,VECTORISED_GAMES[game],game_constants)
     return np.array([get_fitness(types[cell],types[neighbours],DELTA,game,game_constants) 
                         for cell,neighbours in enumerate(neighbours_by_cell)])
 
-def update_birth_and_death(tissue,rand,DELTA,game,game_constants,update):
+def update_birth_and_death(tissue,rand,DELTA,game,game_constants,update,profiler=telemetry.NULL):
     """update tissue with a cell division and cell death according to game and update rule"""
     if update == 'death_birth':
         dead_cell = rand.randint(len(tissue))
-        parent = choose_parent_death_birth(tissue,rand,DELTA,game,game_constants,update,dead_cell)
+        parent = choose_parent_death_birth(tissue,rand,DELTA,game,game_constants,dead_cell,profiler)
+        profiler.toc('selection')
         tissue.add_daughter_cells(parent,rand)
         tissue.remove(parent)
         tissue.remove(dead_cell) #kill random cell
     elif update == 'decoupled':
-        parent = choose_parent_decoupled(tissue,rand,DELTA,game,game_constants)
+        parent = choose_parent_decoupled(tissue,rand,DELTA,game,game_constants,profiler)
+        profiler.toc('selection')
         tissue.add_daughter_cells(parent,rand)
         tissue.remove(parent)
         dead_cell = rand.randint(len(tissue))
         tissue.remove(dead_cell) #kill random cell
     return parent,dead_cell
 
-def choose_parent_death_birth(tissue,rand,DELTA,game,game_constants,dead_cell):
+def choose_parent_death_birth(tissue,rand,DELTA,game,game_constants,dead_cell,profiler=telemetry.NULL):
     """choose cells to die/divide based on fitnesses for death-birth update rule"""
     dead_cell_neighbours = tissue.mesh.neighbours[dead_cell]
     if game is None:
@@ -124,46 +144,36 @@ def choose_parent_death_birth(tissue,rand,DELTA,game,game_constants,dead_cell):
         neighbours_by_cell = [tissue.mesh.neighbours[dcn] for dcn in dead_cell_neighbours]
         fitnesses = np.array([get_fitness(tissue.properties['type'][cell],tissue.properties['type'][neighbours],DELTA,game,game_constants) 
                             for cell,neighbours in zip(dead_cell_neighbours,neighbours_by_cell)])
-        return rand.choice(dead_cell_neighbours,p=fitnesses/sum(fitnesses))
+        profiler.toc('fitness')
+        return rng.weighted_choice(rand,dead_cell_neighbours,fitnesses)
 
-def choose_parent_decoupled(tissue,rand,DELTA,game,game_constants):
+def choose_parent_decoupled(tissue,rand,DELTA,game,game_constants,profiler=telemetry.NULL):
     """choose parent cell based on game and fitnesses"""
     if game is None:
         return rand.randint(len(tissue))
     else:
         fitnesses = recalculate_fitnesses(tissue.mesh.neighbours,tissue.properties['type'],DELTA,game,game_constants)
-        return np.where(rand.multinomial(1,fitnesses/sum(fitnesses))==1)[0][0]
+        profiler.toc('fitness')
+        return rng.weighted_choice(rand,len(fitnesses),fitnesses)
 
-def _simulation(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,update,eta=ETA,progress_on=False,return_events=False):
+def _simulation(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,update,eta=ETA,progress_on=False,return_events=False,profiler=telemetry.NULL):
     """run simulation for given update rule"""
-    step = 0.
-    yield tissue
-    event_occurred = False
-    while True:
-        if progress_on: print_progress(step,N_steps)
-        N= len(tissue)
-        mesh = tissue.mesh
-        step += 1
-        mesh.move_all(tissue.dr(dt))
-        if rand.rand() < (1./T_D)*N*dt:
-            event_occurred = True
-            update_birth_and_death(tissue,rand,DELTA,game,game_constants,update)       
-        tissue.update(dt)
-        if not return_events or event_occurred: 
-            event_occurred = False
-            yield tissue
-        else: yield None
-            
+    if update == 'death_birth':
+        rule = engine.DeathBirth(1./T_D,DELTA,game,game_constants,remove_together=False,divided=(None,None),get_fitness=get_fitness)
+    elif update == 'decoupled':
+        rule = engine.Decoupled(1./T_D,DELTA,game,game_constants,death_offset=0,divided=(None,None),
+                                recalculate_fitnesses=recalculate_fitnesses)
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,eta,progress_on,return_events,profiler=profiler)
         
-def simulation_decoupled_update(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,eta=ETA,progress_on=False,return_events=False):
+def simulation_decoupled_update(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,eta=ETA,progress_on=False,return_events=False,profiler=telemetry.NULL):
     """run simulation for decoupled update rule"""
     update = 'decoupled'
-    return _simulation(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,update,eta,progress_on,return_events=return_events)
+    return _simulation(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,update,eta,progress_on,return_events=return_events,profiler=profiler)
 
-def simulation_death_birth(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,eta=ETA,progress_on=False,return_events=False):
+def simulation_death_birth(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,eta=ETA,progress_on=False,return_events=False,profiler=telemetry.NULL):
     """run simulation for death-birth update rule"""
     update = 'death_birth'
-    return _simulation(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,update,eta,progress_on,return_events=return_events)
+    return _simulation(tissue,dt,N_steps,stepsize,rand,DELTA,game,game_constants,update,eta,progress_on,return_events=return_events,profiler=profiler)
 
 def simulation_no_division(tissue,dt,N_steps,rand,eta=ETA):
     """run tissue simulation with no death or division"""
@@ -184,15 +194,19 @@ def initialise_tissue(simulation,N,dt,timend,timestep,rand,mu=MU,save_areas=Fals
     tissue.time=0.
     return tissue
 
+@kernels.run_with_backend
 def run_simulation(simulation,N,timestep,timend,rand,DELTA,game,game_constants,init_time=None,mu=MU,eta=ETA,dt=dt,til_fix=True,generator=False,save_areas=False,
-                tissue=None,mutant_num=1,save_cell_histories=False,progress_on=False,return_events=False,**kwargs):
+                tissue=None,mutant_num=1,save_cell_histories=False,progress_on=False,return_events=False,tissue_cache=None,replicate=None,backend=None,**kwargs):
     """initialise tissue with NxN cells and run given simulation with given game and constants.
             starts with single cooperator
             ends at time=timend OR if til_fix=True when population all cooperators (type=1) or defectors (2)
         returns history: list of tissue objects at time intervals given by timestep
+        backend: kernel backend for this run only (see structure/kernels.run_with_backend), default is the current backend
             """
-    if tissue is None:
+    if tissue is None and tissue_cache is None:
         tissue = initialise_tissue(simulation,N,dt,init_time,timestep,rand,mu=mu,save_areas=save_areas,save_cell_histories=save_cell_histories)
+    elif tissue is None:
+        tissue = tissue_cache.sample(initialise_tissue,rand,index=replicate,simulation=simulation,N=N,dt=dt,timend=init_time,timestep=timestep,mu=mu,save_areas=save_areas,save_cell_histories=save_cell_histories)
     if mutant_num > 0:
         tissue.properties['type']=np.zeros(N*N,dtype=int)
         tissue.properties['type'][rand.choice(N*N,size=mutant_num,replace=False)]=1
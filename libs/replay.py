@@ -0,0 +1,147 @@
+import bisect
+import copy
+import itertools
+import numpy as np
+from structure.global_constants import ETA
+
+#event-sourced recording of simulations. rather than copying the tissue at every timestep, a Trajectory stores
+#the initial tissue, the rng state and every division/extrusion, plus a full copy of the tissue (keyframe) every
+#keyframe_interval steps. any intermediate tissue is reconstructed by replaying the mechanics from the nearest keyframe.
+#this assumes every simulation step is: move_all(dr(dt,eta)) -> divisions/extrusions -> update(dt), as in the simulation
+#loops of contact_inhibition_lib, pd_lib_neutral etc. models which alter cell properties outside of Tissue methods
+#(e.g. the G to S transitions of simulation_contact_inhibition_energy_checkpoint_2_stage) can not be replayed.
+
+class Trajectory(object):
+    """records a simulation of the given tissue from its current state.
+    the tissue logs events to the Trajectory via tissue.event_log until close() is called.
+    frames are indexed by step, the number of updates since recording began (step 0 is the initial tissue)"""
+
+    def __init__(self,tissue,dt,rand=None,eta=ETA,keyframe_interval=1000):
+        self.dt = dt
+        self.eta = eta
+        self.keyframe_interval = keyframe_interval
+        self.rand_state = rand.get_state() if rand is not None else None
+        self.start_time = tissue.time
+        self.step = 0
+        self.keyframes = {0:tissue.copy()}
+        self.event_steps = []
+        self.events = []
+        self.tissue = tissue
+        tissue.event_log = self
+
+    def __len__(self):
+        """number of recorded frames"""
+        return self.step+1
+
+    def __getitem__(self,step):
+        return self.tissue_at(step)
+
+    #--------------- recording (called by Tissue) ---------------
+    def division(self,i,angle,daughter_properties):
+        self._log(('divide',i,angle,copy.deepcopy(daughter_properties)))
+
+    def removal(self,idx_list,divided):
+        self._log(('remove',copy.copy(idx_list),copy.copy(divided)))
+
+    def _log(self,event):
+        self.event_steps.append(self.step)
+        self.events.append(event)
+
+    def end_step(self,tissue):
+        self.step += 1
+        if self.keyframe_interval and self.step%self.keyframe_interval == 0:
+            self.keyframes[self.step] = tissue.copy()
+
+    def close(self):
+        """stop recording"""
+        if self.tissue is not None:
+            self.tissue.event_log = None
+            self.tissue = None
+
+    #--------------- replay ---------------
+    def time(self,step):
+        return self.start_time+step*self.dt
+
+    def step_at(self,time):
+        """returns step of frame at given time"""
+        return int(round((time-self.start_time)/self.dt))
+
+    def times(self):
+        return self.start_time+np.arange(len(self))*self.dt
+
+    def event_times(self):
+        """returns (times,events) for each division/extrusion"""
+        return self.start_time+(np.array(self.event_steps)+1)*self.dt,self.events
+
+    def _keyframe(self,step):
+        """returns a copy of the nearest keyframe at or before step, and its step"""
+        if step < 0 or step > self.step:
+            raise IndexError('step %d not recorded (0-%d)'%(step,self.step))
+        start = max(s for s in self.keyframes if s <= step)
+        tissue = self.keyframes[start].copy()
+        tissue.save_cell_histories = False #cell histories are already held by the recorded tissue
+        return tissue,start
+
+    def _advance(self,tissue,start,stop):
+        """replay steps start to stop, updating tissue (at step start) in place"""
+        idx = bisect.bisect_left(self.event_steps,start)
+        for step in xrange(start,stop):
+            tissue.mesh.move_all(tissue.dr(self.dt,self.eta))
+            while idx < len(self.events) and self.event_steps[idx] == step:
+                event = self.events[idx]
+                if event[0] == 'divide':
+                    tissue._divide(*event[1:])
+                else:
+                    tissue.remove(*event[1:])
+                idx += 1
+            tissue.update(self.dt)
+        return tissue
+
+    def tissue_at(self,step):
+        """reconstruct tissue after given step"""
+        if step < 0: step += len(self)
+        tissue,start = self._keyframe(step)
+        return self._advance(tissue,start,step)
+
+    def tissue_at_time(self,time):
+        return self.tissue_at(self.step_at(time))
+
+    def generate_history(self,skip=1,start=0,stop=None,include_final=True):
+        """generator replaying the recording, giving tissues every skip steps from start up to (not including) stop.
+        if include_final the final recorded step (e.g. fixation) is also given when it falls between intervals.
+        each tissue is updated in place so copy if storing"""
+        stop = len(self) if stop is None else stop
+        if start >= stop: return
+        steps = range(start,stop,skip)
+        if include_final and stop == len(self) and steps[-1] != stop-1:
+            steps.append(stop-1)
+        tissue,prev = self._keyframe(start)
+        for step in steps:
+            key = max(s for s in self.keyframes if s <= step)
+            if key > prev: #jump to keyframe rather than replaying
+                tissue,prev = self._keyframe(step)
+            tissue = self._advance(tissue,prev,step)
+            prev = step
+            yield tissue
+
+    def history(self,skip=1,start=0,stop=None,include_final=True):
+        """returns list of tissues every skip steps (equivalent to the history returned by run/run_til_fix)"""
+        return [tissue.copy() for tissue in self.generate_history(skip,start,stop,include_final)]
+
+def record(simulation,tissue,N_step,dt,rand=None,eta=ETA,keyframe_interval=1000,stop=None):
+    """run simulation generator (of the given tissue) for N_step iterations recording the trajectory.
+    stop: optional function of the tissue, ends the simulation when it returns True (e.g. fixed)
+    returns Trajectory"""
+    trajectory = Trajectory(tissue,dt,rand,eta,keyframe_interval)
+    try:
+        for tissue_ in itertools.islice(simulation,N_step):
+            if stop is not None and tissue_ is not None and stop(tissue_):
+                break
+    finally:
+        trajectory.close()
+    return trajectory
+
+def run_til_fix_recorded(simulation,tissue,N_step,dt,fixed,rand=None,eta=ETA,keyframe_interval=1000):
+    """run simulation (of given tissue) until fixed(tissue) logging division/extrusion events and occasional keyframes
+    rather than copying the tissue. returns Trajectory from which any intermediate tissue can be reconstructed"""
+    return record(simulation,tissue,N_step,dt,rand,eta,keyframe_interval,stop=fixed)
@@ -0,0 +1,102 @@
+import numpy as np
+import libs.engine as engine
+
+#estimating fixation probabilities for a grid of selection strengths and games from a single ensemble of reference
+#(e.g. neutral) simulations by likelihood ratio reweighting. in the decoupled, death-birth and contact inhibition update
+#rules the timing of divisions and deaths, the dead cells, division angles and cell mechanics do not depend on fitness,
+#which only enters through the choice of the mother cell among the candidates (all cells, neighbours of the dead cell or
+#cells above the area threshold). a trajectory of the reference process therefore has probability under fitnesses f
+#proportional to the product over divisions of f(mother)/sum(f(candidates)), and the fixation probability for f is
+#    E_ref[W*fixed]    where W = prod f(mother)/sum(f(candidates)) / (f_ref(mother)/sum(f_ref(candidates)))
+#the rules below record log W for each alternative (DELTA,game,game_constants) as the reference simulation runs. the
+#alternatives must have the same update rule (and death_offset etc.) as the reference, e.g. neutral runs with
+#pd_lib_neutral.simulation estimate fixation for engine.Decoupled(1./T_D,DELTA,game,game_constants,death_offset=0).
+#the variance of W grows with DELTA and the length of trajectories, so check the effective sample size returned by
+#estimate: the method works for weak selection, while for large DELTA runs at (or close to) that DELTA are needed.
+
+def payoffs(tissue,candidates,game,game_constants):
+    """payoffs of candidate cells (game='simple' gives payoff equal to type)"""
+    types = tissue.properties['type']
+    if game == 'simple':
+        return types[candidates].astype(float)
+    neighbours = tissue.mesh.neighbours
+    return np.array([game(types[cell],types[neighbours[cell]],*game_constants) for cell in candidates],dtype=float)
+
+class Weights(object):
+    """log likelihood ratios of parent choices for each alternative fitness, log_weights[i,j] for games[i] with DELTAs[j].
+    games: list of (game,game_constants), game is 'simple' or a payoff function (e.g. lib.prisoners_dilemma_averaged)"""
+
+    def __init__(self,DELTAs,games):
+        self.DELTAs = np.asarray(DELTAs,dtype=float)
+        self.games = [(game,() if game_constants is None else tuple(game_constants)) for game,game_constants in games]
+        self.log_weights = np.zeros((len(self.games),len(self.DELTAs)))
+        self.divisions = 0
+
+    def record(self,tissue,candidates,chosen,DELTA=None,game=None,game_constants=None):
+        """add log likelihood ratio of choosing candidates[chosen] as mother, where the reference process chose with
+        probability proportional to 1+DELTA*payoff (or uniformly if game is None)"""
+        self.divisions += 1
+        if len(candidates) == 1: return
+        if game is None:
+            log_reference = -np.log(len(candidates))
+        else:
+            fitnesses = 1+DELTA*payoffs(tissue,candidates,game,game_constants)
+            log_reference = np.log(fitnesses[chosen]/np.sum(fitnesses))
+        for i,(game,game_constants) in enumerate(self.games):
+            p = payoffs(tissue,candidates,game,game_constants)
+            if np.all(p == p[0]): #all candidates equally fit for every DELTA
+                self.log_weights[i] += -np.log(len(candidates))-log_reference
+                continue
+            fitnesses = 1+np.outer(self.DELTAs,p)
+            self.log_weights[i] += np.log(fitnesses[:,chosen]/np.sum(fitnesses,axis=1))-log_reference
+
+class Decoupled(engine.Decoupled):
+    """engine.Decoupled recording parent choices in weights (Weights)"""
+
+    def __init__(self,weights,*args,**kwargs):
+        engine.Decoupled.__init__(self,*args,**kwargs)
+        self.weights = weights
+
+    def choose_mother(self,tissue,rand,profiler):
+        mother = engine.Decoupled.choose_mother(self,tissue,rand,profiler)
+        self.weights.record(tissue,np.arange(len(tissue)),mother,self.DELTA,self.game,self.game_constants)
+        return mother
+
+class DeathBirth(engine.DeathBirth):
+    """engine.DeathBirth recording parent choices in weights (Weights)"""
+
+    def __init__(self,weights,*args,**kwargs):
+        engine.DeathBirth.__init__(self,*args,**kwargs)
+        self.weights = weights
+
+    def choose_mother(self,tissue,rand,dead_cell,profiler):
+        mother = engine.DeathBirth.choose_mother(self,tissue,rand,dead_cell,profiler)
+        candidates = tissue.mesh.neighbours[dead_cell]
+        self.weights.record(tissue,candidates,list(candidates).index(mother),self.DELTA,self.game,self.game_constants)
+        return mother
+
+class AreaThreshold(engine.AreaThreshold):
+    """engine.AreaThreshold recording parent choices in weights (Weights)"""
+
+    def __init__(self,weights,*args,**kwargs):
+        engine.AreaThreshold.__init__(self,*args,**kwargs)
+        self.weights = weights
+
+    def choose_mother(self,tissue,rand,division_ready,profiler):
+        mother = engine.AreaThreshold.choose_mother(self,tissue,rand,division_ready,profiler)
+        self.weights.record(tissue,division_ready,np.searchsorted(division_ready,mother),self.DELTA,self.game,self.game_constants)
+        return mother
+
+def estimate(fixation,log_weights):
+    """fixation probabilities for each alternative given fixation results (1 fixed, 0 lost, -1 incomplete) and log_weights
+    (shape (replicates,games,DELTAs)) of reference runs. incomplete runs are excluded.
+    returns dict of arrays (games,DELTAs) with estimate (mean of W*fixed), standard_error and effective sample size
+    ess = sum(W)**2/sum(W**2) (small ess relative to the number of runs means the estimate is unreliable)"""
+    fixation,log_weights = np.asarray(fixation),np.asarray(log_weights,dtype=float)
+    complete = fixation != -1
+    fixed = (fixation[complete] == 1)[:,None,None]
+    W = np.exp(log_weights[complete])
+    n = len(W)
+    values = W*fixed
+    return {'estimate':values.mean(axis=0),'standard_error':values.std(axis=0,ddof=1)/np.sqrt(n) if n > 1 else np.full(W.shape[1:],np.nan),
+            'ess':W.sum(axis=0)**2/(W**2).sum(axis=0),'runs':n}
@@ -0,0 +1,73 @@
+import os
+import struct
+import hashlib
+import numpy as np
+
+#random number generation for simulations. seeds for each run are derived from a root seed and a key identifying the run
+#(e.g. parameter values, job id and replicate index) so sweeps are reproducible and every run has an independent stream.
+#also fast versions of slow RandomState methods used in the simulation loops.
+
+def root_seed(seed=None):
+    """returns seed as an int or, if seed is None, a new seed drawn from OS entropy (record it to reproduce a sweep)"""
+    if seed is None:
+        return struct.unpack('<I',os.urandom(4))[0]
+    return int(seed)
+
+def _key(val):
+    if isinstance(val,np.generic):
+        val = val.item()
+    return repr(val)
+
+def replicate_seed(root,*key):
+    """returns seed (array of 8 uint32) for the run identified by key, derived by hashing root seed and key"""
+    digest = hashlib.sha256(','.join([_key(int(root))]+[_key(val) for val in key])).digest()
+    return np.frombuffer(digest,dtype='<u4').copy()
+
+def replicate_rand(root,*key):
+    """returns RandomState for the run identified by key (e.g. replicate_rand(root,b,i))"""
+    return np.random.RandomState(replicate_seed(root,*key))
+
+def weighted_choice(rand,a,p):
+    """returns random element of a (or index if a is an int) with probabilities proportional to p.
+    gives the same result as rand.choice(a,p=p/sum(p)) using the same single draw from rand, but is faster"""
+    cdf = np.cumsum(p,dtype=float)
+    cdf /= cdf[-1]
+    idx = cdf.searchsorted(rand.random_sample(),side='right')
+    return idx if np.ndim(a) == 0 else a[idx]
+
+#common random numbers for paired comparisons (e.g. two games or two values of b): a Streams object holds a separate
+#RandomState for each kind of random event in the update rules of libs/engine.py, so paired runs seeded with the same
+#key use the same numbers for the same kind of event and their trajectories stay correlated for longer than if all
+#events drew from a single stream. streams are
+#   timing:  whether a division/death occurs in a timestep (drawn every timestep)
+#   death:   which cell dies
+#   parent:  which cell divides (a single uniform draw, also for fitness-weighted choices)
+#   angle:   division angle
+#any other calls (e.g. initialisation, placing mutants) draw from a default stream, so a Streams object can be used
+#wherever a RandomState is. with a plain RandomState all events draw from it as before.
+
+STREAMS = ('timing','death','parent','angle')
+
+class Streams(object):
+    """RandomState for each of STREAMS (and a default stream) for the run identified by key"""
+
+    def __init__(self,root,*key):
+        self.default = replicate_rand(root,*key)
+        self.streams = dict((name,replicate_rand(root,*(key+(name,)))) for name in STREAMS)
+
+    def __getattr__(self,name):
+        if name in ('default','streams') or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.default,name)
+
+    def get_state(self):
+        return {'default':self.default.get_state(),'streams':dict((name,rand.get_state()) for name,rand in self.streams.items())}
+
+    def set_state(self,state):
+        self.default.set_state(state['default'])
+        for name,rand in self.streams.items():
+            rand.set_state(state['streams'][name])
+
+def stream(rand,name):
+    """RandomState for events of kind name (one of STREAMS) if rand is a Streams object, otherwise rand"""
+    return rand.streams[name] if isinstance(rand,Streams) else rand
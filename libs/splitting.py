@@ -0,0 +1,85 @@
+import numpy as np
+import libs.rng as rng
+
+#fixed-effort multilevel splitting for estimating small fixation probabilities. the number of mutants must pass through
+#levels l_1 < l_2 < ... < l_m before fixation. at stage 0, efforts[0] simulations are started from new initial tissues
+#(each with a single mutant) and run until the number of mutants reaches l_1 or the mutants are lost. at stage k, efforts[k]
+#simulations are started from copies of the tissues that reached l_k at the previous stage (each start chosen equally
+#often) and run until l_{k+1} (or fixation at the last stage) is reached or mutants are lost. every copy gets its own
+#RandomState derived from the root seed, stage and index, so trajectories from a shared starting tissue diverge.
+#the fixation probability is estimated by the product of the fraction of successful trajectories at each stage, which is
+#unbiased for fixed-effort splitting. runs that have not finished after max_steps timesteps (or whose simulation ends,
+#e.g. by reaching N_limit) are counted as incomplete and treated as failures, so the estimate is biased low if they are
+#common (as are fixation probabilities estimated by counting fixed runs).
+#simulations are given by make_simulation(tissue,rand) returning a simulation generator (e.g. with functools.partial of a
+#simulation in a lib) and new tissues by make_initial(rand). to run trajectories in parallel pass map=pool.map, in which
+#case make_simulation and make_initial must be picklable (module level functions or partials of them, not lambdas).
+
+REACHED,LOST,INCOMPLETE = 1,0,-1
+
+def mutant_number(tissue,mutant_type=1):
+    return np.sum(tissue.properties['type']==mutant_type)
+
+def status(tissue,level,mutant_type=1):
+    """REACHED if number of mutants >= level (or mutants fixed if level is None), LOST if no mutants, otherwise None"""
+    n = mutant_number(tissue,mutant_type)
+    if n == 0:
+        return LOST
+    elif n == len(tissue) or (level is not None and n >= level):
+        return REACHED
+    return None
+
+def run_trajectory(args):
+    """run simulation from tissue (or new tissue if None) until level is reached or mutants are lost.
+    returns (REACHED/LOST/INCOMPLETE,tissue if REACHED else None,number of timesteps)"""
+    make_simulation,make_initial,tissue,seed,level,max_steps,mutant_type = args
+    rand = np.random.RandomState(seed)
+    tissue = make_initial(rand) if tissue is None else tissue.copy()
+    step = -1
+    for step,current in enumerate(make_simulation(tissue,rand)):
+        if step > max_steps:
+            break
+        if current is None: continue #simulations with return_events=True yield None if no event occurred
+        result = status(current,level,mutant_type)
+        if result == REACHED:
+            return REACHED,current,step
+        elif result == LOST:
+            return LOST,None,step
+    return INCOMPLETE,None,step
+
+def run_splitting(make_simulation,make_initial,levels,efforts,root_seed,key=(),max_steps=np.inf,mutant_type=1,map=map):
+    """fixed-effort splitting estimate of fixation probability.
+    levels: increasing numbers of mutants (the final stage, fixation, is added)
+    efforts: number of trajectories at each stage (int for all stages or list of len(levels)+1)
+    root_seed,key: seeds of trajectories are derived from rng.replicate_seed(root_seed,*key+(stage,index))
+    returns dict with estimate, relative_error (delta method estimate of standard error/estimate), and for each stage the
+    levels, efforts, numbers reached/lost/incomplete, fraction reached (probabilities) and total timesteps simulated"""
+    stage_levels = list(levels)+[None]
+    efforts = [efforts]*len(stage_levels) if np.ndim(efforts) == 0 else list(efforts)
+    if len(efforts) != len(stage_levels):
+        raise ValueError('need one effort per level plus one for fixation')
+    if any(l2 <= l1 for l1,l2 in zip(levels[:-1],levels[1:])):
+        raise ValueError('levels must be increasing')
+    starts = [None]
+    summary = {'levels':stage_levels,'efforts':efforts,'reached':[],'lost':[],'incomplete':[],'probabilities':[],'steps':[]}
+    for stage,(level,effort) in enumerate(zip(stage_levels,efforts)):
+        if len(starts) == 0:
+            break
+        order = rng.replicate_rand(root_seed,*(tuple(key)+(stage,'order'))).permutation(len(starts))
+        args = [(make_simulation,make_initial,starts[order[i%len(starts)]],rng.replicate_seed(root_seed,*(tuple(key)+(stage,i))),
+                    level,max_steps,mutant_type) for i in range(effort)]
+        results = map(run_trajectory,args)
+        starts = [tissue for result,tissue,steps in results if result == REACHED]
+        outcomes = np.array([result for result,tissue,steps in results])
+        summary['reached'].append(int(np.sum(outcomes==REACHED)))
+        summary['lost'].append(int(np.sum(outcomes==LOST)))
+        summary['incomplete'].append(int(np.sum(outcomes==INCOMPLETE)))
+        summary['probabilities'].append(float(len(starts))/effort)
+        summary['steps'].append(int(sum(steps+1 for result,tissue,steps in results)))
+    p = np.array(summary['probabilities'])
+    if len(p) < len(stage_levels) or np.any(p == 0):
+        summary['estimate'],summary['relative_error'] = 0.,np.nan
+    else:
+        summary['estimate'] = float(np.prod(p))
+        summary['relative_error'] = float(np.sqrt(np.sum((1-p)/(p*np.array(efforts)))))
+    return summary
@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import h5py
+
+#binary store for simulation results. replaces per-run text files with a single HDF5 file:
+#each parameter set is a group and each observable a chunked, compressed dataset that runs are appended to.
+#an index dataset records which rows of an observable belong to each run so single runs can be read without loading the rest.
+
+def params_key(params):
+    """returns group name for a dict of parameters"""
+    if not params:
+        return 'default'
+    return ','.join('%s=%s'%(key,_format(val)) for key,val in sorted(params.iteritems()))
+
+def _format(val):
+    if isinstance(val,float):
+        return repr(val) #shortest string that round-trips, so distinct values never share a group
+    return str(val).replace('/','|')
+
+class ResultStore(object):
+    """HDF5-backed store of simulation results keyed by parameter set, observable name and run index"""
+
+    def __init__(self,filename,mode='a',compression='gzip',chunk_rows=4096):
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.exists(dirname): # if the folder doesn't exist create it
+            os.makedirs(dirname)
+        self.file = h5py.File(filename,mode)
+        self.compression = compression
+        self.chunk_rows = chunk_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def flush(self):
+        self.file.flush()
+
+    def parameter_sets(self):
+        """returns list of parameter dicts for which data is stored"""
+        return [dict(group.attrs) for group in self.file.values()]
+
+    def names(self,params=None):
+        """returns names of observables stored for given parameters"""
+        key = params_key(params)
+        if key not in self.file:
+            return []
+        return [name for name in self.file[key] if not name.endswith('_index') and not name.endswith('_lengths')]
+
+    def _group(self,params):
+        key = params_key(params)
+        if key not in self.file:
+            group = self.file.create_group(key)
+            for param,val in (params or {}).iteritems():
+                group.attrs[param] = val
+        return self.file[key]
+
+    def _extend(self,group,name,values):
+        if name not in group:
+            chunks = (self.chunk_rows,)+values.shape[1:]
+            group.create_dataset(name,shape=(0,)+values.shape[1:],maxshape=(None,)+values.shape[1:],dtype=values.dtype,
+                                    chunks=chunks,compression=self.compression)
+        dataset = group[name]
+        start = len(dataset)
+        dataset.resize(start+len(values),axis=0)
+        dataset[start:] = values
+        return start,start+len(values)
+
+    def append(self,name,values,run,params=None):
+        """append array of values (e.g. one value per timestep) for given run and parameters"""
+        values = np.asarray(values)
+        if values.dtype == object:
+            raise TypeError('values of %s have no fixed type or shape (use append_ragged for lists of arrays)'%name)
+        if values.ndim == 0:
+            values = values[np.newaxis]
+        group = self._group(params)
+        start,stop = self._extend(group,name,values)
+        self._extend(group,name+'_index',np.array([[run,start,stop]],dtype=np.int64))
+
+    def append_ragged(self,name,values,run,params=None):
+        """append list of arrays with differing lengths (e.g. area of every cell at each timestep) for given run and parameters"""
+        self.append(name,np.concatenate(values) if len(values) else np.array([]),run,params)
+        self.append(name+'_lengths',[len(val) for val in values],run,params)
+
+    def runs(self,name,params=None):
+        """returns run indices stored for given observable and parameters"""
+        return np.unique(self.file[params_key(params)][name+'_index'][:,0])
+
+    def read(self,name,run=None,params=None,rows=None):
+        """read values of observable for given run (all runs if run is None) and parameters.
+        rows (slice) selects a subset of the values for the run (e.g. a range of timesteps)"""
+        group = self.file[params_key(params)]
+        dataset = group[name]
+        if run is None:
+            return dataset[:] if rows is None else dataset[rows]
+        index = group[name+'_index'][:]
+        blocks = index[index[:,0]==run]
+        if len(blocks) == 1: #read only the requested rows from disk
+            start,stop = blocks[0,1:]
+            first,last,step = (rows or slice(None)).indices(stop-start)
+            return dataset[start+first:start+last:step]
+        values = np.concatenate([dataset[start:stop] for _,start,stop in blocks]) if len(blocks) else dataset[0:0]
+        return values if rows is None else values[rows]
+
+    def read_ragged(self,name,run,params=None):
+        """read list of arrays stored with append_ragged for given run and parameters"""
+        lengths = self.read(name+'_lengths',run,params)
+        return np.split(self.read(name,run,params),np.cumsum(lengths)[:-1])
+
+    def read_all(self,name,params=None):
+        """returns dict of {run: values} for every run of given observable and parameters"""
+        return {run:self.read(name,run,params) for run in self.runs(name,params)}
@@ -5,6 +5,7 @@ import structure
 from structure.global_constants import *
 from structure.cell import Tissue, BasicSpringForceNoGrowth, MutantSpringForce
 import structure.initialisation as init
+import libs.engine as engine
 
 
 def print_progress(step,N_steps):
@@ -94,40 +95,13 @@ def simulation_constant_pop_size(tissue,dt,N_steps,stepsize,rand,til_fix=False,p
             yield tissue 
 
 def simulation_stress_dependent(tissue,dt,N_steps,stepsize,rand,til_fix=False,progress_on=False,store_dead=False,save_events=False,T_D=T_D,stress_threshold=np.inf,N_limit=np.inf,**kwargs):
-    step = 0.
-    complete = False
-    properties = tissue.properties
-    mesh = tissue.mesh
-    while not til_fix or not complete:
-        if progress_on: 
-            print_progress(step,N_steps)
-            step += 1
-        N=len(tissue)
-        if N <=16 or N>=N_limit: 
-            break
-        mesh.move_all(tissue.dr(dt))
-        births = np.where(properties['cycle_length']<=tissue.age)[0]
-        births = [mother for mother in births if tissue.cell_stress(mother) < stress_threshold]
-        if len(births)>0:
-            for mother in births:
-                daughter_properties = {'cycle_length':cycle_function_uniform(2,rand)}
-                if T_D is not None: daughter_properties['age_of_death'] = death_function_poisson(2,rand,T_D=T_D)
-                tissue.add_daughter_cells(mother,rand,daughter_properties)
-            tissue.remove(births,True)
-        if T_D is not None:        	
-            deaths = np.where(properties['age_of_death']<=tissue.age)[0]
-            if len(deaths)>0:
-            	tissue.remove(deaths,False)
-        tissue.update(dt)
-        if til_fix: complete = (1 not in tissue.properties['type'] or 0 not in tissue.properties['type']) and step%stepsize==0 
-        if not save_events or (len(births)!=0 or len(deaths)!=0): 
-            yield tissue 
-        else: yield None
+    rule = engine.StressDependent(cycle_function_uniform,death_function_poisson,T_D,stress_threshold,N_limit)
+    return engine.simulation(tissue,dt,N_steps,stepsize,rand,rule,progress_on=progress_on,return_events=save_events,til_fix=til_fix,initial=False)
 
 def run_simulation(simulation,N,timestep,timend,rand,init_time=10.,til_fix=False,mutant_num=1,ancestors=None,save_areas=False,store_dead=False,tissue=None,force=None,save_events=False,T_D=T_D,stress_threshold=np.inf,N_limit=np.inf,**kwargs):
     if tissue is None:
         if force is None: force = BasicSpringForceNoGrowth()
-        tissue = init.init_tissue_torus(N,N,0.01,force,rand,save_areas=save_areas,store_dead=store_dead)
+        tissue = init.init_tissue_torus(N,N,0.01,force,rand,save_areas=save_areas,save_cell_histories=store_dead)
         tissue.properties['cycle_length'] = cycle_function_uniform(N*N,rand)
         tissue.age = tissue.properties['cycle_length']*rand.rand(N*N) #initialise cell ages at random point in cell cycle
         if init_time is not None: 
@@ -0,0 +1,196 @@
+import os
+import sys
+import Queue
+import threading
+from timeit import default_timer as clock
+from collections import defaultdict
+
+#optional instrumentation of simulation loops. pass profiler=PhaseTimer() to a simulation (or run_simulation) to record
+#the time spent in each phase of a timestep and counts of events. the default NULL profiler does nothing.
+#phases: force, move_all, fitness, selection, add_remove, retriangulate, recording (time spent by the caller between
+#steps, e.g. copying tissues to the history)
+#counts: steps, cells (summed over steps, so cells/steps is mean population size), divisions, deaths, retriangulations
+
+class PhaseTimer(object):
+    """accumulates time per phase. tic() starts timing and each toc(phase) adds the time since the last tic/toc to phase"""
+
+    def __init__(self):
+        self.times = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._last = None
+
+    def tic(self):
+        self._last = clock()
+
+    def toc(self,phase):
+        now = clock()
+        if self._last is not None:
+            self.times[phase] += now-self._last
+        self._last = now
+
+    def count(self,name,n=1):
+        self.counts[name] += n
+
+    def report(self):
+        """returns dict with times per phase, fraction of total time per phase, and counts"""
+        total = sum(self.times.values())
+        return {'times':dict(self.times),'counts':dict(self.counts),'total':total,
+                'fractions':{phase:t/total for phase,t in self.times.iteritems()} if total else {}}
+
+    def __str__(self):
+        report = self.report()
+        lines = ['%-14s %10.3f s  %5.1f %%'%(phase,t,100*report['fractions'][phase])
+                    for phase,t in sorted(report['times'].iteritems(),key=lambda x:-x[1])]
+        lines += ['%-14s %10d'%(name,n) for name,n in sorted(report['counts'].iteritems())]
+        return '\n'.join(lines)
+
+class NullTimer(object):
+    """profiler that records nothing"""
+    def tic(self): pass
+    def toc(self,phase): pass
+    def count(self,name,n=1): pass
+
+NULL = NullTimer()
+
+def merge(reports):
+    """combine reports (from PhaseTimer.report) e.g. for all runs in a sweep"""
+    timer = PhaseTimer()
+    for report in reports:
+        for phase,t in report['times'].iteritems():
+            timer.times[phase] += t
+        for name,n in report['counts'].iteritems():
+            timer.counts[name] += n
+    return timer.report()
+
+#------------------------------------------------------------------------------------------------------------------------
+#progress reporting. simulations given progress_on=True report to stdout, or pass progress_on=ProgressReporter(...) to
+#report to a per-worker log file or to a queue read by an Aggregator in the parent process. the clock is only checked every
+#check_every steps and a report is only written every interval seconds so the cost per step is negligible.
+
+class ProgressReporter(object):
+    """reports steps/s, simulated hours/s, population size and estimated time remaining every interval seconds.
+    filename: append reports to this file (may contain %(pid)d, e.g. 'progress_%(pid)d.log' for one file per worker)
+    queue: put report dicts on this queue (e.g. multiprocessing.Manager().Queue()) instead, see Aggregator
+    stream: write reports to this file object (default sys.stdout if neither filename nor queue is given)
+    label: identifies the run in reports (default process id)"""
+
+    def __init__(self,interval=10.,filename=None,queue=None,stream=None,label=None,check_every=10):
+        self.interval = interval
+        self.filename = filename
+        self.queue = queue
+        self.stream = stream
+        self.label = label
+        self.check_every = check_every
+        self.start()
+
+    def start(self,N_steps=None,dt=None):
+        """reset counters at the start of a simulation with N_steps timesteps of length dt"""
+        self.N_steps = N_steps
+        self.dt = dt
+        self.step = 0
+        self.start_time = self._last_time = clock()
+        self._last_step = 0
+        self._last_sim_time = None
+
+    def update(self,tissue):
+        """call once per timestep"""
+        self.step += 1
+        if self.step%self.check_every:
+            return
+        now = clock()
+        if now-self._last_time >= self.interval:
+            self.emit(self.record(tissue,now))
+
+    def record(self,tissue,now=None):
+        now = clock() if now is None else now
+        elapsed = now-self._last_time
+        steps_per_sec = (self.step-self._last_step)/elapsed if elapsed else 0.
+        sim_time = tissue.time
+        sim_hours_per_sec = (sim_time-self._last_sim_time)/elapsed if elapsed and self._last_sim_time is not None else steps_per_sec*(self.dt or 0.)
+        eta = (self.N_steps-self.step)/steps_per_sec if self.N_steps is not None and steps_per_sec else None
+        self._last_time,self._last_step,self._last_sim_time = now,self.step,sim_time
+        return {'label':os.getpid() if self.label is None else self.label,'pid':os.getpid(),'step':self.step,'N_steps':self.N_steps,
+                'time':sim_time,'N':len(tissue),'steps_per_sec':steps_per_sec,'sim_hours_per_sec':sim_hours_per_sec,
+                'eta':eta,'elapsed':now-self.start_time}
+
+    def emit(self,record):
+        if self.queue is not None:
+            self.queue.put(record)
+        elif self.filename is not None:
+            with open(self.filename%{'pid':record['pid']},'a') as f:
+                f.write(format_record(record)+'\n')
+        else:
+            stream = sys.stdout if self.stream is None else self.stream
+            stream.write(format_record(record)+'\n')
+            stream.flush()
+
+def format_record(record):
+    eta = '-' if record['eta'] is None else '%.0f s'%record['eta']
+    return '%s: step %d, t=%.1f h, N=%d, %.1f steps/s, %.2f h/s, eta %s'%(record['label'],record['step'],record['time'],
+                record['N'],record['steps_per_sec'],record['sim_hours_per_sec'],eta)
+
+def progress(progress_on,N_steps,dt):
+    """returns reporter for a simulation loop given progress_on (False, True or a ProgressReporter), or None"""
+    if not progress_on:
+        return None
+    reporter = ProgressReporter() if progress_on is True else progress_on
+    reporter.start(N_steps,dt)
+    return reporter
+
+class Aggregator(object):
+    """collects reports put on queue by ProgressReporters in worker processes and writes a summary of the latest
+    report of each run to stream every interval seconds. runs in a background thread between start() and stop().
+    runs that have not reported for stale seconds (e.g. finished) are left out of the summary"""
+
+    def __init__(self,queue,interval=30.,stream=None,stale=60.):
+        self.queue = queue
+        self.interval = interval
+        self.stale = stale
+        self.stream = sys.stdout if stream is None else stream
+        self.latest = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+        self.write()
+
+    def _run(self):
+        last = clock()
+        while True:
+            try:
+                record = self.queue.get(timeout=self.interval)
+            except Queue.Empty:
+                record = False
+            if record is None:
+                return
+            if record:
+                self.latest[record['label']] = (clock(),record)
+            if clock()-last >= self.interval:
+                self.write()
+                last = clock()
+
+    def active(self):
+        """latest report of each run still reporting"""
+        now = clock()
+        return [record for received,record in self.latest.values() if now-received < self.stale]
+
+    def summary(self):
+        records = self.active()
+        return {'runs':len(records),'steps_per_sec':sum(r['steps_per_sec'] for r in records),
+                'sim_hours_per_sec':sum(r['sim_hours_per_sec'] for r in records),
+                'mean_N':float(sum(r['N'] for r in records))/len(records) if records else 0.}
+
+    def write(self):
+        summary = self.summary()
+        self.stream.write('%d runs reporting: %.1f steps/s, %.2f h/s, mean N=%.1f\n'%(summary['runs'],summary['steps_per_sec'],
+                                summary['sim_hours_per_sec'],summary['mean_N']))
+        for record in sorted(self.active(),key=lambda r:r['label']):
+            self.stream.write('    '+format_record(record)+'\n')
+        self.stream.flush()
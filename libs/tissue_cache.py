@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+import numpy as np
+import structure.mesh
+from structure.cell import Tissue
+import libs.checkpoint as checkpoint
+
+#on-disk library of equilibrated initial tissues. each tissue is stored under a key given by a hash of the initialisation
+#function and its parameters (e.g. N, force parameters, domain size multiplier, rates, init_time) and the seed used for
+#the random number generator during initialisation, so equilibration is run once per (parameters, seed) and shared by all runs.
+#runs get independent initial tissues if they pass their replicate index to sample (index=i, e.g. replicate=i in
+#run_simulation), which uses tissue i of the pool, so a sweep of n replicates needs a pool of n tissues and sweeps over
+#other parameters (e.g. DELTA) share the same initial tissues. without an index tissues are drawn at random from the pool
+#with replacement, so replicates reuse tissues (each is used number of runs/pool_size times on average).
+
+def _canonical(val):
+    """convert parameter value to a json-compatible representation for hashing"""
+    if isinstance(val,dict):
+        return [[str(key),_canonical(v)] for key,v in sorted(val.iteritems())]
+    if isinstance(val,(list,tuple,np.ndarray)):
+        return [_canonical(v) for v in val]
+    if isinstance(val,(np.integer,np.floating)):
+        val = val.item()
+    if isinstance(val,float):
+        return repr(val)
+    if val is None or isinstance(val,(int,long,bool,basestring)):
+        return val
+    if callable(val) and hasattr(val,'__name__'):
+        return '%s.%s'%(getattr(val,'__module__',''),val.__name__)
+    return [val.__class__.__name__,_canonical(vars(val))] #e.g. Force objects
+
+def params_key(initialise,**params):
+    """returns hash identifying the tissues generated by initialise(rand=rand,**params)"""
+    return hashlib.sha1(json.dumps(_canonical([initialise,params]))).hexdigest()
+
+class TissueCache(object):
+    """cache of tissues returned by an initialisation function (called as initialise(rand=rand,**params)).
+    directory: location of the cache (created if it does not exist)
+    pool_size: number of seeds (i.e. distinct tissues) per parameter set that samples are drawn from (at least the number
+    of replicates in a sweep for independent initial tissues)"""
+
+    def __init__(self,directory,pool_size=10000):
+        self.directory = directory
+        self.pool_size = pool_size
+
+    def path(self,initialise,seed,**params):
+        return os.path.join(self.directory,params_key(initialise,**params),'%d.pkl'%seed)
+
+    def get(self,initialise,seed,**params):
+        """returns tissue generated with RandomState(seed), running initialise and storing the result if not already cached"""
+        filename = self.path(initialise,seed,**params)
+        tissue = checkpoint.load(filename)
+        if tissue is None:
+            tissue = initialise(rand=np.random.RandomState(seed),**params)
+            checkpoint.save(filename,tissue)
+            info = os.path.join(os.path.dirname(filename),'params.json')
+            if not os.path.exists(info):
+                checkpoint.write(info,lambda f: json.dump(_canonical([initialise,params]),f))
+        return tissue
+
+    def sample(self,initialise,rand,index=None,**params):
+        """returns tissue index of the pool for given parameters, or if index is None a tissue drawn at random (using rand)
+        from the pool (with replacement)"""
+        if index is None:
+            index = rand.randint(self.pool_size)
+        elif index >= self.pool_size:
+            raise ValueError('replicate %d is outside tissue pool of size %d'%(index,self.pool_size))
+        return self.get(initialise,index,**params)
+
+    def fill(self,initialise,seeds=None,**params):
+        """equilibrate and store tissues for given seeds (default all seeds in the pool)"""
+        for seed in (xrange(self.pool_size) if seeds is None else seeds):
+            self.get(initialise,seed,**params)
+
+#------------------------------------------------------------------------------------------------------------------------
+#pool of tissues shared between processes. tissues are published once as flat .npy arrays which workers open
+#memory-mapped (read-only) so the pages are shared between all processes on a node, and each task copies only the
+#tissue it draws. pickling the pool (e.g. when sent to multiprocessing.Pool workers) sends just the directory name.
+
+ARRAYS = ('offsets','centres','cell_ids','age','mother','next_id','time','width','height')
+
+class SharedTissuePool(object):
+    """read-only pool of tissues stored as memory-mapped arrays in directory (see publish).
+    has the same sample method as TissueCache so can be passed to run_simulation as tissue_cache"""
+
+    def __init__(self,directory):
+        self.directory = directory
+        self._arrays = None
+
+    def __getstate__(self):
+        return {'directory':self.directory}
+
+    def __setstate__(self,state):
+        self.__init__(state['directory'])
+
+    @classmethod
+    def publish(cls,tissues,directory,key=None):
+        """write list of tissues to directory, returns SharedTissuePool.
+        key: optional params_key of the tissues, checked when sampling"""
+        checkpoint.makedirs(directory)
+        arrays = {'offsets':np.cumsum([0]+[len(tissue) for tissue in tissues]),
+                  'next_id':np.array([tissue.next_id for tissue in tissues]),
+                  'time':np.array([tissue.time for tissue in tissues]),
+                  'width':np.array([tissue.mesh.geometry.width for tissue in tissues]),
+                  'height':np.array([tissue.mesh.geometry.height for tissue in tissues])}
+        for name in ('cell_ids','age','mother'):
+            arrays[name] = np.concatenate([getattr(tissue,name) for tissue in tissues])
+        arrays['centres'] = np.concatenate([tissue.mesh.centres for tissue in tissues])
+        properties = tissues[0].properties.keys()
+        for name in properties:
+            arrays['property_'+name] = np.concatenate([tissue.properties[name] for tissue in tissues])
+        for name,array in arrays.iteritems():
+            np.save(os.path.join(directory,name+'.npy'),array)
+        tissue = tissues[0]
+        meta = {'key':key,'properties':properties,'mesh':tissue.mesh.__class__.__name__,
+                'geometry':tissue.mesh.geometry.__class__.__name__,'save_cell_histories':tissue.save_cell_histories}
+        with open(os.path.join(directory,'meta.json'),'w') as f:
+            json.dump(meta,f)
+        checkpoint.save(os.path.join(directory,'force.pkl'),tissue.Force)
+        return cls(directory)
+
+    @classmethod
+    def publish_cache(cls,cache,directory,initialise,seeds=None,**params):
+        """publish the tissues held in a TissueCache for given seeds (default all seeds in the cache's pool)"""
+        seeds = xrange(cache.pool_size) if seeds is None else seeds
+        return cls.publish([cache.get(initialise,seed,**params) for seed in seeds],directory,params_key(initialise,**params))
+
+    def _attach(self):
+        if self._arrays is None:
+            with open(os.path.join(self.directory,'meta.json')) as f:
+                self.meta = json.load(f)
+            names = list(ARRAYS)+['property_'+name for name in self.meta['properties']]
+            self._arrays = {name:np.load(os.path.join(self.directory,name+'.npy'),mmap_mode='r') for name in names}
+            self.force = checkpoint.load(os.path.join(self.directory,'force.pkl'))
+        return self._arrays
+
+    def __len__(self):
+        return len(self._attach()['offsets'])-1
+
+    def tissue(self,i):
+        """returns a copy of tissue i"""
+        arrays = self._attach()
+        start,stop = arrays['offsets'][i],arrays['offsets'][i+1]
+        geometry = getattr(structure.mesh,self.meta['geometry'])(arrays['width'][i],arrays['height'][i])
+        mesh = getattr(structure.mesh,self.meta['mesh'])(np.array(arrays['centres'][start:stop]),geometry)
+        properties = {str(name):np.array(arrays['property_'+name][start:stop]) for name in self.meta['properties']}
+        return Tissue(mesh,self.force,np.array(arrays['cell_ids'][start:stop]),int(arrays['next_id'][i]),np.array(arrays['age'][start:stop]),
+                    np.array(arrays['mother'][start:stop]),properties,self.meta['save_cell_histories'],time=float(arrays['time'][i]))
+
+    def sample(self,initialise,rand,index=None,**params):
+        """returns a copy of tissue index of the pool, or if index is None a tissue drawn at random (using rand) with
+        replacement. initialise and params are checked against those the pool was published with (if known)"""
+        self._attach()
+        if self.meta['key'] is not None and self.meta['key'] != params_key(initialise,**params):
+            raise ValueError('tissue pool %s was published with different parameters'%self.directory)
+        if index is None:
+            index = rand.randint(len(self))
+        elif index >= len(self):
+            raise ValueError('replicate %d is outside tissue pool of size %d'%(index,len(self)))
+        return self.tissue(index)
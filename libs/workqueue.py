@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import errno
+import socket
+import threading
+
+#work queue on a shared directory (e.g. on NFS) for running sweeps across many nodes with dynamic load balancing.
+#each task is a json file that moves between subdirectories of the queue directory:
+#   pending/  tasks waiting to be run
+#   leased/   tasks being run, renamed to name@worker. workers touch their lease file every heartbeat interval
+#   done/     results of completed tasks (task and result)
+#   failed/   tasks that were reclaimed or released max_attempts times
+#tasks are claimed by renaming them from pending/ to leased/, which is atomic so each task is claimed by a single worker.
+#leases not touched for stale seconds (worker killed, node lost) are returned to pending/ by reclaim, which any worker
+#can call. a task whose lease is reclaimed while its worker is still running may be run twice, so tasks should be
+#deterministic (e.g. seeded with rng.replicate_rand) so that both runs give the same result.
+
+PENDING,LEASED,DONE,FAILED = 'pending','leased','done','failed'
+STATES = (PENDING,LEASED,DONE,FAILED)
+
+def worker_id():
+    """identifies worker process as host-pid"""
+    return '%s-%d'%(socket.gethostname(),os.getpid())
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST: raise
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _write_json(path,data):
+    """write via a temporary file and rename so readers never see partial files"""
+    tmp = '%s.%s.tmp'%(path,worker_id())
+    with open(tmp,'w') as f:
+        json.dump(data,f)
+    os.rename(tmp,path)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT: raise
+
+def replicate_tasks(params,number_sims,batch_size):
+    """tasks running replicates 0,...,number_sims-1 in batches of batch_size for each parameter set in params"""
+    return [{'params':list(p),'replicates':[start,min(start+batch_size,number_sims)]}
+                for p in params for start in range(0,number_sims,batch_size)]
+
+class WorkQueue(object):
+    """task queue in directory root (created if it does not exist)"""
+
+    def __init__(self,root):
+        self.root = root
+        for state in STATES:
+            _makedirs(self.path(state))
+
+    def path(self,state,name=''):
+        return os.path.join(self.root,state,name)
+
+    def _names(self,state):
+        return sorted(name for name in os.listdir(self.path(state)) if not name.endswith('.tmp'))
+
+    def set_config(self,config):
+        """store settings shared by all workers (e.g. model and root seed). only the first call has an effect,
+        returns stored config"""
+        path = os.path.join(self.root,'config.json')
+        if not os.path.exists(path):
+            _write_json(path,config)
+        return self.config()
+
+    def config(self):
+        path = os.path.join(self.root,'config.json')
+        return _read_json(path) if os.path.exists(path) else {}
+
+    def add(self,tasks,prefix='task'):
+        """add list of tasks (json serialisable dicts) named prefix_000000,... skipping any already in the queue.
+        returns names of tasks added"""
+        existing = set(name.split('@')[0] for state in STATES for name in self._names(state))
+        added = []
+        for i,task in enumerate(tasks):
+            name = '%s_%06d.json'%(prefix,i)
+            if name in existing: continue
+            _write_json(self.path(PENDING,name),dict(task,attempts=0))
+            added.append(name)
+        return added
+
+    def claim(self,worker=None,heartbeat=60.):
+        """lease next pending task, returns Lease (renewed every heartbeat seconds while used as a context manager)
+        or None if no tasks are pending"""
+        worker = worker_id() if worker is None else worker
+        for name in self._names(PENDING):
+            if os.path.exists(self.path(DONE,name)): #completed by a worker whose lease had been reclaimed
+                _remove(self.path(PENDING,name))
+                continue
+            lease = '%s@%s'%(name,worker)
+            try:
+                os.rename(self.path(PENDING,name),self.path(LEASED,lease))
+            except OSError as e:
+                if e.errno == errno.ENOENT: continue #claimed by another worker
+                raise
+            os.utime(self.path(LEASED,lease),None)
+            return Lease(self,name,lease,_read_json(self.path(LEASED,lease)),worker,heartbeat)
+        return None
+
+    def _requeue(self,name,path,error=None,max_attempts=3):
+        """return leased task to pending (or failed after max_attempts)"""
+        task = _read_json(path)
+        task['attempts'] = task.get('attempts',0)+1
+        if error is not None: task.setdefault('errors',[]).append(error)
+        state = FAILED if task['attempts'] >= max_attempts else PENDING
+        _write_json(self.path(state,name),task)
+        _remove(path)
+        return state
+
+    def reclaim(self,stale=600.,max_attempts=3,worker=None):
+        """return tasks whose leases have not been touched for stale seconds to pending. returns names of tasks reclaimed"""
+        worker = worker_id() if worker is None else worker
+        now = time.time()
+        reclaimed = []
+        for lease in self._names(LEASED):
+            path = self.path(LEASED,lease)
+            try:
+                #a lease being reclaimed by another worker is skipped unless that worker died while reclaiming it
+                if now-os.path.getmtime(path) < (2*stale if '@reclaim-' in lease else stale): continue
+                claimed = '%s@reclaim-%s'%(lease.split('@')[0],worker) #rename first so only one worker reclaims it
+                os.rename(path,self.path(LEASED,claimed))
+                os.utime(self.path(LEASED,claimed),None) #rename keeps the old mtime, so the claim would still look stale
+            except OSError as e:
+                if e.errno == errno.ENOENT: continue
+                raise
+            name = lease.split('@')[0]
+            try:
+                if os.path.exists(self.path(DONE,name)): _remove(self.path(LEASED,claimed))
+                else: self._requeue(name,self.path(LEASED,claimed),'lease of %s expired'%lease.split('@',1)[1],max_attempts)
+            except (IOError,OSError) as e:
+                if e.errno == errno.ENOENT: continue #taken over by another worker
+                raise
+            reclaimed.append(name)
+        return reclaimed
+
+    def status(self):
+        """number of tasks in each state"""
+        return dict((state,len(self._names(state))) for state in STATES)
+
+    def finished(self):
+        """True when no tasks are pending or leased, i.e. no work is left for workers. tasks may still have failed
+        (see failures and retry_failed) so results are only complete if failures is also empty"""
+        status = self.status()
+        return status[PENDING] == 0 and status[LEASED] == 0
+
+    def results(self):
+        """generator of completed tasks, dicts with keys task, result, worker and elapsed"""
+        for name in self._names(DONE):
+            yield _read_json(self.path(DONE,name))
+
+    def failures(self):
+        """generator of (name,task) for failed tasks, task['errors'] lists the error of each attempt"""
+        for name in self._names(FAILED):
+            if os.path.exists(self.path(DONE,name)): continue #completed by a worker whose lease had been reclaimed
+            yield name,_read_json(self.path(FAILED,name))
+
+    def retry_failed(self):
+        """return failed tasks to pending with attempts reset (errors are kept). returns names of tasks returned"""
+        retried = []
+        for name,task in self.failures():
+            if os.path.exists(self.path(DONE,name)): #completed by a worker whose lease had been reclaimed
+                _remove(self.path(FAILED,name))
+                continue
+            task['attempts'] = 0
+            _write_json(self.path(PENDING,name),task)
+            _remove(self.path(FAILED,name))
+            retried.append(name)
+        return retried
+
+class Lease(object):
+    """task leased by a worker. use as a context manager to send heartbeats while the task runs and release the task
+    back to the queue if an exception is raised, e.g.
+        with queue.claim() as lease:
+            lease.complete(run(lease.task))"""
+
+    def __init__(self,queue,name,lease,task,worker,interval=60.):
+        self.queue,self.name,self.lease,self.task,self.worker = queue,name,lease,task,worker
+        self.interval = interval
+        self.path = queue.path(LEASED,lease)
+        self.lost = False
+        self.start = time.time()
+        self._stop = self._thread = None
+
+    def heartbeat(self):
+        """touch lease file, returns False if the lease has been reclaimed"""
+        try:
+            os.utime(self.path,None)
+        except OSError as e:
+            if e.errno != errno.ENOENT: raise
+            self.lost = True
+        return not self.lost
+
+    def start_heartbeat(self,interval=None):
+        """touch lease file every interval seconds (default self.interval) in a background thread"""
+        interval = self.interval if interval is None else interval
+        stop = self._stop = threading.Event()
+        def beat():
+            while not stop.wait(interval):
+                if not self.heartbeat(): break
+        self._thread = threading.Thread(target=beat)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop_heartbeat(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._thread.join()
+            self._stop = self._thread = None
+
+    def complete(self,result):
+        """store result and remove task from leased"""
+        self.stop_heartbeat()
+        _write_json(self.queue.path(DONE,self.name),{'task':self.task,'result':result,'worker':self.worker,
+                                                        'elapsed':time.time()-self.start})
+        _remove(self.path)
+
+    def release(self,error=None,max_attempts=3):
+        """return task to pending (or failed after max_attempts), e.g. after an error"""
+        self.stop_heartbeat()
+        if not self.lost and os.path.exists(self.path):
+            return self.queue._requeue(self.name,self.path,error,max_attempts)
+
+    def __enter__(self):
+        self.start_heartbeat()
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if exc_type is not None:
+            self.release('%s: %s'%(exc_type.__name__,exc_value))
+        self.stop_heartbeat()
@@ -0,0 +1,99 @@
+import numpy as np
+import libs.engine as engine
+import libs.ensemble as ensemble
+import libs.rng as rng
+from structure.global_constants import *
+import structure.initialisation as init
+from structure.cell import BasicSpringForceNoGrowth
+import sys,os
+
+"""as run_CIP_parallel_simple.py but replicates are run in a single process, ENSEMBLE_SIZE tissues at a time stepped in
+lockstep with force calculation and retriangulation in a thread pool (see libs/ensemble.py). runs with the same seeds
+give the same results as run_CIP_parallel_simple.py (except that runs incomplete at TIMEND are run up to TIMEND rather than
+the last multiple of TIMESTEP before it).
+usage: python run_CIP_ensemble_simple.py threshold_area_fraction death_to_birth_rate_ratio domain_size_multiplier DELTA job_id [threads]"""
+
+threshold_area_fraction = float(sys.argv[1])
+death_to_birth_rate_ratio =  float(sys.argv[2])
+domain_size_multiplier = float(sys.argv[3])
+DELTA = float(sys.argv[4])
+job_id = sys.argv[5]
+threads = int(sys.argv[6]) if len(sys.argv) > 6 else None
+
+NUMBER_SIMS = 10000
+BATCH_SIZE = 1000
+ENSEMBLE_SIZE = 100
+L = 10 # population size N=l*l
+TIMEND = 80000. # simulation time (hours)
+MAX_POP_SIZE = 1000
+TIMESTEP = 96. # time intervals to save simulation history
+DEATH_RATE = 0.25/24.
+INIT_TIME = 96.
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
+
+PARENTDIR = "CIP_simple_fix_N100/db%.2f_a%.1f/"%(death_to_birth_rate_ratio,threshold_area_fraction)
+if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
+     os.makedirs(PARENTDIR)
+
+game = "simple"
+rates = (DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio)
+init_rule = engine.AreaThreshold(rates,threshold_area_fraction)
+rule = engine.AreaThreshold(rates,threshold_area_fraction,DELTA,game,N_limit=MAX_POP_SIZE)
+
+with open(PARENTDIR+'info',"w") as f:
+    f.write('root seed = %d\n'%ROOT_SEED)
+    f.write('death_rate = %.6f\n'%DEATH_RATE)
+    f.write('initial pop size = %3d\n'%(L*L))
+    f.write('domain width = %.1f\n'%(L*domain_size_multiplier))
+    f.write('quiescent area ratio = %.1f\n'%threshold_area_fraction)
+    f.write('death to birth rate ratio = %.2f\n'%death_to_birth_rate_ratio)
+    f.write('timestep = %.1f'%TIMESTEP)
+
+def fixed(tissue):
+    if 0 not in tissue.properties['type']:
+        return 1
+    elif 1 not in tissue.properties['type']:
+        return 0
+    return -1
+
+def initialise(rands):
+    """equilibrate tissues for INIT_TIME and add a single mutant to each (as lib.run_simulation)"""
+    tissues = [init.init_tissue_torus_with_multiplier(L,L,0.01,BasicSpringForceNoGrowth(MU,T_M),rand,domain_size_multiplier,save_areas=True)
+                for rand in rands]
+    with ensemble.Ensemble(tissues,init_rule,rands,dt,TIMESTEP/dt,threads=threads) as equilibration:
+        equilibration.run(INIT_TIME/dt)
+    for tissue,rand in zip(tissues,rands):
+        tissue.reset(reset_age=False)
+        tissue.properties['type'] = np.zeros(len(tissue),dtype=int)
+        tissue.properties['type'][rand.choice(len(tissue),size=1,replace=False)] = 1
+        tissue.properties['ancestor'] = np.arange(len(tissue),dtype=int)
+    return tissues
+
+def run_ensemble(idx):
+    """run replicates idx in lockstep, returns fixation of each"""
+    rands = [rng.replicate_rand(ROOT_SEED,threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,DELTA,job_id,i) for i in idx]
+    tissues = initialise(rands)
+    with ensemble.Ensemble(tissues,rule,rands,dt,TIMESTEP/dt,threads=threads,til_fix=True,record_sizes=True) as runs:
+        runs.run(TIMEND/dt)
+    fixation = [fixed(tissue) for tissue in tissues]
+    with open(PARENTDIR+'s%.2f_%s_time.txt'%(DELTA,job_id),'a') as wfile:
+        for i,tissue,fix,sizes in zip(idx,tissues,fixation,runs.pop_sizes):
+            wfile.write('%5d    %5d    %d    %d\n'%(i, tissue.time, fix, np.mean(sizes)))
+    return fixation
+
+def run_all():
+    fixation = np.array([f for start in range(0,NUMBER_SIMS,ENSEMBLE_SIZE)
+                            for f in run_ensemble(range(start,min(start+ENSEMBLE_SIZE,NUMBER_SIMS)))])
+    with open(PARENTDIR+'s%.2f_%s.txt'%(DELTA,job_id),'a') as wfile:
+        if NUMBER_SIMS%BATCH_SIZE != 0:
+            batch_size=1
+        else:
+            batch_size = BATCH_SIZE
+        fixation = fixation.reshape((NUMBER_SIMS/batch_size,batch_size))
+        for fixation_batch in fixation:
+            fixed = len(np.where(fixation_batch==1)[0])
+            lost = len(np.where(fixation_batch==0)[0])
+            incomplete = len(np.where(fixation_batch==-1)[0])
+            wfile.write('%d    %d    %d\n'%(fixed,lost,incomplete))
+
+run_all()
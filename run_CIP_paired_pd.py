@@ -0,0 +1,84 @@
+import numpy as np
+from multiprocessing import Pool,cpu_count
+import libs.contact_inhibition_lib as lib #library for simulation routines
+import libs.rng as rng
+from structure.global_constants import *
+import sys,os
+
+"""compare fixation probabilities of a single cooperator in the contact inhibition model for two prisoner's dilemma
+settings (game averaged/accumulated and b) using common random numbers: both runs of each pair start from the same
+tissue and draw the same random numbers for each kind of event (see rng.Streams), so the difference in fixation
+probability has a much smaller standard error than with independent runs. pass independent as the last argument to
+run the pairs with independent random numbers instead (e.g. to measure the variance reduction).
+usage: python run_CIP_paired_pd.py threshold_area_fraction death_to_birth_rate_ratio domain_size_multiplier game_a b_a game_b b_b job_id [independent]"""
+
+threshold_area_fraction = float(sys.argv[1])
+death_to_birth_rate_ratio =  float(sys.argv[2])
+domain_size_multiplier = float(sys.argv[3])
+game_a,b_a = sys.argv[4],float(sys.argv[5])
+game_b,b_b = sys.argv[6],float(sys.argv[7])
+job_id = sys.argv[8]
+INDEPENDENT = len(sys.argv) > 9 and sys.argv[9] == 'independent'
+
+NUMBER_SIMS = 10000
+DELTA = 0.025
+L = 10 # population size N=l*l
+TIMEND = 80000. # simulation time (hours)
+MAX_POP_SIZE = 1000
+TIMESTEP = 96.
+DEATH_RATE = 0.25/24.
+INIT_TIME = 96.
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
+
+GAMES = {'averaged':lib.prisoners_dilemma_averaged,'accumulated':lib.prisoners_dilemma_accumulated}
+ARMS = ((GAMES[game_a],(b_a,1.)),(GAMES[game_b],(b_b,1.)))
+
+PARENTDIR = "CIP_pd_paired_N100/db%.2f_a%.1f/"%(death_to_birth_rate_ratio,threshold_area_fraction)
+if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
+     os.makedirs(PARENTDIR)
+
+simulation = lib.simulation_contact_inhibition_area_dependent
+rates = (DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio)
+key = (threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,game_a,b_a,game_b,b_b,job_id)
+
+def fixed(tissue):
+    if 0 not in tissue.properties['type']:
+        return 1
+    elif 1 not in tissue.properties['type']:
+        return 0
+    return -1
+
+def run_pair(i):
+    """run both settings from the same initial tissue, returns (fixation a,fixation b)"""
+    rand = rng.replicate_rand(ROOT_SEED,*(key+('init',i)))
+    initial = lib.initialise_tissue(L,TIMESTEP,INIT_TIME,rand,save_areas=True,domain_size_multiplier=domain_size_multiplier,
+                init_simulation=simulation,rates=rates,threshold_area_fraction=threshold_area_fraction)
+    initial.properties['type'] = np.zeros(len(initial),dtype=int)
+    initial.properties['type'][rand.choice(len(initial),size=1,replace=False)] = 1
+    fixation = []
+    for arm,(game,game_constants) in enumerate(ARMS):
+        streams = rng.Streams(ROOT_SEED,*(key+(i,arm) if INDEPENDENT else key+(i,)))
+        tissue = initial.copy()
+        for tissue in lib.generate_til_fix(simulation(tissue,dt,TIMEND/dt,TIMESTEP/dt,streams,rates,threshold_area_fraction,
+                        N_limit=MAX_POP_SIZE,DELTA=DELTA,game=game,game_constants=game_constants),TIMEND/dt,TIMESTEP/dt):
+            pass
+        fixation.append(fixed(tissue))
+    return tuple(fixation)
+
+def run_parallel():
+    pool = Pool(cpu_count()-1,maxtasksperchild=1000)
+    fixation = np.array(pool.map(run_pair,range(NUMBER_SIMS)))
+    complete = np.all(fixation != -1,axis=1)
+    a,b = fixation[complete,0],fixation[complete,1]
+    n = len(a)
+    difference = a-b
+    with open(PARENTDIR+'%s%.2f_%s%.2f_%s_paired.txt'%(game_a,b_a,game_b,b_b,job_id),'w') as wfile:
+        wfile.write('root seed = %d, %s random numbers\n'%(ROOT_SEED,'independent' if INDEPENDENT else 'common'))
+        wfile.write('pairs = %d, incomplete = %d\n'%(n,np.sum(~complete)))
+        wfile.write('fixed a = %d, fixed b = %d, fixed both = %d\n'%(np.sum(a),np.sum(b),np.sum(a*b)))
+        wfile.write('difference = %.6f    standard error = %.6f    standard error if independent = %.6f\n'%(
+                    difference.mean(),difference.std(ddof=1)/np.sqrt(n),np.sqrt((a.var(ddof=1)+b.var(ddof=1))/n)))
+        for i,(fix_a,fix_b) in enumerate(fixation):
+            wfile.write('%5d    %d    %d\n'%(i,fix_a,fix_b))
+
+run_parallel()
@@ -2,6 +2,9 @@ import numpy as np
 from multiprocessing import Pool,cpu_count
 import libs.contact_inhibition_lib as lib #library for simulation routines
 import libs.data as data
+import libs.rng as rng
+import libs.fixation as fixation_lib
+from libs.store import ResultStore
 from structure.global_constants import *
 import structure.initialisation as init
 from structure.cell import Tissue, BasicSpringForceNoGrowth
@@ -13,6 +16,7 @@ death_to_birth_rate_ratio =  float(sys.argv[2])
 domain_size_multiplier = float(sys.argv[3])
 DELTA = float(sys.argv[4])
 job_id = sys.argv[5]
+ADAPTIVE = len(sys.argv) > 6 and sys.argv[6] == 'adaptive' # stop once fixation probability is resolved (see below)
 
 NUMBER_SIMS = 10000
 BATCH_SIZE = 1000
@@ -22,6 +26,11 @@ MAX_POP_SIZE = 1000
 TIMESTEP = 96. # time intervals to save simulation history
 DEATH_RATE = 0.25/24.
 INIT_TIME = 96.
+ADAPTIVE_BATCH = 200 # adaptive mode: replicates per batch, stopping rule checked after each batch
+PRECISION = 0.003 # adaptive mode: stop when half width of confidence interval for fixation probability is below this
+# (final critical value is about 2.16 for 50 looks, so near p=1/(L*L) the half width is 0.003 after ~7000 replicates, and 0.002 is never reached)
+ALPHA = 0.05 # adaptive mode: or when confidence interval excludes neutral fixation probability 1/(L*L) at this level
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
 
 PARENTDIR = "CIP_simple_fix_N100/db%.2f_a%.1f/"%(death_to_birth_rate_ratio,threshold_area_fraction)
 if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
@@ -32,6 +41,7 @@ simulation = lib.simulation_contact_inhibition_area_dependent
 rates = (DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio)
 
 with open(PARENTDIR+'info',"w") as f:
+    f.write('root seed = %d\n'%ROOT_SEED)
     f.write('death_rate = %.6f\n'%DEATH_RATE)
     f.write('initial pop size = %3d\n'%(L*L))
     f.write('domain width = %.1f\n'%(L*domain_size_multiplier))
@@ -39,47 +49,65 @@ with open(PARENTDIR+'info',"w") as f:
     f.write('death to birth rate ratio = %.2f\n'%death_to_birth_rate_ratio)
     f.write('timestep = %.1f'%TIMESTEP)
 
-def fixed(history,i):
+def fixed(history):
     if 0 not in history[-1].properties['type']:
         fix = 1  
     elif 1 not in history[-1].properties['type']:
         fix = 0
     else: 
         fix = -1
-        data.save_N_mutant(history,PARENTDIR+'/incomplete_delta%.1f'%DELTA,i)
     return fix
 
 def run_single_unpack(args):
     return run_single(*args)
 
 def run_single(i):
-    """run a single voronoi tessellation model simulation"""
+    """run a single voronoi tessellation model simulation.
+    returns (i,final time,fixation,mean population size,number of mutants,population size), written to the store by the parent"""
     sys.stdout.flush() 
-    rand = np.random.RandomState()
+    rand = rng.replicate_rand(ROOT_SEED,threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,DELTA,job_id,i)
     history = lib.run_simulation(simulation,L,TIMESTEP,TIMEND,rand,progress_on=False,
                 init_time=INIT_TIME,til_fix=True,save_areas=True,
                 return_events=False,save_cell_histories=False,N_limit=MAX_POP_SIZE,DELTA=DELTA,game=game,mutant_num=1,
                 domain_size_multiplier=domain_size_multiplier,rates=rates,threshold_area_fraction=threshold_area_fraction)
-    fixation = fixed(history,i)
-    meanpopsize = np.mean([len(tissue) for tissue in history])
-    with open(PARENTDIR+'s%.2f_%s_time.txt'%(DELTA,job_id),'a') as wfile:
-        wfile.write('%5d    %5d    %d    %d\n'%(i, history[-1].time, fixation, meanpopsize))
-    return fixation
-    
+    pop_size = data.population_size(history)
+    return (i,history[-1].time,fixed(history),np.mean(pop_size),data.number_mutants(history),pop_size)
+
+def save_runs(store,results):
+    """write results of run_single to store (only the parent process writes to the HDF5 file), returns fixation results"""
+    for i,time,fixation,meanpopsize,mutants,pop_size in results:
+        store.append('final_time',time,i)
+        store.append('fixation',fixation,i)
+        store.append('mean_pop_size',meanpopsize,i)
+        store.append('mutants',mutants,i)
+        store.append('pop_size',pop_size,i)
+    store.flush()
+    return [result[2] for result in results]
+
 def run_parallel():
     pool = Pool(cpu_count()-1,maxtasksperchild=1000)
     # fixation = np.array(map(run_single,range(NUMBER_SIMS))) 
-    fixation = np.array([f for f in pool.imap(run_single,range(NUMBER_SIMS))]) 
+    store = ResultStore(PARENTDIR+'s%.2f_%s.h5'%(DELTA,job_id)) # per run final time, fixation, population size and number of mutants
+    if ADAPTIVE:
+        rule = fixation_lib.StoppingRule(precision=PRECISION,p0=1./(L*L),alpha=ALPHA,min_sims=ADAPTIVE_BATCH,
+                                            max_sims=NUMBER_SIMS,max_looks=NUMBER_SIMS/ADAPTIVE_BATCH)
+        fixation,reason,(estimate,lower,upper) = fixation_lib.run_adaptive(lambda start,stop: save_runs(store,pool.map(run_single,range(start,stop))),
+                                                                            ADAPTIVE_BATCH,rule)
+        with open(PARENTDIR+'s%.2f_%s_stop.txt'%(DELTA,job_id),'a') as wfile:
+            wfile.write('%d    %s    %.6f    %.6f    %.6f\n'%(len(fixation),reason,estimate,lower,upper))
+        batch_size = ADAPTIVE_BATCH
+    else:
+        fixation = np.array([save_runs(store,[result])[0] for result in pool.imap(run_single,range(NUMBER_SIMS))])
+        batch_size = BATCH_SIZE
     with open(PARENTDIR+'s%.2f_%s.txt'%(DELTA,job_id),'a') as wfile:
-        if NUMBER_SIMS%BATCH_SIZE != 0: 
+        if len(fixation)%batch_size != 0: 
             batch_size=1
-        else: 
-            batch_size = BATCH_SIZE
-        fixation = fixation.reshape((NUMBER_SIMS/batch_size,batch_size))
+        fixation = fixation.reshape((len(fixation)/batch_size,batch_size))
         for fixation_batch in fixation:
             fixed = len(np.where(fixation_batch==1)[0])
             lost = len(np.where(fixation_batch==0)[0])
             incomplete = len(np.where(fixation_batch==-1)[0])
             wfile.write('%d    %d    %d\n'%(fixed,lost,incomplete))
+    store.close()
 
 run_parallel()  
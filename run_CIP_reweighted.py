@@ -0,0 +1,69 @@
+import numpy as np
+from multiprocessing import Pool,cpu_count
+import libs.contact_inhibition_lib as lib #library for simulation routines
+import libs.engine as engine
+import libs.reweighting as reweighting
+import libs.rng as rng
+from structure.global_constants import *
+import sys,os
+
+"""estimate fixation probabilities of a single mutant in the contact inhibition model for a grid of DELTA values (simple
+fitness and prisoner's dilemma with several b) from one ensemble of neutral runs by likelihood ratio reweighting
+(see libs/reweighting.py), rather than running a sweep for each DELTA.
+usage: python run_CIP_reweighted.py threshold_area_fraction death_to_birth_rate_ratio domain_size_multiplier job_id"""
+
+threshold_area_fraction = float(sys.argv[1])
+death_to_birth_rate_ratio =  float(sys.argv[2])
+domain_size_multiplier = float(sys.argv[3])
+job_id = sys.argv[4]
+
+NUMBER_SIMS = 10000
+DELTAS = np.linspace(-0.05,0.05,21) # selection strengths
+B_VALUES = (2.,4.,6.,8.,10.) # prisoner's dilemma benefits (cost c=1)
+L = 10 # population size N=l*l
+TIMEND = 80000. # simulation time (hours)
+MAX_POP_SIZE = 1000
+TIMESTEP = 96.
+DEATH_RATE = 0.25/24.
+INIT_TIME = 96.
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
+
+PARENTDIR = "CIP_reweighted_N100/db%.2f_a%.1f/"%(death_to_birth_rate_ratio,threshold_area_fraction)
+if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
+     os.makedirs(PARENTDIR)
+
+GAMES = [('simple',())]+[(lib.prisoners_dilemma_averaged,(b,1.)) for b in B_VALUES]
+GAME_NAMES = ['simple']+['pd_b%.1f'%b for b in B_VALUES]
+rates = (DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio)
+
+def run_single(i):
+    """run a single neutral simulation until fixation, returns (fixation,log weights)"""
+    rand = rng.replicate_rand(ROOT_SEED,threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,job_id,i)
+    tissue = lib.initialise_tissue(L,TIMESTEP,INIT_TIME,rand,save_areas=True,domain_size_multiplier=domain_size_multiplier,
+                init_simulation=lib.simulation_contact_inhibition_area_dependent,rates=rates,threshold_area_fraction=threshold_area_fraction)
+    tissue.properties['type'] = np.zeros(len(tissue),dtype=int)
+    tissue.properties['type'][rand.choice(len(tissue),size=1,replace=False)] = 1
+    weights = reweighting.Weights(DELTAS,GAMES)
+    rule = reweighting.AreaThreshold(weights,rates,threshold_area_fraction,N_limit=MAX_POP_SIZE)
+    for tissue in lib.generate_til_fix(engine.simulation(tissue,dt,TIMEND/dt,TIMESTEP/dt,rand,rule,til_fix=True),TIMEND/dt,TIMESTEP/dt):
+        pass
+    if 0 not in tissue.properties['type']: fixation = 1
+    elif 1 not in tissue.properties['type']: fixation = 0
+    else: fixation = -1
+    return fixation,weights.log_weights
+
+def run_parallel():
+    pool = Pool(cpu_count()-1,maxtasksperchild=1000)
+    results = pool.map(run_single,range(NUMBER_SIMS))
+    fixation = np.array([f for f,log_weights in results])
+    log_weights = np.array([log_weights for f,log_weights in results])
+    np.savez(PARENTDIR+'%s_weights.npz'%job_id,fixation=fixation,log_weights=log_weights,DELTAS=DELTAS,B_VALUES=B_VALUES,root_seed=ROOT_SEED)
+    summary = reweighting.estimate(fixation,log_weights)
+    with open(PARENTDIR+'%s_reweighted.txt'%job_id,'w') as wfile:
+        wfile.write('root seed = %d, complete runs = %d\n'%(ROOT_SEED,summary['runs']))
+        wfile.write('game    DELTA    estimate    standard_error    ess\n')
+        for i,name in enumerate(GAME_NAMES):
+            for j,DELTA in enumerate(DELTAS):
+                wfile.write('%s    %.4f    %.6f    %.6f    %.1f\n'%(name,DELTA,summary['estimate'][i,j],summary['standard_error'][i,j],summary['ess'][i,j]))
+
+run_parallel()
@@ -0,0 +1,62 @@
+import numpy as np
+from multiprocessing import Pool,cpu_count
+import libs.contact_inhibition_lib as lib #library for simulation routines
+import libs.splitting as splitting
+import libs.rng as rng
+from structure.global_constants import *
+import sys,os
+
+"""estimate fixation probability of a single mutant in the contact inhibition model (simple fitness) by fixed-effort
+multilevel splitting on the number of mutants (see libs/splitting.py), rather than counting fixations in NUMBER_SIMS runs.
+usage: python run_CIP_splitting_simple.py threshold_area_fraction death_to_birth_rate_ratio domain_size_multiplier DELTA job_id"""
+
+threshold_area_fraction = float(sys.argv[1])
+death_to_birth_rate_ratio =  float(sys.argv[2])
+domain_size_multiplier = float(sys.argv[3])
+DELTA = float(sys.argv[4])
+job_id = sys.argv[5]
+
+LEVELS = (2,4,8,16,32,64) # numbers of mutants at which trajectories are split
+EFFORT = 1000 # trajectories per stage
+L = 10 # population size N=l*l
+TIMEND = 80000. # maximum simulation time of each trajectory (hours)
+MAX_POP_SIZE = 1000
+TIMESTEP = 96.
+DEATH_RATE = 0.25/24.
+INIT_TIME = 96.
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
+
+PARENTDIR = "CIP_simple_fix_N100/db%.2f_a%.1f/"%(death_to_birth_rate_ratio,threshold_area_fraction)
+if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
+     os.makedirs(PARENTDIR)
+
+game = "simple"
+rates = (DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio)
+params = dict(rates=rates,threshold_area_fraction=threshold_area_fraction)
+
+def initial(rand):
+    """equilibrated tissue with a single mutant (as lib.run_simulation)"""
+    tissue = lib.initialise_tissue(L,TIMESTEP,INIT_TIME,rand,save_areas=True,domain_size_multiplier=domain_size_multiplier,
+                init_simulation=lib.simulation_contact_inhibition_area_dependent,**params)
+    tissue.properties['type'] = np.zeros(len(tissue),dtype=int)
+    tissue.properties['type'][rand.choice(len(tissue),size=1,replace=False)] = 1
+    tissue.properties['ancestor'] = np.arange(len(tissue),dtype=int)
+    return tissue
+
+def make_simulation(tissue,rand):
+    return lib.simulation_contact_inhibition_area_dependent(tissue,dt,TIMEND/dt,TIMESTEP/dt,rand,N_limit=MAX_POP_SIZE,
+                DELTA=DELTA,game=game,**params)
+
+def run_parallel():
+    pool = Pool(cpu_count()-1,maxtasksperchild=1000)
+    summary = splitting.run_splitting(make_simulation,initial,LEVELS,EFFORT,ROOT_SEED,
+                key=(threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,DELTA,job_id),
+                max_steps=TIMEND/dt,map=pool.map)
+    with open(PARENTDIR+'s%.2f_%s_splitting.txt'%(DELTA,job_id),'a') as wfile:
+        wfile.write('root seed = %d\n'%ROOT_SEED)
+        wfile.write('estimate = %.6e    relative error = %.3f\n'%(summary['estimate'],summary['relative_error']))
+        wfile.write('level    effort    reached    lost    incomplete    steps\n')
+        for row in zip(summary['levels'],summary['efforts'],summary['reached'],summary['lost'],summary['incomplete'],summary['steps']):
+            wfile.write('%s    %d    %d    %d    %d    %d\n'%((('fix' if row[0] is None else row[0]),)+row[1:]))
+
+run_parallel()
@@ -0,0 +1,37 @@
+import sys
+from optparse import OptionParser
+import libs.benchmark as benchmark
+import structure.kernels as kernels
+
+"""time core kernels and simulation loops across tissue sizes and store results as json.
+e.g. python run_benchmarks.py -o bench.json -L 10,20,50 -c previous_bench.json"""
+
+parser = OptionParser()
+parser.set_defaults(outfile=None,sizes=','.join(str(L) for L in benchmark.SIZES),names=None,seed=0,repeat=5,
+                    min_time=0.2,compare=None,backend=None)
+parser.add_option("-o","--output",type="str",dest="outfile",metavar="FILE",
+                    help="save results as json to FILE")
+parser.add_option("-L","--sizes",type="str",dest="sizes",metavar="L1,L2,...",
+                    help="comma separated tissue sizes (LxL cells)")
+parser.add_option("-b","--benchmarks",type="str",dest="names",metavar="NAME1,NAME2,...",
+                    help="only run benchmarks whose name contains one of the given strings")
+parser.add_option("-s","--seed",type="int",dest="seed",metavar="SEED",
+                    help="seed for random state used to generate tissues")
+parser.add_option("-r","--repeat",type="int",dest="repeat",metavar="REPEAT",
+                    help="number of timing runs per benchmark")
+parser.add_option("-t","--min-time",type="float",dest="min_time",metavar="SECONDS",
+                    help="minimum duration of each timing run")
+parser.add_option("-k","--kernels",type="choice",choices=kernels.BACKENDS,dest="backend",metavar="BACKEND",
+                    help="kernel backend (%s), default is the VT_KERNELS environment variable or auto"%', '.join(kernels.BACKENDS))
+parser.add_option("-c","--compare",type="str",dest="compare",metavar="FILE",
+                    help="compare results with those stored in FILE")
+(options,args) = parser.parse_args()
+
+if options.backend is not None: kernels.set_backend(options.backend)
+sizes = [int(L) for L in options.sizes.split(',')]
+names = options.names.split(',') if options.names is not None else None
+report = benchmark.run(sizes,names=names,seed=options.seed,repeat=options.repeat,min_time=options.min_time)
+if options.outfile is not None:
+    benchmark.save(options.outfile,report)
+if options.compare is not None:
+    benchmark.print_comparison(benchmark.compare(benchmark.load(options.compare),report))
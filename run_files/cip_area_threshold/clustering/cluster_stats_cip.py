@@ -9,38 +9,18 @@ import os
 import numpy as np
 import libs.contact_inhibition_lib as lib
 import libs.data as data
+import libs.clustering as clustering
 from functools import partial
 
-def calc_interactions(tissue,mutant_index,n):
-    """treats all cells with ancestor 'mutant_index' as cooperators
-    returns:
-        n (int): size of clone
-        I_CC/I_CD (ints): number of cooperator-cooperator/defector interactions in population
-        W_CC/W_CD (floats): number of cooperator-cooperator/defector interactions in pop. weighted by neighbour number    
-    """
-    N = len(tissue)
-    neighbours = tissue.mesh.neighbours
-    types = tissue.properties['ancestor']==mutant_index
-    I_CC,I_CD,W_CC,W_CD,N_D = 0,0,0.,0.,0
-    for ctype,cell_neighbours in zip(types,neighbours):
-        if ctype:
-            Cneigh,neigh = float(sum(types[cell_neighbours])),float(len(cell_neighbours))
-            I_CC += Cneigh
-            I_CD += neigh - Cneigh
-            W_CC += Cneigh/neigh
-            W_CD += (neigh-Cneigh)/neigh
-    return [n,N,I_CC,I_CD,W_CC,W_CD]
-
 def run_sim(alpha,db,m,i):
     """run a single simulation and save interaction data for each clone"""
     rates = (DEATH_RATE,DEATH_RATE/db)
     rand = np.random.RandomState()
-    data = [calc_interactions(tissue,mutant_index,n)
+    data = np.vstack([clustering.clone_interactions(tissue,n_min)
                 for tissue in lib.run_simulation(simulation,L,TIMESTEP,TIMEND,rand,progress_on=False,
                                     init_time=INIT_TIME,til_fix=True,save_areas=True,return_events=False,save_cell_histories=False,
                                     N_limit=MAX_POP_SIZE,game=None,mutant_num=None,domain_size_multiplier=m,rates=rates,
-                                    threshold_area_fraction=alpha,generator=True)
-                for mutant_index,n in enumerate(np.bincount(tissue.properties['ancestor'])) if n>=n_min]                
+                                    threshold_area_fraction=alpha,generator=True)])
     outdir1 = outdir + 'db%.2f_alpha%.1f/'%(db,alpha)
     if not os.path.exists(outdir1): # if the outdir doesn't exist create it
          os.makedirs(outdir1)
@@ -4,6 +4,7 @@ import numpy as np
 from multiprocessing import Pool,cpu_count
 import libs.contact_inhibition_lib as lib #library for simulation routines
 import libs.data as data
+import libs.rng as rng
 from structure.global_constants import *
 import structure.initialisation as init
 from structure.cell import Tissue, BasicSpringForceNoGrowth
@@ -25,6 +26,8 @@ MAX_POP_SIZE = 1000
 TIMESTEP = 96. # time intervals to save simulation history
 DEATH_RATE = 0.25/24.
 INIT_TIME = 96.
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
+CHECKPOINT_INTERVAL = 1800. # wall-clock seconds between checkpoints (runs resume from these if the job is restarted)
 
 PARENTDIR = "CIP_pd_fix_N100/db%.2f_a%.1f/"%(death_to_birth_rate_ratio,threshold_area_fraction)
 if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
@@ -36,6 +39,7 @@ simulation = lib.simulation_contact_inhibition_area_dependent
 rates = (DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio)
 
 with open(PARENTDIR+'info',"w") as f:
+    f.write('root seed = %d\n'%ROOT_SEED)
     f.write('death_rate = %.6f\n'%DEATH_RATE)
     f.write('initial pop size = %3d\n'%(L*L))
     f.write('domain width = %.1f\n'%(L*domain_size_multiplier))
@@ -59,11 +63,12 @@ def run_single_unpack(args):
 def run_single(i):
     """run a single voronoi tessellation model simulation"""
     sys.stdout.flush() 
-    rand = np.random.RandomState()
+    rand = rng.replicate_rand(ROOT_SEED,threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,b,job_id,i)
     history = lib.run_simulation(simulation,L,TIMESTEP,TIMEND,rand,progress_on=False,
                 init_time=INIT_TIME,til_fix=True,save_areas=True,
                 return_events=False,save_cell_histories=False,N_limit=MAX_POP_SIZE,DELTA=DELTA,game=game,game_constants=game_constants,mutant_num=1,
-                domain_size_multiplier=domain_size_multiplier,rates=rates,threshold_area_fraction=threshold_area_fraction)
+                domain_size_multiplier=domain_size_multiplier,rates=rates,threshold_area_fraction=threshold_area_fraction,
+                checkpoint_file=PARENTDIR+'checkpoints/b%.2f_%s_%d.pkl'%(b,job_id,i),checkpoint_interval=CHECKPOINT_INTERVAL)
     fixation = fixed(history,i)
     with open(PARENTDIR+'b%.2f_%s_time'%(b,job_id),'a') as wfile:
         wfile.write('%5d    %5d    %d\n'%(i,history[-1].time,fixation))
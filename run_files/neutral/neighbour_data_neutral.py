@@ -16,23 +16,17 @@ def distribution_data(history,mutant_id,i,all_types=False):
     """
     generates neighbour data for mutants (or all cells if all_types is True)
     cells are labelled by their ancestor. all cells with ancestor=mutant_id are type 1, all other cells type 0.
-        returns list of dicts with keys: tissueid, time, n, k, j [, type] 
+        returns columns (dict of arrays) with keys: tissueid, time, n, k, j [, type] 
     n = # type 1 cells
     k = # neighbours
     j = # type 1 neighbours
     """
-    if all_types:
-        return [{'tissueid':i,'time':int(tissue.time),'n':sum(tissue.properties['ancestor']==mutant_id),'k':len(cell_neighbours),
-                'j':sum((tissue.properties['ancestor']==mutant_id)[cell_neighbours]),'type': 1 if tissue.properties['ancestor'][idx]==mutant_id else 0} 
-                for tissue in history if 1<=sum(tissue.properties['ancestor']==mutant_id)<100
-                    for idx,cell_neighbours in enumerate(tissue.mesh.neighbours)]    
-    else:
-        return [{'tissueid':i,'time':int(tissue.time),'n':sum(tissue.properties['ancestor']==mutant_id),'k':len(cell_neighbours),
-                'j':sum((tissue.properties['ancestor']==mutant_id)[cell_neighbours])} 
-                for tissue in history if 1<=sum(tissue.properties['ancestor']==mutant_id)<100
-                    for idx,cell_neighbours in enumerate(tissue.mesh.neighbours) if tissue.properties['ancestor'][idx]==mutant_id]     
-
-
+    records = data.neighbour_records(history,i,types=lambda tissue: tissue.properties['ancestor']==mutant_id)
+    keep = (records['n']>=1)&(records['n']<100)
+    if not all_types:
+        keep &= records['type']==1
+        del records['type']
+    return {key:values[keep] for key,values in records.iteritems()}
 
 def run_sim(all_types,i):
     """run a single simulation and save neighbour data for mutants (or all cells if all_types is True)"""
@@ -62,7 +56,7 @@ savename = 'batch_tm'
 # run simulations in parallel 
 cpunum=mp.cpu_count()
 pool = Pool(processes=cpunum-1,maxtasksperchild=1000)
-df = pd.DataFrame(sum(pool.map(partial(run_sim,save_all_types),range(SIM_RUNS)),[]))
+df = pd.DataFrame(data.concatenate_records(pool.map(partial(run_sim,save_all_types),range(SIM_RUNS))))
 pool.close()
 pool.join()
 df.to_csv(outdir+savename,index=False)
\ No newline at end of file
@@ -27,6 +27,7 @@ if not os.path.exists(PARENTDIR): # if the outdir doesn't exist create it
      os.makedirs(PARENTDIR)
 savename ='h%.1f_s%03.0f_b%.0f'%(h,s,b)
 
+aggregate = False # set to True to save counts of cells with each (n,k,type) rather than data for every cell
 game = lib.sigmoid_game
 simulation = lib.simulation_decoupled_update
 
@@ -37,13 +38,15 @@ with open(PARENTDIR+'info',"w") as f:
 def distribution_data(history,i):
     """
     generates neighbour data for cooperators and defectors (type 1 and 0)
-        returns list of dicts with keys: tissueid, time, n, k, type
+        returns columns (dict of arrays) with keys: tissueid, time, n, k, type 
+        (or if aggregate is True counts of cells with each n, k, type)
     n = # cooprators
     k = # neighbours
     """
-    return [{'tissueid':i,'time':int(tissue.time),'n':sum(tissue.properties['type']),'k':len(cell_neighbours),'type':cell_type} 
-            for tissue in history
-                for cell_type,cell_neighbours in zip(tissue.properties['type'],tissue.mesh.neighbours)]    
+    records = data.neighbour_records(history,i,aggregate=aggregate)
+    if not aggregate: 
+        del records['j']
+    return records
 
 def fixed(history):
     """returns True if cooperation fixates, otherwise returns False"""
@@ -66,13 +69,18 @@ pool = Pool(processes=cpunum-1,maxtasksperchild=1000)
 gen = pool.imap(partial(run_sim),range(10000))
 i = 0 
 results = []
-for data in gen:
-    if data is not None:
-        results += data
+for records in gen:
+    if records is not None:
+        results.append(records)
+        if aggregate: 
+            results = [data.aggregate_neighbour_records(results)]
         i += 1
         if i == SIM_RUNS:
             break
-df = pd.DataFrame(results)
+if aggregate: 
+    df = pd.DataFrame(data.aggregate_neighbour_records(results),columns=['n','k','type','count'])
+else:
+    df = pd.DataFrame(data.concatenate_records(results),columns=['k','n','time','tissueid','type'])
 pool.close()
 pool.join()
 df.to_csv(PARENTDIR+savename,index=False)
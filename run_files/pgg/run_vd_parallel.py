@@ -4,6 +4,7 @@ import numpy as np
 from multiprocessing import Pool,cpu_count
 import libs.public_goods_lib as lib #library for simulation routines
 import libs.data as data
+import libs.rng as rng
 from structure.global_constants import *
 import structure.initialisation as init
 from structure.cell import Tissue, BasicSpringForceNoGrowth
@@ -17,6 +18,7 @@ L = 10 # population size N=l*l
 TIMEND = 10000. # simulation time (hours)
 TIMESTEP = 12. # time intervals to save simulation history
 INIT_TIME = 12.
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce a sweep)
 
 threshold = int(sys.argv[1]) # first command line arg is threshold number volunteers
 b_vals = np.array(sys.argv[2:],dtype=float) #succeeding CLA are b values
@@ -30,6 +32,7 @@ game = lib.volunteers_dilemma
 simulation = lib.simulation_decoupled_update
 
 with open(PARENTDIR+'info',"w") as f:
+    f.write('root seed = %d\n'%ROOT_SEED)
     f.write('pop size = %3d\n'%(L*L))
     f.write('timestep = %.1f'%TIMESTEP)
 
@@ -50,7 +53,7 @@ def run_single_unpack(args):
 def run_single(i,b):
     """run a single simulation to fixation"""
     game_constants = (b,1.,threshold)
-    rand = np.random.RandomState()
+    rand = rng.replicate_rand(ROOT_SEED,threshold,b,i)
     history = lib.run_simulation(simulation,L,TIMESTEP,TIMEND,rand,DELTA,game,game_constants,mutant_num=1,
                 init_time=INIT_TIME,til_fix=True,save_areas=False,progress_on=False)
     fixation = fixed(history,i,b)
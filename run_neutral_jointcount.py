@@ -1,19 +1,23 @@
 import numpy as np
 import libs.pd_lib_neutral as lib
 import libs.data as data
+import libs.clustering as clustering
+import libs.rng as rng
 import libs.plot as vplt #plotting library
 import structure.initialisation as init
 from structure.cell import Tissue, BasicSpringForceNoGrowth
 import pandas as pd
 from multiprocessing import Pool
+import os
 
 """run a single voronoi tessellation model simulation"""  
 
+N_PERM = 100 # number of random permutations of cell types used to estimate join counts without clustering
+ROOT_SEED = rng.root_seed(os.environ.get('ROOT_SEED')) # seeds of each run are derived from this (set ROOT_SEED to reproduce)
+rand = rng.replicate_rand(ROOT_SEED)
+
 def adjacency_matrix(tissue):
-    A = np.zeros((len(tissue),len(tissue)),dtype=int)
-    for cell,cell_neighbours in enumerate(tissue.mesh.neighbours):
-        A[cell][cell_neighbours] = 1
-    return A
+    return tissue.mesh.adjacency_matrix()
 
 def add_cell_types(history,cell_id=None):
     if cell_id is None:
@@ -22,19 +26,13 @@ def add_cell_types(history,cell_id=None):
         tissue.properties['type'] = (tissue.properties['ancestor']==cell_id)*1
 
 def joint_count_stats(adjmatrix,types):
-    N = len(types)
-    MM = 0.5*sum(types[i]*types[j]*adjmatrix[i,j] 
-            for i in range(N) for j in range(N))
-    WW = 0.5*sum((1-types[i])*(1-types[j])*adjmatrix[i,j] 
-            for i in range(N) for j in range(N))
-    MW = 0.5*sum((types[i]-types[j])**2*adjmatrix[i,j]
-            for i in range(N) for j in range(N))
-    return MM,WW,MW
+    return clustering.join_counts(adjmatrix,types)
 
-def get_join_count_stats_history(history,randomise_types=False):
+def get_join_count_stats_history(history,randomise_types=False,n_perm=N_PERM,rand=rand):
+    """returns join count stats for each tissue in history (or the mean over n_perm random permutations of types)"""
     if randomise_types:
-        stats = np.array([joint_count_stats(adjacency_matrix(tissue),
-                        rand.permutation(tissue.properties['type']))
+        stats = np.array([np.mean(clustering.permutation_join_counts(adjacency_matrix(tissue),
+                        tissue.properties['type'],n_perm,rand),axis=1)
                     for tissue in history])
     else:
         stats = np.array([joint_count_stats(adjacency_matrix(tissue),
@@ -44,17 +42,22 @@ def get_join_count_stats_history(history,randomise_types=False):
     n_mutant = np.array([sum(tissue.properties['type']) for tissue in history])
     return stats,n_mutant
 
-def joint_count_multi_df(histories):
-    jc_dfs = [joint_count_df(history).assign(sim=i) 
-                for i,history in enumerate(histories)]
+def joint_count_multi_df(summaries):
+    jc_dfs = [joint_count_df(summary).assign(sim=i) 
+                for i,summary in enumerate(summaries)]
     return pd.concat(jc_dfs,ignore_index=True)
 
-def joint_count_df(history):
+def joint_count_summary(history,rand=rand):
+    """returns structured array of join count stats (and mean stats for random permutations of types) for each tissue in history"""
     add_cell_types(history)
     jc,n = get_join_count_stats_history(history,False)
-    random_jc,n1 = get_join_count_stats_history(history,True)
-    print(np.all(n==n1))
-    return create_df(jc,random_jc,n)
+    random_jc,n1 = get_join_count_stats_history(history,True,rand=rand)
+    return data.summary_array(n=n,CC=jc[:,0],DD=jc[:,1],CD=jc[:,2],CC_random=random_jc[:,0],DD_random=random_jc[:,1],CD_random=random_jc[:,2])
+
+def joint_count_df(summary):
+    jc = np.column_stack((summary['CC'],summary['DD'],summary['CD']))
+    random_jc = np.column_stack((summary['CC_random'],summary['DD_random'],summary['CD_random']))
+    return create_df(jc,random_jc,summary['n'])
 
 def create_df(jc,random_jc,n):
     nvals = np.tile(n,2)
@@ -67,22 +70,23 @@ def randomise_types(history):
     i = history[-1].properties['ancestor'][0]
     
 def run_sim(i):
-    rand = np.random.RandomState()
-    return lib.run_simulation(simulation,L,timestep,timend,
+    """run simulation returning join count stats (not the history) to keep what is sent back from the worker small"""
+    rand = rng.replicate_rand(ROOT_SEED,L,i)
+    history = lib.run_simulation(simulation,L,timestep,timend,
                             rand,progress_on=True,init_time=init_time,
                             til_fix=True,save_areas=False)
+    return joint_count_summary(history,rand)
 
 if __name__ == "__main__":
     L = 10 # population size N=l*l
     timend = 10000 # simulation time (hours)
     timestep = 1. # time intervals to save simulation history
     init_time = 12.
-    rand = np.random.RandomState()
 
     simulation = lib.simulation_ancestor_tracking # tracks clones with common ancestor
     pool = Pool(maxtasksperchild=1000)
 
-    histories = [history for history in pool.imap(run_sim,range(10))]
-    df = joint_count_multi_df(histories)
+    summaries = [summary for summary in pool.imap(run_sim,range(10))]
+    df = joint_count_multi_df(summaries)
     df.to_csv('jointcount',ignore_index=True)
         
@@ -0,0 +1,152 @@
+import sys,os
+import time
+import numpy as np
+from optparse import OptionParser
+from multiprocessing import Pool,cpu_count
+import libs.contact_inhibition_lib as lib #library for simulation routines
+import libs.workqueue as workqueue
+import libs.rng as rng
+from structure.global_constants import *
+
+"""run fixation sweeps from a work queue in a shared directory (see libs/workqueue.py). workers on any number of nodes
+pull batches of replicates, so parameter points of different lengths are balanced dynamically across nodes.
+add tasks (one per BATCH replicates of each line 'threshold_area_fraction death_to_birth_rate_ratio domain_size_multiplier x'
+of PARAMFILE, where x is DELTA for model cip_simple or b for cip_pd):
+    ROOT_SEED=1234 python run_workqueue.py QUEUE_DIR -a PARAMFILE -m cip_simple -n 10000 -b 100
+run a worker (e.g. one per node, see batch_workqueue.sh):
+    python run_workqueue.py QUEUE_DIR -p 60
+show progress, or collect results into fixed/lost/incomplete counts and the number of replicates per parameter point once
+the queue is finished (failed tasks are listed and nothing is written unless they are rerun with --retry-failed or
+--partial is given):
+    python run_workqueue.py QUEUE_DIR --status
+    python run_workqueue.py QUEUE_DIR --retry-failed
+    python run_workqueue.py QUEUE_DIR -c results.txt"""
+
+L = 10 # population size N=l*l
+TIMEND = 80000. # simulation time (hours)
+MAX_POP_SIZE = 1000
+TIMESTEP = 96. # time intervals to save simulation history
+DEATH_RATE = 0.25/24.
+INIT_TIME = 96.
+DELTA_PD = 0.025 # selection strength for cip_pd
+
+def cip_simple(params):
+    threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,DELTA = params
+    return dict(DELTA=DELTA,game='simple',threshold_area_fraction=threshold_area_fraction,
+                rates=(DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio),domain_size_multiplier=domain_size_multiplier)
+
+def cip_pd(params):
+    threshold_area_fraction,death_to_birth_rate_ratio,domain_size_multiplier,b = params
+    return dict(DELTA=DELTA_PD,game=lib.prisoners_dilemma_averaged,game_constants=(b,1.),threshold_area_fraction=threshold_area_fraction,
+                rates=(DEATH_RATE,DEATH_RATE/death_to_birth_rate_ratio),domain_size_multiplier=domain_size_multiplier)
+
+MODELS = {'cip_simple':cip_simple,'cip_pd':cip_pd}
+
+def fixed(tissue):
+    if 0 not in tissue.properties['type']:
+        return 1
+    elif 1 not in tissue.properties['type']:
+        return 0
+    return -1
+
+def run_single(args):
+    """run a single replicate i, returns (i,final time,fixation,mean population size)"""
+    model,params,root_seed,i = args
+    rand = rng.replicate_rand(root_seed,model,*(params+[i]))
+    history = lib.run_simulation(lib.simulation_contact_inhibition_area_dependent,L,TIMESTEP,TIMEND,rand,progress_on=False,
+                init_time=INIT_TIME,til_fix=True,save_areas=True,return_events=False,save_cell_histories=False,
+                N_limit=MAX_POP_SIZE,mutant_num=1,**MODELS[model](params))
+    return (i,history[-1].time,fixed(history[-1]),np.mean([len(tissue) for tissue in history]))
+
+def work(queue,processes,stale,heartbeat):
+    """claim and run tasks until the queue is finished"""
+    config = queue.config()
+    pool = Pool(processes,maxtasksperchild=1000)
+    while True:
+        queue.reclaim(stale)
+        lease = queue.claim(heartbeat=heartbeat)
+        if lease is None:
+            if queue.finished(): break
+            time.sleep(heartbeat) #wait for leased tasks in case their workers are lost
+            continue
+        task = lease.task
+        try:
+            with lease:
+                args = [(config['model'],task['params'],config['root_seed'],i) for i in range(*task['replicates'])]
+                lease.complete(pool.map(run_single,args))
+        except Exception as e: #task is returned to the queue (or failed after repeated errors)
+            print '%s: %s failed: %s'%(lease.name,task['params'],e)
+        else:
+            print '%s: %s (%s)'%(lease.name,task['params'],queue.status())
+        sys.stdout.flush()
+    pool.close()
+    pool.join()
+
+def collect(queue,outfile,partial=False):
+    """write fixed, lost and incomplete counts and number of replicates run for each parameter point.
+    lists failed tasks and refuses to write unless the queue is finished with no failures (or partial=True)"""
+    failures = list(queue.failures())
+    for name,task in failures:
+        print 'failed %s: %s replicates %d-%d (%d attempts) %s'%(name,task['params'],task['replicates'][0],task['replicates'][1]-1,
+                    task['attempts'],task.get('errors',[''])[-1])
+    if not partial and (failures or not queue.finished()):
+        print 'not writing %s: queue %s (use --retry-failed then rerun workers, or --partial)'%(outfile,queue.status())
+        return False
+    counts = {}
+    for done in queue.results():
+        fixation = np.array([r[2] for r in done['result']])
+        c = counts.setdefault(tuple(done['task']['params']),np.zeros(4,dtype=int))
+        c += [sum(fixation==1),sum(fixation==0),sum(fixation==-1),len(fixation)]
+    with open(outfile,'w') as wfile:
+        wfile.write('# params    fixed    lost    incomplete    replicates\n')
+        for params,(fix,lost,incomplete,replicates) in sorted(counts.iteritems()):
+            wfile.write('%s    %d    %d    %d    %d\n'%('    '.join('%f'%p for p in params),fix,lost,incomplete,replicates))
+    return True
+
+parser = OptionParser(usage='usage: %prog QUEUE_DIR [options]')
+parser.set_defaults(paramfile=None,model='cip_simple',number_sims=10000,batch=100,processes=max(cpu_count()-1,1),
+                    stale=600.,heartbeat=60.,status=False,collect=None,partial=False,retry_failed=False)
+parser.add_option("-a","--add",type="str",dest="paramfile",metavar="PARAMFILE",
+                    help="add tasks for each parameter line of PARAMFILE")
+parser.add_option("-m","--model",type="choice",choices=sorted(MODELS),dest="model",metavar="MODEL",
+                    help="model for added tasks (%s)"%', '.join(sorted(MODELS)))
+parser.add_option("-n","--number-sims",type="int",dest="number_sims",metavar="N",
+                    help="replicates per parameter point")
+parser.add_option("-b","--batch",type="int",dest="batch",metavar="N",
+                    help="replicates per task")
+parser.add_option("-p","--processes",type="int",dest="processes",metavar="N",
+                    help="worker processes on this node")
+parser.add_option("-s","--stale",type="float",dest="stale",metavar="SECONDS",
+                    help="reclaim leases not renewed for SECONDS")
+parser.add_option("-H","--heartbeat",type="float",dest="heartbeat",metavar="SECONDS",
+                    help="interval between lease renewals")
+parser.add_option("--status",action="store_true",dest="status",
+                    help="print number of pending, leased, done and failed tasks")
+parser.add_option("-c","--collect",type="str",dest="collect",metavar="FILE",
+                    help="write fixation counts per parameter point to FILE")
+parser.add_option("--partial",action="store_true",dest="partial",
+                    help="collect even if tasks are unfinished or failed")
+parser.add_option("--retry-failed",action="store_true",dest="retry_failed",
+                    help="return failed tasks to pending")
+(options,args) = parser.parse_args()
+if len(args) != 1:
+    parser.error('give queue directory')
+queue = workqueue.WorkQueue(args[0])
+
+if options.paramfile is not None:
+    config = queue.set_config({'model':options.model,'root_seed':rng.root_seed(os.environ.get('ROOT_SEED'))})
+    if config['model'] != options.model:
+        parser.error('queue is for model %s'%config['model'])
+    params = [[float(p) for p in line.split()] for line in open(options.paramfile) if line.strip()]
+    added = queue.add(workqueue.replicate_tasks(params,options.number_sims,options.batch))
+    print 'added %d tasks, root seed %d'%(len(added),config['root_seed'])
+elif options.status:
+    print queue.status()
+    for name,task in queue.failures():
+        print 'failed %s: %s (%s)'%(name,task['params'],task.get('errors',[''])[-1])
+elif options.retry_failed:
+    print 'returned %d failed tasks to pending'%len(queue.retry_failed())
+elif options.collect is not None:
+    if not collect(queue,options.collect,options.partial): sys.exit(1)
+else:
+    work(queue,options.processes,options.stale,options.heartbeat)
@@ -2,12 +2,16 @@ import numpy as np
 import copy
 from functools import partial
 import global_constants as gc
+from cell_history import CellHistories
+import kernels
 from global_constants import EPS, L0, MU, ETA, T_M
               
 class Tissue(object):    
     
     """Defines a tissue comprised of cells which can move, divide and be extruded"""
     
+    event_log = None #object recording divisions and extrusions (see libs.replay.Trajectory)
+    
     def __init__(self,mesh,force,cell_ids,next_id,age,mother,properties=None,save_cell_histories=False,cell_histories=None,time=0.):
         """ Parameters:
         mesh: Mesh object
@@ -35,13 +39,19 @@ class Tissue(object):
         self.properties = properties or {}
         self.save_cell_histories = save_cell_histories
         if save_cell_histories:
-            self.cell_histories = cell_histories or {}
+            self.cell_histories = cell_histories if cell_histories is not None else CellHistories()
         self.time=time
         
         
     def __len__(self):
         return len(self.mesh)
     
+    def __getstate__(self):
+        """pickle without any event log (see libs.replay)"""
+        state = self.__dict__.copy()
+        state.pop('event_log',None)
+        return state
+    
     def reset(self,reset_age=True):
         N = len(self)
         self.cell_ids = np.arange(N,dtype=int)
@@ -49,7 +59,7 @@ class Tissue(object):
         self.next_id = N
         self.mother = -np.ones(N,dtype=int)
         self.time = 0.
-        if self.save_cell_histories: self.cell_histories = {}
+        if self.save_cell_histories: self.cell_histories = CellHistories()
         
     
     def copy(self):
@@ -65,6 +75,8 @@ class Tissue(object):
         self.mesh.update()
         self.age += dt      
         self.time += dt
+        if self.event_log is not None:
+            self.event_log.end_step(self)
     
     def get_neighbour_cell_ids(self,idx_list,aslists=False):
         if aslists:
@@ -79,68 +91,36 @@ class Tissue(object):
                 return [self.cell_ids[self.mesh.neighbours[i]] for i in idx_list]
     
     def get_next_nearest_neighbour_cell_ids(self,idx_list,aslists=False):
-        if aslists: 
-            try:
-               return self.cell_ids[self.mesh.next_nearest_neighbours(idx_list)].tolist()
-            except TypeError:
-               return [self.cell_ids[self.mesh.next_nearest_neighbours(i)].tolist() for i in idx_list]
-        else:
-            try:
-                return self.cell_ids[self.mesh.next_nearest_neighbours(idx_list)]
-            except TypeError:
-                return [self.cell_ids[self.mesh.next_nearest_neighbours(i)] for i in idx_list]
+        if np.ndim(idx_list) == 0:
+            nnn = self.cell_ids[self.mesh.next_nearest_neighbours(idx_list)]
+            return nnn.tolist() if aslists else nnn
+        M = self.mesh.neighbourhood_matrix(2)
+        nnn = [self.cell_ids[M.indices[M.indptr[i]:M.indptr[i+1]]] for i in idx_list]
+        return [cell_nnn.tolist() for cell_nnn in nnn] if aslists else nnn
+    
+    def patches(self,key='type'):
+        """find connected patches of cells with the same value of the property given by key (see Mesh.patches)"""
+        return self.mesh.patches(self.properties[key])
     
     def update_cell_histories(self,idx_list,divided,position=True,neighbour_data=True,distance_data=True):
-        if self.cell_histories == {}:
-            self.cell_histories.update({'time':[],'cell_ids':[],'age':[],'divided':[]})
-            try: self.cell_histories.update({'area':[]}) 
-            except KeyError: pass 
-            if position:
-                self.cell_histories.update({'position':None})
-            if neighbour_data:
-                self.cell_histories.update({'nn':[]})
-                self.cell_histories.update({'nextnn':[]})
-                self.cell_histories.update({'mother':[]})
-            if distance_data:
-                self.cell_histories.update({'mean_separation':[]})
-                self.cell_histories.update({'mean_distance':[]})
-            self.cell_histories.update({key:[] for key in self.properties.keys()})
-        try: 
-            len(idx_list)
-            idx_list = np.array(idx_list)
-        except TypeError:
-            pass            
-        for key,valist in self.cell_histories.iteritems():
-            if key == 'time':
-                try:
-                    valist.extend([self.time]*len(idx_list))
-                except TypeError:
-                    valist.append(self.time)
-            elif key == 'cell_ids':
-                _add_to_list(valist,self.cell_ids[idx_list])
-            elif key == 'age':
-                _add_to_list(valist,self.age[idx_list])
-            elif key == 'divided':
-                _add_to_list(valist,divided)
-            elif key == 'area':
-                _add_to_list(valist,self.mesh.areas[idx_list])
-            elif key == 'mother':
-                _add_to_list(valist,self.mother[idx_list])
-            elif key == 'nn':
-                _add_lists_to_list(valist,self.get_neighbour_cell_ids(idx_list,True))
-            elif key == 'nextnn':
-                _add_lists_to_list(valist,self.get_next_nearest_neighbour_cell_ids(idx_list,True))
-            elif key == 'mean_separation':
-                _add_to_list(valist,self.mesh.mean_cell_separation())
-            elif key == 'mean_distance':
-                _add_to_list(valist,self.mesh.mean_cell_distance())
-            elif key == 'position':
-                if valist is None:
-                    self.cell_histories['position'] = self.mesh.centres[idx_list]
-                else:
-                    self.cell_histories['position'] = np.vstack((valist,self.mesh.centres[idx_list]))
-            else:
-                _add_to_list(valist,self.properties[key][idx_list])
+        idx_list = np.atleast_1d(idx_list)
+        n = len(idx_list)
+        columns = {'time':self.time,'cell_ids':self.cell_ids[idx_list],'age':self.age[idx_list],
+                    'divided':np.asarray(divided,dtype=bool)*np.ones(n,dtype=bool)}
+        ragged = {}
+        if hasattr(self.mesh,'areas'):
+            columns['area'] = self.mesh.areas[idx_list]
+        if position:
+            columns['position'] = self.mesh.centres[idx_list]
+        if neighbour_data:
+            ragged['nn'] = [self.cell_ids[self.mesh.neighbours[i]] for i in idx_list]
+            ragged['nextnn'] = self.get_next_nearest_neighbour_cell_ids(idx_list)
+            columns['mother'] = self.mother[idx_list]
+        if distance_data: #mean distance between all pairs of cells is O(N^2) so is recorded per frame (data.mean_cell_distance)
+            columns['mean_separation'] = self.mesh.mean_cell_separation()
+        for key,val in self.properties.iteritems():
+            columns[key] = val[idx_list]
+        self.cell_histories.append(n,columns,ragged)
         
     def update_extruded_divided_lists(self,idx_list,mother):
         if isinstance(idx_list,int):
@@ -164,6 +144,8 @@ class Tissue(object):
     def remove(self,idx_list,divided=None):
         """remove a cell (or cells) from tissue. if storing dead cell ids need arg mother=True if cell is being removed
         following division, false otherwise. can be list."""
+        if self.event_log is not None:
+            self.event_log.removal(idx_list,divided)
         if self.save_cell_histories:
              self.update_cell_histories(idx_list,divided)
         self.mesh.remove(idx_list)
@@ -176,7 +158,12 @@ class Tissue(object):
     def add_daughter_cells(self,i,rand,daughter_properties=None):
         """add pair of new cells after a cell division. copies properties dictionary from mother unless alternative values
         are specified in the daughter_properties argument"""
-        angle = rand.rand()*np.pi
+        self._divide(i,rand.rand()*np.pi,daughter_properties)
+    
+    def _divide(self,i,angle,daughter_properties=None):
+        """divide cell i, placing daughters either side of the mother's centre along the direction given by angle"""
+        if self.event_log is not None:
+            self.event_log.division(i,angle,daughter_properties)
         dr = np.array((EPS*np.cos(angle),EPS*np.sin(angle)))
         new_cen1 = self.mesh.centres[i] + dr
         new_cen2 = self.mesh.centres[i] - dr
@@ -249,6 +236,22 @@ class BasicSpringForceNoGrowth(BasicSpringForceTemp):
             self.force_i = self.force_i_no_T_m
             self.force_ij = self.force_ij_no_T_m
     
+    def __reduce__(self):
+        """pickle by reconstructing (bound methods set in __init__ can not be pickled)"""
+        return (self.__class__,(self.mu,self.T_m))
+    
+    def force(self,tissue):
+        if not kernels.accelerated():
+            return BasicSpringForceTemp.force(self,tissue)
+        indptr,neighbours,distances,unit_vecs = tissue.mesh.csr()
+        if self.T_m is None: pref_sep = L0
+        else:
+            cells = np.repeat(np.arange(len(tissue)),np.diff(indptr))
+            age,mother = tissue.age[cells],tissue.mother[cells]
+            pref_sep = (tissue.mother[neighbours]==mother)*((L0-EPS)*age/self.T_m+EPS-L0) +L0
+            pref_sep[(age >= self.T_m)|(mother == -1)] = L0
+        return kernels.spring_force(indptr,distances,unit_vecs,pref_sep,self.mu)
+    
     def force_i(self,tissue,i):
         distances,vecs,n_list = tissue.mesh.distances[i],tissue.mesh.unit_vecs[i],tissue.mesh.neighbours[i]
         if tissue.age[i] >= self.T_m or tissue.mother[i] == -1: pref_sep = L0
@@ -301,16 +304,3 @@ class MutantSpringForce(BasicSpringForceTemp):
         pref_sep = RHO+0.5*GROWTH_RATE*(tissue.age[n_list]+tissue.age[i])
         alpha_i = tissue.properties['mutant'][i]*(self.alpha-1)+1
         return (vecs*np.repeat((-self.mu/alpha_i*(distances-pref_sep))[:,np.newaxis],2,axis=1)).sum(axis=0)
-        
-
-def _add_to_list(list_1,to_add):
-    try: 
-        list_1.extend(to_add)
-    except TypeError:
-        list_1.append(to_add)
-        
-def _add_lists_to_list(list_1,to_add):
-    if isinstance(to_add[0],int):
-        list_1.append(to_add)
-    else: list_1.extend(to_add)
-
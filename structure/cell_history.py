@@ -0,0 +1,96 @@
+import numpy as np
+
+class CellHistories(object):
+    """
+    log of cell histories (e.g. cells that have divided or been extruded) stored as typed columns.
+    each column is a growable buffer so appending is O(1) amortised. lists of varying length for each record
+    (e.g. neighbour ids) are stored in CSR form (indptr,indices).
+    columns are returned as views of the buffers (no copying), e.g. cell_histories['age'] gives (n,) array
+    """
+
+    def __init__(self,capacity=256):
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {}
+        self.ragged = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self,key):
+        return key in self.columns or key in self.ragged
+
+    def __getitem__(self,key):
+        if key in self.columns:
+            return self.columns[key][:self.size]
+        indptr,indices = self.csr(key)
+        return [indices[start:stop] for start,stop in zip(indptr[:-1],indptr[1:])]
+
+    def keys(self):
+        return self.columns.keys()+self.ragged.keys()
+
+    def iteritems(self):
+        for key in self.keys():
+            yield key,self[key]
+
+    def csr(self,key):
+        """returns (indptr,indices) for a column with varying length values, e.g. 'nn'"""
+        indptr,indices = self.ragged[key]
+        return indptr[:self.size+1],indices[:indptr[self.size]]
+
+    def _reserve(self,n):
+        if self.size+n <= self.capacity:
+            return
+        while self.size+n > self.capacity:
+            self.capacity *= 2
+        for key,buf in self.columns.iteritems():
+            self.columns[key] = _grow(buf,self.capacity)
+        for key,(indptr,indices) in self.ragged.iteritems():
+            self.ragged[key] = (_grow(indptr,self.capacity+1),indices)
+
+    def append(self,n,columns,ragged=None):
+        """append n records.
+        columns: dict of values for each record (scalars are broadcast to all n records)
+        ragged: dict of lists of n arrays with varying lengths"""
+        self._reserve(n)
+        start,stop = self.size,self.size+n
+        for key,values in columns.iteritems():
+            values = np.asarray(values)
+            if key not in self.columns:
+                shape = values.shape[1:] if values.ndim>1 else ()
+                self.columns[key] = np.zeros((self.capacity,)+shape,dtype=values.dtype)
+            self.columns[key][start:stop] = values
+        for key,lists in (ragged or {}).iteritems():
+            if key not in self.ragged:
+                self.ragged[key] = (np.zeros(self.capacity+1,dtype=int),np.zeros(self.capacity*8,dtype=int))
+            indptr,indices = self.ragged[key]
+            lengths = [len(values) for values in lists]
+            indptr[start+1:stop+1] = indptr[start]+np.cumsum(lengths)
+            if indptr[stop] > len(indices):
+                indices = _grow(indices,max(2*len(indices),indptr[stop]))
+                self.ragged[key] = (indptr,indices)
+            if indptr[stop] > indptr[start]:
+                indices[indptr[start]:indptr[stop]] = np.concatenate(lists)
+        self.size = stop
+
+    def as_arrays(self):
+        """returns dict of column views. columns with varying length values are given as lists of arrays"""
+        return {key:self[key] for key in self.keys()}
+
+    def to_dataframe(self):
+        """returns pandas DataFrame of fixed length columns ((n,2) columns e.g. 'position' are split into '_x' and '_y')"""
+        import pandas as pd
+        data = {}
+        for key in self.columns:
+            values = self[key]
+            if values.ndim == 1:
+                data[key] = values
+            else:
+                for i,suffix in enumerate(('_x','_y')):
+                    data[key+suffix] = values[:,i]
+        return pd.DataFrame(data)
+
+def _grow(buf,length):
+    new_buf = np.zeros((length,)+buf.shape[1:],dtype=buf.dtype)
+    new_buf[:len(buf)] = buf
+    return new_buf
@@ -1,4 +1,4 @@
-global T_D,T_M,L0,EPS,MU,ETA,dt
+global T_D,T_M,L0,EPS,MU,ETA,dt,T_G1,T_other
 
 L0 = 1.0
 A0 = 3**0.5/2.
@@ -12,6 +12,10 @@ MU = 6.25
 ETA = 1.0
 dt = 0.04 #hours
 
+# cell cycle for stress_dep_lib, run_lib and pd_size_dep: length T_other + uniform(0,2*T_G1) (chaste stem cell G1 and S+G2+M durations)
+T_G1 = 14.
+T_other = 10.
+
 
 # params for two-player games and pgg (original decoupled model)
 # T_M = 1.
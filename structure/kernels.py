@@ -0,0 +1,203 @@
+import os
+import warnings
+import functools
+import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#optional accelerated kernels for the hot loops of a timestep (neighbour extraction and cell areas in retriangulate,
+#spring forces, sums over neighbours for fitnesses and local density). select with set_backend:
+#   'python': original per-cell python loops
+#   'numpy':  vectorised kernels on flat (csr) arrays of neighbour data
+#   'numba':  compiled loops (falls back to 'numpy' with a warning if numba is not installed)
+#   'auto':   'numba' if numba is installed, otherwise 'numpy' (default)
+#the initial backend is read from the environment variable VT_KERNELS (one of the above, default 'auto'), and can be
+#chosen for a single run with the backend argument of run_simulation in the libs (see run_with_backend).
+#neighbour order is the same for all backends and forces, areas and neighbour sums are accumulated in the same order as
+#the python loops, so results are the same for all backends (payoffs of some games, e.g. sigmoid_game, may differ by
+#rounding error since np.exp is applied to arrays rather than scalars).
+#the backend is a per-process setting: run_with_backend restores it after each run, while set_backend changes it for all
+#later runs in the process (including pool workers that are reused for many tasks).
+
+BACKENDS = ('python','numpy','numba','auto')
+_backend = 'python'
+
+def set_backend(name):
+    """select kernel backend (one of BACKENDS), returns previous backend"""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError('unknown backend %s (choose from %s)'%(name,', '.join(BACKENDS)))
+    if name == 'auto':
+        name = 'numpy' if numba is None else 'numba'
+    elif name == 'numba' and numba is None:
+        warnings.warn('numba is not installed, using numpy kernels')
+        name = 'numpy'
+    previous,_backend = _backend,name
+    return previous
+
+def backend():
+    return _backend
+
+def run_with_backend(run_simulation):
+    """decorator for run_simulation functions taking a backend keyword argument: the given backend is used for that call
+    only and the previous backend restored on return. with generator=True the history is generated after the call
+    returns, so the backend is instead set for the whole process (as set_backend)"""
+    @functools.wraps(run_simulation)
+    def run(*args,**kwargs):
+        backend = kwargs.pop('backend',None)
+        if backend is None:
+            return run_simulation(*args,**kwargs)
+        previous = set_backend(backend)
+        if kwargs.get('generator'):
+            return run_simulation(*args,**kwargs)
+        try:
+            return run_simulation(*args,**kwargs)
+        finally:
+            set_backend(previous)
+    return run
+
+def accelerated():
+    """True if python loops should be replaced by kernels"""
+    return _backend != 'python'
+
+def csr(lists):
+    """convert list of arrays to (indptr,flat array)"""
+    indptr = np.zeros(len(lists)+1,dtype=int)
+    np.cumsum([len(l) for l in lists],out=indptr[1:])
+    return indptr,(np.concatenate(lists) if len(lists) else np.array([]))
+
+def split(flat,indptr):
+    """convert flat array to list of arrays (views) given indptr"""
+    return np.split(flat,indptr[1:-1])
+
+#------------------------------------------------------------------------------------------------------------------------
+#numpy kernels
+
+def _segment_sum(values,indptr):
+    """sums of values over segments indptr[i]:indptr[i+1]. adds the j-th element of every segment at once for each j,
+    so each sum is accumulated in order (as in a python loop) rather than pairwise as np.add.reduceat does"""
+    sums = np.zeros((len(indptr)-1,)+values.shape[1:],dtype=values.dtype)
+    lengths = np.diff(indptr)
+    for j in range(lengths.max() if len(lengths) else 0):
+        segments = np.nonzero(lengths > j)[0]
+        sums[segments] += values[indptr[segments]+j]
+    return sums
+
+def _neighbour_csr_numpy(pairs,lo,hi):
+    flat = pairs.ravel()
+    positions = np.nonzero((flat >= lo)&(flat < hi))[0]
+    keys = flat[positions]
+    order = np.argsort(keys,kind='mergesort') #stable, so neighbours are in order of ridge index as with np.where(pairs==k)
+    indptr = np.zeros(hi-lo+1,dtype=int)
+    np.cumsum(np.bincount(keys-lo,minlength=hi-lo),out=indptr[1:])
+    return indptr,flat[positions[order]^1] #position 2r+c in flattened pairs has partner 2r+(1-c)
+
+def _polygon_areas_numpy(vertices,indptr,indices):
+    x,y = vertices[indices,0],vertices[indices,1]
+    following = np.arange(1,len(indices)+1)
+    following[indptr[1:]-1] = indptr[:-1]
+    return 0.5*_segment_sum(x*y[following]-x[following]*y,indptr)
+
+def _spring_force_numpy(indptr,distances,unit_vecs,pref_sep,mu):
+    return _segment_sum(-mu*unit_vecs*np.repeat((distances-pref_sep)[:,np.newaxis],2,axis=1),indptr)
+
+def _neighbour_sums_numpy(indptr,indices,values):
+    return _segment_sum(values[indices],indptr)
+
+#------------------------------------------------------------------------------------------------------------------------
+#compiled kernels (same arithmetic as the numpy kernels, written as loops)
+
+def _neighbour_csr_loop(pairs,lo,hi):
+    n = hi-lo
+    indptr = np.zeros(n+1,dtype=np.int64)
+    for r in range(pairs.shape[0]):
+        for c in range(2):
+            k = pairs[r,c]
+            if k >= lo and k < hi:
+                indptr[k-lo+1] += 1
+    for i in range(n):
+        indptr[i+1] += indptr[i]
+    fill = indptr[:-1].copy()
+    indices = np.empty(indptr[n],dtype=pairs.dtype)
+    for r in range(pairs.shape[0]):
+        for c in range(2):
+            k = pairs[r,c]
+            if k >= lo and k < hi:
+                indices[fill[k-lo]] = pairs[r,1-c]
+                fill[k-lo] += 1
+    return indptr,indices
+
+def _polygon_areas_loop(vertices,indptr,indices):
+    n = len(indptr)-1
+    areas = np.zeros(n)
+    for i in range(n):
+        start,stop = indptr[i],indptr[i+1]
+        total = 0.
+        for p in range(start,stop):
+            q = p+1 if p+1 < stop else start
+            a,b = vertices[indices[p]],vertices[indices[q]]
+            total += a[0]*b[1]-b[0]*a[1]
+        areas[i] = 0.5*total
+    return areas
+
+def _spring_force_loop(indptr,distances,unit_vecs,pref_sep,mu):
+    n = len(indptr)-1
+    forces = np.zeros((n,2))
+    for i in range(n):
+        for p in range(indptr[i],indptr[i+1]):
+            extension = distances[p]-pref_sep[p]
+            forces[i,0] += -mu*unit_vecs[p,0]*extension
+            forces[i,1] += -mu*unit_vecs[p,1]*extension
+    return forces
+
+def _neighbour_sums_loop(indptr,indices,values):
+    n = len(indptr)-1
+    sums = np.zeros(n,dtype=values.dtype)
+    for i in range(n):
+        for p in range(indptr[i],indptr[i+1]):
+            sums[i] += values[indices[p]]
+    return sums
+
+if numba is not None:
+    _neighbour_csr_loop = numba.njit(cache=True)(_neighbour_csr_loop)
+    _polygon_areas_loop = numba.njit(cache=True)(_polygon_areas_loop)
+    _spring_force_loop = numba.njit(cache=True)(_spring_force_loop)
+    _neighbour_sums_loop = numba.njit(cache=True)(_neighbour_sums_loop)
+
+#------------------------------------------------------------------------------------------------------------------------
+
+def neighbour_csr(pairs,lo,hi):
+    """neighbours of points lo,...,hi-1 given (M,2) array of pairs of neighbouring points (e.g. Voronoi.ridge_points).
+    returns (indptr,indices) with neighbours of point lo+i in indices[indptr[i]:indptr[i+1]]"""
+    if _backend == 'numba':
+        return _neighbour_csr_loop(pairs,lo,hi)
+    return _neighbour_csr_numpy(pairs,lo,hi)
+
+def polygon_areas(vertices,indptr,indices):
+    """signed areas of polygons with vertices[indices[indptr[i]:indptr[i+1]]] for each polygon i"""
+    if _backend == 'numba':
+        return _polygon_areas_loop(vertices,indptr,indices)
+    return _polygon_areas_numpy(vertices,indptr,indices)
+
+def spring_force(indptr,distances,unit_vecs,pref_sep,mu):
+    """(N,2) array of total linear spring force on each cell given flat arrays of distances and unit vectors to
+    neighbours and preferred separations (float or flat array)"""
+    if _backend == 'numba':
+        return _spring_force_loop(indptr,distances,unit_vecs,np.broadcast_to(np.asarray(pref_sep,dtype=float),distances.shape),mu)
+    return _spring_force_numpy(indptr,distances,unit_vecs,pref_sep,mu)
+
+def neighbour_sums(indptr,indices,values):
+    """sum of values over neighbours of each cell"""
+    if _backend == 'numba':
+        return _neighbour_sums_loop(indptr,indices,values)
+    return _neighbour_sums_numpy(indptr,indices,values)
+
+def fitnesses(neighbours_by_cell,types,DELTA,vectorised_game,game_constants):
+    """fitnesses 1+DELTA*payoff of all cells where vectorised_game(types,neighbour_type_sums,neighbour_numbers,*game_constants)
+    returns the payoffs of all cells"""
+    indptr,indices = csr(neighbours_by_cell)
+    return 1+DELTA*vectorised_game(types,neighbour_sums(indptr,indices,types),np.diff(indptr),*game_constants)
+
+set_backend(os.environ.get('VT_KERNELS') or 'auto')
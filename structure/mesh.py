@@ -1,7 +1,10 @@
 import numpy as np
 from scipy.spatial import Delaunay, Voronoi, voronoi_plot_2d, ConvexHull
+from scipy import sparse
+from scipy.sparse import csgraph
 import copy
 import os
+import kernels
 
 def polygon_area(points):
     n_p = len(points)
@@ -84,6 +87,8 @@ class Torus(Geometry):
         width,height = self.width, self.height
         centres_3x3 = np.reshape([centres+[dx, dy] for dx in [-width, 0, width] for dy in [-height, 0, height]],(9*N_mesh,2))
         vor = Voronoi(centres_3x3)
+        if kernels.accelerated():
+            return self._retriangulate_kernels(vor,centres,centres_3x3,N_mesh)
         pairs = vor.ridge_points
         neighbours = [pairs[loc[0],1-loc[1]] for loc in (np.where(pairs==k) for k in xrange(4*N_mesh,5*N_mesh))]
         sep_vectors = [centres[i]-centres_3x3[n_cell] for i,n_cell in enumerate(neighbours)]
@@ -93,6 +98,14 @@ class Torus(Geometry):
         areas = np.abs([polygon_area(vor.vertices[polygon]) for polygon in np.array(vor.regions)[vor.point_region][4*N_mesh:5*N_mesh]])
         return neighbours, distances, sep_vectors, areas
     
+    def _retriangulate_kernels(self,vor,centres,centres_3x3,N_mesh):
+        """retriangulate using flat arrays of neighbour data (see kernels.py)"""
+        indptr,neighbours = kernels.neighbour_csr(vor.ridge_points,4*N_mesh,5*N_mesh)
+        neighbours,distances,sep_vectors = _neighbour_data(centres,centres_3x3,indptr,neighbours,N_mesh)
+        regions_indptr,regions = kernels.csr([vor.regions[region] for region in vor.point_region[4*N_mesh:5*N_mesh]])
+        areas = np.abs(kernels.polygon_areas(vor.vertices,regions_indptr,regions))
+        return neighbours, distances, sep_vectors, areas
+    
     def distance(self,r0,r1):
         delta = np.abs(r0-r1)
         delta[:,0] = np.min((delta[:,0],self.width-delta[:,0]),axis=0)
@@ -105,6 +118,12 @@ class Torus(Geometry):
         delta[:,1] = np.min((delta[:,1],self.height-delta[:,1]),axis=0)
         return (delta ** 2).sum(axis=1)
         
+    def pairwise_distances(self,centres):
+        """returns (N,N) array of distances between each pair of points"""
+        delta = np.abs(centres[:,np.newaxis,:]-centres[np.newaxis,:,:])
+        delta = np.minimum(delta,[self.width,self.height]-delta)
+        return np.sqrt((delta ** 2).sum(axis=2))
+        
     def tri_area(self,triangle):
         sides = self.distance(triangle,np.roll(triangle,1,axis=0))
         p = 0.5*np.sum(sides)
@@ -117,6 +136,9 @@ class TorusNoArea(Torus):
         width,height = self.width,self.height
         centres_3x3 = np.reshape([centres+[dx, dy] for dx in [-width, 0, width] for dy in [-height, 0, height]],(9*N_mesh,2))
         vnv = Delaunay(centres_3x3).vertex_neighbor_vertices
+        if kernels.accelerated():
+            indptr = vnv[0][4*N_mesh:5*N_mesh+1]
+            return _neighbour_data(centres,centres_3x3,indptr-indptr[0],vnv[1][indptr[0]:indptr[-1]],N_mesh)
         neighbours = [vnv[1][vnv[0][k]:vnv[0][k+1]] for k in xrange(4*N_mesh,5*N_mesh)]
         sep_vectors = [centres[i]-centres_3x3[n_cell] for i,n_cell in enumerate(neighbours)]
         distances = [np.linalg.norm(cell_vectors,axis=1) for cell_vectors in sep_vectors]
@@ -142,6 +164,14 @@ class TorusNoArea(Torus):
 #         return coords
 
 
+def _neighbour_data(centres,centres_3x3,indptr,neighbours,N_mesh):
+    """neighbours, distances and unit vectors (lists of arrays as returned by retriangulate) from flat array of
+    neighbours (indices of centres_3x3) of each cell"""
+    sep_vectors = np.repeat(centres,np.diff(indptr),axis=0)-centres_3x3[neighbours]
+    distances = np.sqrt((sep_vectors*sep_vectors).sum(axis=1))
+    sep_vectors = sep_vectors/np.repeat(distances[:,np.newaxis],2,axis=1)
+    return kernels.split(neighbours%N_mesh,indptr),kernels.split(distances,indptr),kernels.split(sep_vectors,indptr)
+
 class Mesh(object):
     
     """ 
@@ -151,6 +181,9 @@ class Mesh(object):
                 geometry = Geometry object, e.g. Torus
                 neighbours, distances, unit_vecs, areas (see Geometry class)
     """
+    _adjacency = None
+    _neighbourhoods = None
+    _csr = None
    
     def __init__(self,centres,geometry):
         """Parameters:
@@ -175,17 +208,86 @@ class Mesh(object):
     
     def copy(self):
         """create a copy of Mesh object"""
-        meshcopy = copy.copy(self)
+        meshcopy = self.__class__.__new__(self.__class__)
+        meshcopy.__dict__.update(self.__dict__)
         meshcopy.centres = copy.copy(meshcopy.centres)
         return meshcopy
     
+    def __getstate__(self):
+        """pickle only cell positions and geometry. neighbour data is recalculated when first needed (see __getattr__)"""
+        return {'centres':self.centres,'geometry':self.geometry,'N_mesh':self.N_mesh}
+    
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+    
+    def __getattr__(self,name):
+        """recalculate neighbours, distances, etc. on first access after unpickling"""
+        if name in ('neighbours','distances','unit_vecs','areas') and 'centres' in self.__dict__:
+            self.neighbours,self.distances,self.unit_vecs,self.areas = self.retriangulate()
+            return self.__dict__[name]
+        raise AttributeError(name)
+    
+    def adjacency_matrix(self):
+        """returns (N,N) sparse csr matrix with A[i,j]=1 if cells i and j are neighbours. 
+        cached until the mesh is next updated"""
+        if self._adjacency is None:
+            degrees = [len(cell_neighbours) for cell_neighbours in self.neighbours]
+            rows = np.repeat(np.arange(self.N_mesh),degrees)
+            cols = np.concatenate(self.neighbours) if self.N_mesh else np.array([],dtype=int)
+            A = sparse.csr_matrix((np.ones(len(rows),dtype=int),(rows,cols)),shape=(self.N_mesh,self.N_mesh))
+            A.data[:] = 1 #cells can neighbour more than one image of the same cell on small tori
+            self._adjacency = A
+        return self._adjacency
+    
+    def neighbourhood_matrix(self,order):
+        """returns (N,N) sparse csr matrix with M[i,j]=1 if cell j can be reached from cell i in exactly 'order' 
+        steps through the neighbour graph (order=2 gives next nearest neighbours). cached until the mesh is next updated"""
+        if self._neighbourhoods is None:
+            self._neighbourhoods = {1:self.adjacency_matrix()}
+        if order not in self._neighbourhoods:
+            M = self.adjacency_matrix()**order
+            M.data[:] = 1
+            M.sort_indices()
+            self._neighbourhoods[order] = M
+        return self._neighbourhoods[order]
+    
+    def patches(self,labels):
+        """find connected patches of cells with the same label (e.g. cell type or ancestor), i.e. connected components 
+        of the neighbour graph restricted to edges between cells with equal labels.
+        Returns: 
+            patch_ids: (N,) array giving the patch each cell belongs to,
+            sizes: (n_patches,) array giving number of cells in each patch,
+            perimeters: (n_patches,) array giving number of edges between each patch and cells with a different label,
+            patch_labels: (n_patches,) array giving the label of each patch
+        """
+        labels = np.asarray(labels)
+        A = self.adjacency_matrix().tocoo()
+        same = labels[A.row]==labels[A.col]
+        G = sparse.csr_matrix((np.ones(sum(same),dtype=int),(A.row[same],A.col[same])),shape=A.shape)
+        n_patches,patch_ids = csgraph.connected_components(G,directed=False)
+        sizes = np.bincount(patch_ids,minlength=n_patches)
+        perimeters = np.bincount(patch_ids[A.row[~same]],minlength=n_patches)
+        patch_labels = np.zeros(n_patches,dtype=labels.dtype)
+        patch_labels[patch_ids] = labels
+        return patch_ids,sizes,perimeters,patch_labels
+    
     def next_nearest_neighbours(self,i):
-        return np.array(list(set([k for j in self.neighbours[i] for k in self.neighbours[j]])))
+        M = self.neighbourhood_matrix(2)
+        return M.indices[M.indptr[i]:M.indptr[i+1]]
     
     def update(self):
         """recalculate and define mesh attributes"""
         self.N_mesh = len(self.centres)
         self.neighbours, self.distances, self.unit_vecs, self.areas = self.retriangulate()
+        self._adjacency = self._neighbourhoods = self._csr = None
+    
+    def csr(self):
+        """returns neighbour data as flat arrays (indptr,neighbours,distances,unit_vecs), with data for cell i in 
+        [indptr[i]:indptr[i+1]]. cached until the mesh is next updated"""
+        if self._csr is None:
+            indptr,neighbours = kernels.csr(self.neighbours)
+            self._csr = (indptr,neighbours,np.concatenate(self.distances),np.concatenate(self.unit_vecs))
+        return self._csr
         
     def retriangulate(self):
         return self.geometry.retriangulate(self.centres,self.N_mesh)
@@ -215,11 +317,10 @@ class Mesh(object):
     def delaunay(self):
         return Delaunay(self.centres)
         
-    def distances(self,i):
-        """get distances between cell i and its neighbours"""
-        return self.geometry.distance(self.centres[i],self.centres)
-        
     def local_density(self):
+        if kernels.accelerated():
+            indptr,neighbours = self.csr()[:2]
+            return 1./self.areas + kernels.neighbour_sums(indptr,neighbours,1./self.areas)
         return 1./self.areas + np.array([sum(1./self.areas[neighbours]) for neighbours in self.neighbours])
     
     def cell_local_density_radius(self,R,i):
@@ -260,7 +361,9 @@ class Mesh(object):
         return np.mean([np.mean(distance) for distance in self.distances])
     
     def mean_cell_distance(self):
-        return np.mean([np.mean(self.geometry.distance(centre,np.delete(self.centres,i,0))) for i,centre in enumerate(self.centres)])
+        """mean distance between all pairs of cells"""
+        N = len(self.centres)
+        return self.geometry.pairwise_distances(self.centres).sum()/(N*(N-1))
        
         
 class MeshNoArea(Mesh):
@@ -273,6 +376,13 @@ class MeshNoArea(Mesh):
     def update(self):
         self.N_mesh = len(self.centres)
         self.neighbours, self.distances, self.unit_vecs = self.retriangulate()
+        self._adjacency = self._neighbourhoods = self._csr = None
+
+    def __getattr__(self,name):
+        if name in ('neighbours','distances','unit_vecs') and 'centres' in self.__dict__:
+            self.neighbours,self.distances,self.unit_vecs = self.retriangulate()
+            return self.__dict__[name]
+        raise AttributeError(name)
 
     def retriangulate(self):
         return self.geometry.retriangulate(self.centres,self.N_mesh)
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import libs.fixation as fixation
+
+#sequential stopping rules checked on synthetic bernoulli replicates in place of simulations.
+#run with python -m unittest discover -s tests -t .
+
+def run(rule,p,batch_size,seed):
+    """run_adaptive with replicates fixing with probability p"""
+    rand = np.random.RandomState(seed)
+    return fixation.run_adaptive(lambda start,stop: list((rand.rand(stop-start) < p).astype(int)),batch_size,rule)
+
+def rejection_rate(rule,p,batch_size,sequences):
+    return np.mean([run(rule,p,batch_size,seed)[1] == 'p0' for seed in range(sequences)])
+
+class TestBoundaries(unittest.TestCase):
+
+    def test_obrien_fleming_constant(self):
+        #jennison and turnbull (2000) table 2.3
+        for max_looks,c in ((1,1.960),(2,1.977),(5,2.040),(10,2.087)):
+            self.assertAlmostEqual(fixation.obrien_fleming_constant(max_looks),c,places=2)
+
+    def test_look_alpha(self):
+        rule = fixation.StoppingRule(p0=0.5,max_sims=1000,max_looks=10)
+        alphas = [rule.look_alpha(n) for n in range(100,1100,100)]
+        self.assertTrue(np.all(np.diff(alphas) > 0))
+        self.assertTrue(alphas[-1] < 0.05 < 10*alphas[-1])
+        self.assertRaises(ValueError,fixation.StoppingRule,boundary='pocock')
+
+class TestStopping(unittest.TestCase):
+    MAX_SIMS,BATCH = 2000,100
+
+    def rule(self,**kwargs):
+        return fixation.StoppingRule(min_sims=self.BATCH,max_sims=self.MAX_SIMS,max_looks=self.MAX_SIMS/self.BATCH,**kwargs)
+
+    def test_type_one_error(self):
+        #400 sequences: rate within about 3 standard errors of alpha=0.05
+        rate = rejection_rate(self.rule(p0=0.1),0.1,self.BATCH,400)
+        self.assertTrue(rate < 0.085,rate)
+
+    def test_power(self):
+        #o'brien-fleming spends less alpha per look than bonferroni so detects a difference more often
+        obf = rejection_rate(self.rule(p0=0.1),0.12,self.BATCH,200)
+        bonferroni = rejection_rate(self.rule(p0=0.1,boundary='bonferroni'),0.12,self.BATCH,200)
+        self.assertTrue(obf > bonferroni,(obf,bonferroni))
+
+    def test_precision(self):
+        #near p=0.01 a half width of 0.003 is reached before 10000 replicates in batches of 200
+        rule = fixation.StoppingRule(precision=0.003,min_sims=200,max_sims=10000,max_looks=50)
+        covered = 0
+        for seed in range(50):
+            results,reason,(estimate,lower,upper) = run(rule,0.01,200,seed)
+            self.assertEqual(reason,'precision')
+            self.assertTrue(len(results) < 10000)
+            covered += lower <= 0.01 <= upper
+        self.assertTrue(covered >= 45,covered)
+
+if __name__ == '__main__':
+    unittest.main()
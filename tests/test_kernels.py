@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+import structure.kernels as kernels
+import libs.contact_inhibition_lib as lib
+import libs.pd_lib_neutral as neutral_lib
+from structure.global_constants import dt
+
+#accelerated kernels must give the same simulations as the original python loops.
+#run with python -m unittest discover -s tests -t . (numba checks are skipped if numba is not installed)
+
+def simulate(backend,steps=300):
+    previous = kernels.set_backend(backend)
+    try:
+        rand = np.random.RandomState(3)
+        tissue = lib.initialise_tissue(6,10.,10.,rand,save_areas=True,init_simulation=lib.simulation_contact_inhibition_area_dependent,
+                    rates=(0.01,0.02),threshold_area_fraction=1.)
+        tissue.properties['type'] = np.zeros(len(tissue),dtype=int)
+        tissue.properties['type'][:5] = 1
+        simulation = lib.simulation_contact_inhibition_area_dependent(tissue,dt,steps,1,rand,(0.01,0.02),1.,DELTA=0.3,
+                        game=lib.prisoners_dilemma_averaged,game_constants=(4.,1.))
+        for step,tissue in enumerate(simulation):
+            if step >= steps: break
+        return tissue.mesh.centres.copy(),tissue.mesh.areas.copy(),len(tissue),rand.rand()
+    finally:
+        kernels.set_backend(previous)
+
+class TestBackends(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.reference = simulate('python')
+
+    def check(self,backend):
+        centres,areas,N,r = simulate(backend)
+        self.assertEqual(N,self.reference[2])
+        self.assertEqual(r,self.reference[3])
+        self.assertTrue(np.array_equal(centres,self.reference[0]))
+        self.assertTrue(np.array_equal(areas,self.reference[1]))
+
+    def test_numpy(self):
+        self.check('numpy')
+
+    @unittest.skipIf(kernels.numba is None,'numba is not installed')
+    def test_numba(self):
+        previous = kernels.set_backend('numba')
+        self.assertEqual(kernels.backend(),'numba')
+        kernels.set_backend(previous)
+        self.check('numba')
+
+    @unittest.skipIf(kernels.numba is None,'numba is not installed')
+    def test_numba_kernels(self):
+        rand = np.random.RandomState(0)
+        indptr = np.cumsum([0]+list(rand.randint(3,8,size=50)))
+        indices = rand.randint(50,size=indptr[-1])
+        values = rand.rand(50)
+        distances,unit_vecs = rand.rand(indptr[-1]),rand.rand(indptr[-1],2)
+        vertices = rand.rand(60,2)
+        pairs = rand.randint(100,size=(300,2))
+        previous = kernels.backend()
+        for backend in ('numba','numpy'):
+            kernels.set_backend(backend)
+            result = (kernels.neighbour_sums(indptr,indices,values),kernels.spring_force(indptr,distances,unit_vecs,1.,2.),
+                      kernels.polygon_areas(vertices,indptr,indices%60),kernels.neighbour_csr(pairs,20,40))
+            if backend == 'numba': compiled = result
+        kernels.set_backend(previous)
+        for a,b in zip(compiled[:3],result[:3]):
+            self.assertTrue(np.array_equal(a,b))
+        self.assertTrue(np.array_equal(compiled[3][0],result[3][0]) and np.array_equal(compiled[3][1],result[3][1]))
+
+    def test_auto(self):
+        previous = kernels.set_backend('auto')
+        self.assertEqual(kernels.backend(),'numpy' if kernels.numba is None else 'numba')
+        kernels.set_backend(previous)
+
+    def test_run_backend(self):
+        """backend argument of run_simulation applies to that run only, unless the history is a generator"""
+        seen = []
+        def simulation(*args,**kwargs):
+            seen.append(kernels.backend())
+            return neutral_lib.simulation(*args,**kwargs)
+        previous = kernels.set_backend('numpy')
+        try:
+            neutral_lib.run_simulation(simulation,4,1.,2.,np.random.RandomState(0),init_time=0,til_fix=False,backend='python')
+            self.assertEqual(seen,['python'])
+            self.assertEqual(kernels.backend(),'numpy')
+            neutral_lib.run_simulation(simulation,4,1.,2.,np.random.RandomState(0),init_time=0,generator=True,backend='python')
+            self.assertEqual(kernels.backend(),'python')
+        finally:
+            kernels.set_backend(previous)
+
+if __name__ == '__main__':
+    unittest.main()
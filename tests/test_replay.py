@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+import libs.pd_lib_neutral as lib
+from structure.global_constants import dt
+
+#a recorded trajectory must replay to the same tissues as a directly copied history.
+#run with python -m unittest discover -s tests -t .
+
+TIMESTEP,TIMEND = 10.,60.
+
+def history(record):
+    rand = np.random.RandomState(5)
+    tissue = lib.initialise_tissue(6,dt,10.,TIMESTEP,rand)
+    tissue.properties['type'] = np.zeros(len(tissue),dtype=int)
+    tissue.properties['type'][:18] = 1
+    return lib.run_simulation(lib.simulation,6,TIMESTEP,TIMEND,rand,tissue=tissue,record=record,keyframe_interval=100)
+
+class TestReplay(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.direct = history(False)
+        cls.trajectory = history(True)
+
+    def test_history(self):
+        replayed = self.trajectory.history(skip=int(TIMESTEP/dt),include_final=False) #run ends at TIMEND without fixing
+        self.assertEqual(len(replayed),len(self.direct))
+        for a,b in zip(replayed,self.direct):
+            self.assertTrue(np.array_equal(a.cell_ids,b.cell_ids))
+            self.assertTrue(np.allclose(a.mesh.centres,b.mesh.centres))
+
+    def test_empty_range(self):
+        self.assertEqual(list(self.trajectory.generate_history(start=10,stop=10)),[])
+        self.assertEqual(self.trajectory.history(start=len(self.trajectory)),[])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import itertools
+import numpy as np
+import libs.engine as engine
+import libs.reweighting as reweighting
+import libs.pd_lib_neutral as lib
+import libs.pd_lib as pd_lib
+from structure.global_constants import dt
+
+#likelihood ratio weights must turn the reference choice of mother into the alternative one, exactly for a single choice
+#and in expectation for whole simulations.
+#run with python -m unittest discover -s tests -t .
+
+def simple(cell_type,neighbour_types):
+    """payoff equal to type, as game='simple' in reweighting.payoffs"""
+    return cell_type
+
+DELTAS = [-0.2,0.,0.3]
+GAMES = [('simple',()),(simple,()),(pd_lib.prisoners_dilemma_averaged,(4.,1.))]
+
+def tissue_with_types(seed,mutants):
+    rand = np.random.RandomState(seed)
+    tissue = lib.initialise_tissue(4,dt,0,10.,rand)
+    tissue.properties['type'] = np.zeros(len(tissue),dtype=int)
+    tissue.properties['type'][mutants] = 1
+    return tissue,rand
+
+class TestExact(unittest.TestCase):
+
+    def setUp(self):
+        self.tissue,rand = tissue_with_types(1,[0,3,5,6,11])
+
+    def fitnesses(self,candidates,DELTA,game,game_constants):
+        types,neighbours = self.tissue.properties['type'],self.tissue.mesh.neighbours
+        if game == 'simple': game = simple
+        return np.array([engine.get_fitness(types[cell],types[neighbours[cell]],DELTA,game,game_constants) for cell in candidates])
+
+    def check(self,candidates,reference=(None,None,None)):
+        """enumerate every choice of mother among candidates"""
+        DELTA_ref,game_ref,constants_ref = reference
+        if game_ref is None: p_ref = np.ones(len(candidates))/len(candidates)
+        else:
+            f_ref = self.fitnesses(candidates,DELTA_ref,game_ref,constants_ref)
+            p_ref = f_ref/f_ref.sum()
+        W = []
+        for chosen in range(len(candidates)):
+            weights = reweighting.Weights(DELTAS,GAMES)
+            weights.record(self.tissue,candidates,chosen,*reference)
+            W.append(np.exp(weights.log_weights))
+        W = np.array(W) #(chosen,games,DELTAs)
+        np.testing.assert_allclose(np.einsum('i,ijk->jk',p_ref,W),1.) #E_ref[W] = 1
+        for i,(game,game_constants) in enumerate(GAMES):
+            for j,DELTA in enumerate(DELTAS):
+                f = self.fitnesses(candidates,DELTA,game,game_constants)
+                np.testing.assert_allclose(p_ref*W[:,i,j],f/f.sum()) #reweighted choice probabilities
+
+    def test_all_cells(self):
+        self.check(np.arange(len(self.tissue)))
+
+    def test_neighbours(self):
+        self.check(self.tissue.mesh.neighbours[0])
+
+    def test_non_neutral_reference(self):
+        self.check(np.arange(len(self.tissue)),(0.1,simple,()))
+
+class TestNeutralVsDirect(unittest.TestCase):
+    """mean number of mutants after a fixed number of steps of the decoupled rule at DELTA, estimated by reweighting
+    neutral runs and from runs at DELTA"""
+    RATE,STEPS,DELTA,RUNS = 0.25,100,0.3,200
+
+    def run_rule(self,seed,rule):
+        tissue,rand = tissue_with_types(seed,range(8))
+        for tissue in itertools.islice(engine.simulation(tissue,dt,self.STEPS,1,rand,rule),self.STEPS):
+            pass
+        return np.sum(tissue.properties['type'])
+
+    def test_decoupled(self):
+        mutants,W = [],[]
+        for seed in range(self.RUNS):
+            weights = reweighting.Weights([0.,self.DELTA],[(simple,())])
+            mutants.append(self.run_rule(seed,reweighting.Decoupled(weights,self.RATE,death_offset=0,divided=(True,None))))
+            W.append(np.exp(weights.log_weights[0]))
+        mutants,W = np.array(mutants),np.array(W)
+        np.testing.assert_array_equal(W[:,0],1.)
+        reweighted = W[:,1]*mutants
+        direct = np.array([self.run_rule(self.RUNS+seed,engine.Decoupled(self.RATE,self.DELTA,simple,(),death_offset=0,divided=(True,None)))
+                            for seed in range(self.RUNS)])
+        standard_error = np.sqrt(reweighted.var(ddof=1)/self.RUNS+direct.var(ddof=1)/self.RUNS)
+        self.assertTrue(abs(reweighted.mean()-direct.mean()) < 3*standard_error,(reweighted.mean(),direct.mean(),standard_error))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from libs.store import ResultStore,params_key
+
+#parameter sets must map to distinct groups of the store.
+#run with python -m unittest discover -s tests -t .
+
+class TestParamsKey(unittest.TestCase):
+
+    def test_close_floats(self):
+        DELTAS = np.linspace(0.0100001,0.0100002,5)
+        self.assertEqual(len(set(params_key({'DELTA':DELTA}) for DELTA in DELTAS)),len(DELTAS))
+        self.assertNotEqual(params_key({'b':1.0000001}),params_key({'b':1.0000002}))
+
+    def test_round_trip(self):
+        root = tempfile.mkdtemp()
+        try:
+            with ResultStore(os.path.join(root,'store.h5')) as store:
+                for i,DELTA in enumerate((0.1234567,0.12345671)):
+                    store.append('fixation',[i],run=0,params={'DELTA':DELTA})
+                self.assertEqual(sorted(p['DELTA'] for p in store.parameter_sets()),[0.1234567,0.12345671])
+                self.assertEqual(store.read('fixation',run=0,params={'DELTA':0.12345671}).tolist(),[1])
+        finally:
+            shutil.rmtree(root)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import libs.workqueue as workqueue
+
+#reclaiming stale leases when several workers call reclaim at once.
+#run with python -m unittest discover -s tests -t .
+
+STALE = 60.
+
+class TestReclaim(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.queue = workqueue.WorkQueue(self.root)
+        self.queue.add(workqueue.replicate_tasks([[0.1]],10,10))
+        self.lease = self.queue.claim(worker='lost')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def age(self,name,seconds):
+        old = time.time()-seconds
+        os.utime(self.queue.path(workqueue.LEASED,name),(old,old))
+
+    def test_concurrent_reclaim(self):
+        """a second worker reclaiming while the first is requeueing the task leaves it alone"""
+        self.age(self.lease.lease,2*STALE)
+        requeue,others = self.queue._requeue,[]
+        def interleaved(*args,**kwargs):
+            others.append(self.queue.reclaim(STALE,worker='b'))
+            return requeue(*args,**kwargs)
+        self.queue._requeue = interleaved
+        self.assertEqual(self.queue.reclaim(STALE,worker='a'),[self.lease.name])
+        self.assertEqual(others,[[]])
+        self.assertEqual(self.queue.status(),{'pending':1,'leased':0,'done':0,'failed':0})
+        self.assertEqual(self.queue.claim(worker='c').task['attempts'],1)
+
+    def test_orphaned_reclaim(self):
+        """a task left mid-reclaim by a worker that died is reclaimed once it has been stale for twice as long"""
+        claimed = '%s@reclaim-a'%self.lease.name
+        os.rename(self.queue.path(workqueue.LEASED,self.lease.lease),self.queue.path(workqueue.LEASED,claimed))
+        self.age(claimed,1.5*STALE)
+        self.assertEqual(self.queue.reclaim(STALE,worker='b'),[])
+        self.age(claimed,2.5*STALE)
+        self.assertEqual(self.queue.reclaim(STALE,worker='b'),[self.lease.name])
+        self.assertEqual(self.queue.status()['pending'],1)
+
+if __name__ == '__main__':
+    unittest.main()